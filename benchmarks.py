@@ -0,0 +1,594 @@
+"""
+benchmarks of the word level downloader run against a local stub of the dictionary
+
+usage: benchmarks.py [--quick] [--scenarios read,parsing,end_to_end,adaptive,bandwidth,memory,journal,server,hedging,sharding,startup,output,replay] [--json results.json] [--compare baseline.json]
+    [--latency seconds] [--jitter seconds] [--errors rate] [--pages recorded_pages_directory] [--tolerance 0.1]
+       benchmarks.py --corpus recorded_pages_directory_or_page_store_file
+"""
+
+import sys
+import os
+import base64
+import zlib
+import time
+import random
+import threading
+import getopt
+import http.server
+import urllib.parse
+import multiprocessing
+import tracemalloc
+import platform
+import json
+import io
+import gzip
+import tempfile
+import subprocess
+import functools
+import collections
+
+from word_level_downloader import *
+
+@functools.lru_cache(maxsize=None)
+def _filler():
+    """Unrelated markup made of many small elements with words varying as much as in real pages, so that it compresses similarly"""
+    generator = random.Random(0)
+    text = lambda: ''.join(generator.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(generator.randint(3, 9)))
+    return ''.join('<div class="sense"><span class="gw">%s</span> <a href="/%s">%s</a> %s %s <b>%s</b></div>' % tuple(text() for _ in range(6))
+        for _ in range(10000))
+
+def dictionary_page(word, levels=(), padding=0):
+    """Builds a page resembling the one of the Cambridge dictionary, padding adds about that many bytes of
+    unrelated markup, half of it before the levels and half after them"""
+    filler = _filler()
+    start = filler.index('<div', sum(word.encode('utf-8'))*997 % (len(filler)//2))
+    end = padding and filler.find('<div', start+padding//2)
+    half = filler[start:end if end >= 0 else None] #at most half of the filler
+    return ('<html><head><title>%s Meaning in the Cambridge English Dictionary</title></head><body>%s%s%s</body></html>' % (word, half,
+        ''.join('<span class="def-info"><span class="epp-xref">%s</span></span>' % level for level in levels), half)).encode('utf-8')
+
+SEARCH_PAGE = b'<html><head><title>Search results</title></head><body></body></html>'
+LEVELS = ('A1', 'A2', 'B1', 'B2', 'C1', 'C2')
+
+class StubDictionaryHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True #the headers and the parts of a body are written separately, as real servers do without waiting
+    def log_message(self, *args):
+        pass
+    def setup(self):
+        super().setup()
+        self.server.stub._count('connections')
+    def do_GET(self):
+        stub = self.server.stub
+        stub._count('requests')
+        in_flight = stub._enter()
+        try:
+            if stub.capacity and in_flight > stub.capacity:
+                stub._count('throttled')
+                return self.__send(429, b'Too many requests')
+            load = stub.capacity and 1+in_flight/stub.capacity or 1 #the more requests at once the slower every one of them
+            time.sleep(max(0.0, (stub.latency+random.uniform(-stub.jitter, stub.jitter))*load))
+            if stub.slow_rate and random.random() < stub.slow_rate: #the tail of the latencies
+                time.sleep(stub.slow_latency)
+            if stub.error_rate and random.random() < stub.error_rate:
+                return self.__send(503, b'Service unavailable')
+            word = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('q', [''])[0]
+            etag = stub.etag(word)
+            if self.headers.get('If-None-Match') == etag:
+                stub._count('not_modified')
+                return self.__send(304, b'', {'ETag':etag})
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                return self.__send(200, stub.compressed_page(word), {'Content-Encoding':'gzip', 'ETag':etag})
+            self.__send(200, stub.page(word), {'ETag':etag})
+        finally:
+            stub._enter(-1)
+    def __send(self, status, body, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            for start in range(0, len(body), 16384): #in parts, as a client can stop reading in the middle
+                self.wfile.write(body[start:start+16384])
+        except ConnectionError:
+            self.close_connection = True
+
+class StubHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 #listen() is called in the constructor, so it has to be set here
+
+class StubDictionaryServer:
+    """Local HTTP server answering like the dictionary, entries maps words to (main form, levels),
+    other words without digits get a page of their own with a level chosen by their hash, the rest is not found,
+    with a capacity the stub degrades under load: the latency grows with the number of requests being answered
+    and the requests above the capacity are throttled with 429 Too Many Requests, slow_rate of the requests take slow_latency seconds longer"""
+    def __init__(self, entries=None, latency=0.0, jitter=0.0, error_rate=0.0, padding=0, pages=None, capacity=None, slow_rate=0.0, slow_latency=1.0):
+        self.entries = entries or {}
+        self.pages = pages or {} #recorded pages served as they are, {word: page}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.padding = padding
+        self.capacity = capacity
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.in_flight = 0
+        self.counters = {'requests':0}
+        self.lock = threading.Lock()
+        self.server = StubHTTPServer(('127.0.0.1', 0), StubDictionaryHandler)
+        self.server.stub = self
+        self.thread = None
+    def _count(self, name, number=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0)+number
+    def _enter(self, number=1):
+        """Counts a request being answered (or done with -1), returns the number of requests being answered"""
+        with self.lock:
+            self.in_flight += number
+            return self.in_flight
+    def etag(self, word):
+        return '"%08x"' % zlib.crc32(self.page(word))
+    def compressed_page(self, word):
+        return gzip.compress(self.page(word), 6)
+    def page(self, word):
+        if word in self.pages:
+            return self.pages[word]
+        if word in self.entries:
+            return dictionary_page(*self.entries[word], padding=self.padding)
+        if word and not any(character.isdigit() for character in word):
+            return dictionary_page(word.replace('-', ' '), (LEVELS[sum(word.encode('utf-8')) % len(LEVELS)],), padding=self.padding)
+        return SEARCH_PAGE
+    @property
+    def link_building(self):
+        return {'regexp':r'(.*)', 'repl':r'http://127.0.0.1:%s/us/search/english/direct/?q=\1' % self.server.server_address[1]}
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    def __enter__(self):
+        return self.start()
+    def __exit__(self, *args):
+        self.stop()
+
+def _serve_in_subprocess(arguments, connection):
+    stub = StubDictionaryServer(**arguments)
+    connection.send(stub.link_building)
+    stub.server.serve_forever()
+
+class StubDictionaryProcess:
+    """The stub dictionary server running in a process of its own, so that it does not compete for the GIL
+    with the benchmarked downloader, takes the arguments of StubDictionaryServer but does not count anything"""
+    def __init__(self, **arguments):
+        self.arguments = arguments
+        self.process = None
+        self.link_building = None
+    def start(self):
+        receiving, sending = multiprocessing.Pipe(False)
+        self.process = multiprocessing.Process(target=_serve_in_subprocess, args=(self.arguments, sending), daemon=True)
+        self.process.start()
+        self.link_building = receiving.recv()
+        return self
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+    def __enter__(self):
+        return self.start()
+    def __exit__(self, *args):
+        self.stop()
+
+def make_words(number, found_ratio=0.5, seed=0):
+    """Returns distinct words of which about found_ratio are present in the stub dictionary"""
+    generator = random.Random(seed)
+    return ['%s%s' % (''.join(generator.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8)),
+        generator.random() >= found_ratio and i or '') for i in range(number)]
+
+def run_downloader(stub, words, **options):
+    """Processes the words with a downloader pointed at the stub, returns the downloader and the elapsed time"""
+    downloader = LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, **options)
+    downloader.words = list(words)
+    start = time.perf_counter()
+    downloader.process_words()
+    return downloader, time.perf_counter()-start
+
+def _run_shard(link_building, words, shard, output_file_path):
+    downloader = LevelsDownloader(silent_mode=True, dump_config=False, link_building=link_building, shard=shard, max_number_of_threads=20)
+    downloader.words = set(words)
+    downloader.process_words()
+    downloader.save_words_to_file(output_file_path)
+
+def recorded_pages(directory='cache'):
+    """Yields the words and pages recorded by the tests in the directory, or by --record in the page store file"""
+    if os.path.isfile(directory):
+        with PageStore(directory) as store:
+            for url, metadata, page in store.items():
+                if page and metadata.get('status', 200) == 200:
+                    yield urllib.parse.unquote(url.split('?q=', 1)[-1]), page.decode('utf-8')
+        return
+    for name in sorted(os.listdir(directory)):
+        try:
+            url = base64.b64decode(name.rsplit('.', 1)[0]).decode('utf-8')
+            with open(os.path.join(directory, name), 'rb') as file:
+                page = file.read().decode('utf-8')
+        except (ValueError, IOError):
+            continue
+        if page:
+            yield urllib.parse.unquote(url.split('?q=', 1)[-1]), page
+
+def compare_extraction_engines(pages, **options):
+    """Returns the words for which the extraction engines give different results"""
+    downloader = LevelsDownloaderBase(**options)
+    differences = []
+    for word, page in pages:
+        results = []
+        for engine in ('dom', 'targeted'):
+            downloader.options['extraction_engine'] = engine
+            results.append(downloader._get_level_from_page_text(word, page))
+        if results[0] != results[1]:
+            differences.append((word, *results))
+    return differences
+
+def scenario_read(quick=False):
+    """Throughput of extracting words from lines of notes"""
+    number_of_lines = quick and 20000 or 200000
+    generator = random.Random(0)
+    lines = ['%s %s - %s' % (generator.choice(('get', 'look', '* take', '1. put')), ''.join(generator.choice('abcdefghij') for _ in range(6)),
+        'some explanation') for _ in range(number_of_lines)]
+    downloader = LevelsDownloaderBase(many_phrasal_verbs=True)
+    start = time.perf_counter()
+    downloader.read(io.StringIO('\n'.join(lines)))
+    elapsed = time.perf_counter()-start
+    results = {'lines_per_second':number_of_lines/elapsed}
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'notes.txt')
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines*(quick and 5 or 10)))
+        for reading_processes in (0, 4):
+            downloader = LevelsDownloader(silent_mode=True, dump_config=False, many_phrasal_verbs=True,
+                reading_processes=reading_processes, reading_chunk_size=1024*1024)
+            start = time.perf_counter()
+            downloader.read_words_from_file(file_path)
+            results['file_processes_%s_lines_per_second' % reading_processes] = number_of_lines*(quick and 5 or 10)/(time.perf_counter()-start)
+    return results
+
+def scenario_parsing(quick=False, pages=None):
+    """Cost of extracting a word and level from a page by each of the extraction engines"""
+    pages = pages or [(word, dictionary_page(word, levels, padding=300000).decode('utf-8'))
+        for word, levels in (('car', ('A1', 'B2')), ('perplex', ()), ('form', ('B1', 'A2', 'C2')))]
+    repeat = quick and 3 or 20
+    downloader = LevelsDownloaderBase()
+    results = {}
+    for engine in ('dom', 'targeted'):
+        downloader.options['extraction_engine'] = engine
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for word, page in pages:
+                downloader._get_level_from_page_text(word, page)
+        results['%s_seconds_per_page' % engine] = (time.perf_counter()-start)/repeat/len(pages)
+    return results
+
+def scenario_end_to_end(quick=False, latency=0.02, jitter=0.005, error_rate=0.0, pages=None):
+    """Words per second of whole runs against the stub dictionary for different numbers of threads and engines,
+    pages are recorded pages to be served, their words are looked up together with generated ones"""
+    words = make_words(quick and 300 or 3000)+list(pages or ())
+    results = {}
+    with StubDictionaryProcess(latency=latency, jitter=jitter, error_rate=error_rate, padding=20000, pages=pages) as stub:
+        runs = [('threads_%s' % threads, {'max_number_of_threads':threads}) for threads in (1, 10, 50, 100)]
+        runs += [('asyncio_50', {'engine':'asyncio', 'max_number_of_connections_per_host':50}),
+            ('threads_50_parsers_2', {'max_number_of_threads':50, 'parsing_processes':2})]
+        for name, options in runs:
+            run_words = options.get('max_number_of_threads') == 1 and words[:len(words)//10] or words
+            downloader, elapsed = run_downloader(stub, run_words, **options)
+            results['%s_words_per_second' % name] = len(run_words)/elapsed
+    return results
+
+def scenario_adaptive(quick=False, latency=0.02, capacity=20):
+    """Words per second and share of words lost to throttling despite the retries for fixed and adaptive numbers of requests in flight
+    against the stub dictionary degrading under load"""
+    words = make_words(quick and 300 or 2000, found_ratio=1.0)
+    results = {}
+    with StubDictionaryProcess(latency=latency, capacity=capacity) as stub:
+        for name, options in (('threads_10', {'max_number_of_threads':10}), ('threads_100', {'max_number_of_threads':100}),
+                ('adaptive_100', {'max_number_of_threads':100, 'adaptive_concurrency':True}),
+                ('adaptive_100_rate_200', {'max_number_of_threads':100, 'adaptive_concurrency':True, 'max_requests_per_second':200})):
+            downloader, elapsed = run_downloader(stub, words, **options)
+            results['%s_words_per_second' % name] = len(words)/elapsed
+            results['%s_lost_ratio' % name] = sum(level in ('UNFOUND', 'UNRESOLVED') for word, level in downloader.words_and_levels)/len(words)
+    return results
+
+def scenario_bandwidth(quick=False, latency=0.02, padding=200000):
+    """Bytes on the wire per word read by the full and streamed fetch modes, and saved by the latter, against the stub dictionary
+    sending pages with about padding bytes of markup, compressed when asked to"""
+    words = make_words(quick and 60 or 300, found_ratio=0.8)
+    results = {}
+    with StubDictionaryProcess(latency=latency, padding=padding) as stub:
+        for name, options in (('full', {}), ('streamed', {'fetch_mode':'streamed'}), ('streamed_first_level', {'fetch_mode':'streamed', 'levels_to_read':1})):
+            downloader = LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, max_number_of_threads=20, **options)
+            profiler = downloader.start_profiling()
+            downloader.words = list(words)
+            start = time.perf_counter()
+            downloader.process_words()
+            elapsed = time.perf_counter()-start
+            results['%s_words_per_second' % name] = len(words)/elapsed
+            results['%s_wire_bytes_per_word' % name] = profiler.counters.get(options and 'bytes_on_wire' or 'bytes', 0)/len(words)
+            if options:
+                results['%s_saved_bytes_per_word' % name] = results['full_wire_bytes_per_word']-results['%s_wire_bytes_per_word' % name]
+    return results
+
+def scenario_memory(quick=False):
+    """Memory allocated by reading words and by processing their levels, per 100k words"""
+    number_of_words = quick and 20000 or 100000
+    generator = random.Random(0)
+    text = '\n'.join(''.join(generator.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(10)) for i in range(number_of_words))
+    downloader = LevelsDownloaderBase()
+    downloader._download_words = lambda words: [downloader._store_result(word, word, LEVELS[len(word) % len(LEVELS)]) for word in words]
+    tracemalloc.start()
+    downloader.read(io.StringIO(text))
+    read_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    downloader.process_words()
+    processed_peak = tracemalloc.get_traced_memory()[1]-before
+    tracemalloc.stop()
+    scale = 100000/number_of_words
+    return {'read_peak_bytes_per_100k_words':read_peak*scale, 'processed_peak_bytes_per_100k_words':processed_peak*scale}
+
+def scenario_output(quick=False):
+    """Results written per second and bytes per result of every output format, and results per second sorted in memory
+    and by the external sort spilling runs of a tenth of them"""
+    number_of_results = quick and 100000 or 1000000
+    generator = random.Random(0)
+    results = [(''.join(generator.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(generator.randint(3, 12)))+generator.choice(['', ' away']),
+        generator.choice(LEVELS)) for _ in range(number_of_results)]
+    downloader = LevelsDownloader(silent_mode=True, dump_config=False)
+    downloader.words_and_levels = results
+    downloader.process_words()
+    metrics = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in OUTPUT_FORMATS:
+            downloader.options['output_format'] = name
+            file_path = os.path.join(directory, 'levels.'+name)
+            start = time.perf_counter()
+            downloader.save_words_to_file(file_path)
+            metrics['%s_results_per_second' % name] = number_of_results/(time.perf_counter()-start)
+            metrics['%s_bytes_per_result' % name] = os.path.getsize(file_path)/number_of_results
+        for name, run_size in (('in_memory', number_of_results), ('external', number_of_results//10)):
+            start = time.perf_counter()
+            with ExternalSorter(run_size, directory) as sorter:
+                for batch in range(0, number_of_results, 10000):
+                    sorter.add(results[batch:batch+10000])
+                collections.deque(sorter, maxlen=0)
+            metrics['%s_sort_results_per_second' % name] = number_of_results/(time.perf_counter()-start)
+    return metrics
+
+def scenario_replay(quick=False, latency=0.02, padding=20000):
+    """Words per second of runs against the stub dictionary without recording pages, recording them and revalidating them,
+    and of runs replaying them offline, and stored bytes per recorded page"""
+    words = make_words(quick and 300 or 3000)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, StubDictionaryProcess(latency=latency, padding=padding) as stub:
+        page_store_file = os.path.join(directory, 'pages.pack')
+        run_downloader(stub, make_words(5, found_ratio=1.0)) #the first requests to the stub are slow
+        for name, options in (('not_recording', {}), ('recording', {'page_store_file':page_store_file}),
+                ('revalidating', {'page_store_file':page_store_file, 'page_store_mode':'revalidate'}),
+                ('replaying', {'page_store_file':page_store_file, 'page_store_mode':'replay', 'max_retries':0})):
+            downloader, elapsed = run_downloader(stub, words, max_number_of_threads=50, **options)
+            downloader.close_page_store()
+            results['%s_words_per_second' % name] = len(words)/elapsed
+        results['bytes_per_recorded_page'] = os.path.getsize(page_store_file)/len(words)
+    return results
+
+def scenario_journal(quick=False):
+    """Results stored per second with and without journaling them"""
+    words = ['word%s' % i for i in range(quick and 20000 or 200000)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, journal_file in (('without_journal', None), ('with_journal', os.path.join(directory, 'run.journal'))):
+            downloader = LevelsDownloader(silent_mode=True, dump_config=False, journal_file=journal_file)
+            downloader._download_words = lambda words: [downloader._store_result(word, word, LEVELS[len(word) % len(LEVELS)]) for word in words]
+            downloader.words = words
+            start = time.perf_counter()
+            downloader.process_words()
+            results['%s_results_per_second' % name] = len(words)/(time.perf_counter()-start)
+            downloader.close_journal()
+    return results
+
+def scenario_server(quick=False, latency=0.02, clients=8):
+    """Requests per second of concurrent clients looking a few words up, each with a downloader of its own
+    and all with a lookup server batching their words and keeping its state warm, requests per batch of the server,
+    and invocations per second of the command line looking a few words up by itself and with the server"""
+    generator = random.Random(0)
+    vocabulary = make_words(200, found_ratio=0.8)
+    rounds = [[generator.sample(vocabulary, 5) for _ in range(clients)] for _ in range(quick and 5 or 20)]
+    def run(make_downloader):
+        start = time.perf_counter()
+        for round in rounds:
+            downloaders = [make_downloader() for _ in round]
+            for downloader, words in zip(downloaders, round):
+                downloader.words = words
+            threads = [threading.Thread(target=downloader.process_words) for downloader in downloaders]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return len(rounds)*clients/(time.perf_counter()-start)
+    results = {}
+    with StubDictionaryProcess(latency=latency, padding=20000) as stub, tempfile.TemporaryDirectory() as cache_directory:
+        run_downloader(stub, ['warmup']) #the stub builds its pages on the first request
+        results['downloader_per_request_requests_per_second'] = run(lambda: LevelsDownloader(silent_mode=True, dump_config=False,
+            link_building=stub.link_building, max_retries=0))
+        server = LookupServer(('127.0.0.1', 0), LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building,
+            engine='asyncio', keep_connections=True, max_number_of_connections_per_host=50, max_retries=0,
+            cache_file=os.path.join(cache_directory, 'cache.sqlite')))
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        address = '127.0.0.1:%s' % server.server_address[1]
+        try:
+            results['server_requests_per_second'] = run(lambda: LevelsDownloader(silent_mode=True, dump_config=False, server_address=address))
+            results['server_requests_per_batch'] = server.batcher.requests/max(1, server.batcher.batches)
+            with tempfile.TemporaryDirectory() as directory:
+                with open(os.path.join(directory, 'config.json'), 'w') as file:
+                    json.dump({'link_building':stub.link_building}, file)
+                script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'word_level_downloader.py')
+                for name, arguments in (('cli', []), ('cli_with_server', ['--connect', address])):
+                    start = time.perf_counter()
+                    for words in rounds[0]:
+                        subprocess.run([sys.executable, script, '--silent', '--retries', '0']+arguments+words, cwd=directory, check=True)
+                    results['%s_invocations_per_second' % name] = len(rounds[0])/(time.perf_counter()-start)
+        finally:
+            server.shutdown()
+            server.server_close()
+    return results
+
+def scenario_hedging(quick=False, latency=0.02, slow_rate=0.02, slow_latency=0.5):
+    """Median and 99th percentile of the seconds a word is looked up for, and requests per word, asking one stub dictionary
+    with a slow tail of latencies and asking its mirror too when it is slower than its 95th percentile"""
+    words = make_words(quick and 300 or 2000, found_ratio=1.0)
+    results = {}
+    with StubDictionaryProcess(latency=latency, slow_rate=slow_rate, slow_latency=slow_latency, padding=20000) as main, \
+            StubDictionaryProcess(latency=latency, slow_rate=slow_rate, slow_latency=slow_latency, padding=20000) as mirror:
+        run_downloader(main, ['warmup'])
+        run_downloader(mirror, ['warmup'])
+        for name, options in (('single', {}), ('hedged', {'backends':[{'link_building':mirror.link_building}], 'hedge_delay':latency*3})):
+            downloader = LevelsDownloader(silent_mode=True, dump_config=False, link_building=main.link_building, max_number_of_threads=20, **options)
+            profiler = downloader.start_profiling()
+            latencies = []
+            lookup = downloader._lookup
+            def timed_lookup(word, lookup=lookup, latencies=latencies):
+                start = time.perf_counter()
+                found = lookup(word)
+                latencies.append(time.perf_counter()-start)
+                return found
+            downloader._lookup = timed_lookup
+            downloader.words = list(words)
+            downloader.process_words()
+            latencies.sort()
+            results['%s_p50_seconds' % name] = latencies[len(latencies)//2]
+            results['%s_p99_seconds' % name] = latencies[min(len(latencies)-1, int(0.99*len(latencies)))]
+            results['%s_requests_per_word' % name] = profiler.counters.get('requests', 0)/len(words)
+    return results
+
+def scenario_sharding(quick=False, latency=0.01, padding=100000):
+    """Words per second of a run split into 1, 2 and 4 shard processes against the stub dictionary, including merging their outputs"""
+    words = make_words(quick and 300 or 2000, found_ratio=0.8)
+    results = {}
+    with StubDictionaryProcess(latency=latency, padding=padding) as stub, tempfile.TemporaryDirectory() as directory:
+        run_downloader(stub, ['warmup'])
+        for number_of_shards in (1, 2, 4):
+            parts = [os.path.join(directory, '%s-of-%s.txt' % (index, number_of_shards)) for index in range(number_of_shards)]
+            start = time.perf_counter()
+            processes = [multiprocessing.Process(target=_run_shard, args=(stub.link_building, words, [index, number_of_shards], part))
+                for index, part in enumerate(parts)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            merging_start = time.perf_counter()
+            merge_results_files(os.path.join(directory, 'merged.txt'), parts)
+            results['shards_%s_words_per_second' % number_of_shards] = len(words)/(time.perf_counter()-start)
+            results['shards_%s_merge_seconds' % number_of_shards] = time.perf_counter()-merging_start
+    return results
+
+#seconds the command line may take at most, benchmarks.py fails when they are exceeded
+STARTUP_BUDGETS = {'help_seconds':0.2, 'warm_cache_lookup_seconds':0.3}
+
+def scenario_startup(quick=False, words=5):
+    """Median seconds of importing the module, of word_level_downloader.py --help as a script and as python -m,
+    and of the command line looking a few words up which are all in a warm cache"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    def median_seconds(arguments, cwd=directory):
+        times = []
+        for _ in range(quick and 3 or 11):
+            start = time.perf_counter()
+            subprocess.run([sys.executable]+arguments, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter()-start)
+        return sorted(times)[len(times)//2]
+    results = {}
+    results['python_seconds'] = median_seconds(['-c', 'pass'])
+    results['import_seconds'] = median_seconds(['-c', 'import word_level_downloader'])
+    results['help_seconds'] = median_seconds([os.path.join(directory, 'word_level_downloader.py'), '--help'])
+    results['module_help_seconds'] = median_seconds(['-m', 'word_level_downloader', '--help'])
+    with tempfile.TemporaryDirectory() as temporary:
+        cache_file = os.path.join(temporary, 'levels.sqlite')
+        looked_up = make_words(words)
+        downloader = LevelsDownloader(silent_mode=True, dump_config=False, cache_file=cache_file)
+        cache = downloader._open_cache()
+        for word in looked_up:
+            cache.put(downloader._cache_key(word), word, LEVELS[len(word) % len(LEVELS)])
+        cache.close()
+        results['warm_cache_lookup_seconds'] = median_seconds([os.path.join(directory, 'word_level_downloader.py'), '--silent', '--cache', cache_file]+looked_up,
+            cwd=temporary)
+    results['budgets_exceeded'] = sum(results[metric] > budget for metric, budget in STARTUP_BUDGETS.items())
+    return results
+
+SCENARIOS = {'read':scenario_read, 'parsing':scenario_parsing, 'end_to_end':scenario_end_to_end, 'adaptive':scenario_adaptive, 'bandwidth':scenario_bandwidth, 'memory':scenario_memory, 'journal':scenario_journal, 'server':scenario_server, 'hedging':scenario_hedging, 'sharding':scenario_sharding, 'startup':scenario_startup, 'output':scenario_output, 'replay':scenario_replay}
+
+def run_benchmarks(scenarios=None, quick=False, **end_to_end_options):
+    """Runs the scenarios and returns their results together with a description of the environment"""
+    results = {'python':platform.python_version(), 'platform':platform.platform(), 'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick':quick, 'scenarios':{}}
+    for name in scenarios or SCENARIOS:
+        arguments = name == 'end_to_end' and end_to_end_options or {}
+        results['scenarios'][name] = SCENARIOS[name](quick=quick, **arguments)
+    return results
+
+#endings of the metrics which are better when higher, the others are better when lower
+HIGHER_IS_BETTER = ('_per_second', '_saved_bytes_per_word', '_requests_per_batch')
+
+def compare_results(baseline, current, tolerance=0.1):
+    """Returns (scenario, metric, baseline value, current value, change) for the metrics worse than the tolerance allows,
+    the metrics ending like HIGHER_IS_BETTER are better when higher, the rest when lower,
+    the change is relative to the baseline value, or the difference when the baseline value is 0"""
+    regressions = []
+    for scenario, metrics in current['scenarios'].items():
+        for metric, value in metrics.items():
+            old = baseline.get('scenarios', {}).get(scenario, {}).get(metric)
+            if old is None or value is None:
+                continue
+            change = old and value/old-1 or value-old
+            if (change < -tolerance) if metric.endswith(HIGHER_IS_BETTER) else (change > tolerance):
+                regressions.append((scenario, metric, old, value, change))
+    return regressions
+
+def main():
+    opts, args = getopt.getopt(sys.argv[1:], 'qs:j:c:', ['quick', 'scenarios=', 'json=', 'compare=', 'corpus=',
+        'latency=', 'jitter=', 'errors=', 'tolerance=', 'pages='])
+    options = dict(opts)
+    if '--corpus' in options:
+        pages = list(recorded_pages(options['--corpus']))
+        for word, dom_result, targeted_result in compare_extraction_engines(pages):
+            print('%s: dom %s, targeted %s' % (word, dom_result, targeted_result))
+        for metric, value in scenario_parsing(pages=pages).items():
+            print('%s: %.3f ms' % (metric, 1000*value))
+        return
+    scenarios = options.get('--scenarios', options.get('-s', ''))
+    results = run_benchmarks(scenarios and scenarios.split(',') or None, '--quick' in options or '-q' in options,
+        latency=float(options.get('--latency', 0.02)), jitter=float(options.get('--jitter', 0.005)), error_rate=float(options.get('--errors', 0.0)),
+        pages='--pages' in options and {word:page.encode('utf-8') for word, page in recorded_pages(options['--pages'])} or None)
+    for scenario, metrics in results['scenarios'].items():
+        for metric, value in metrics.items():
+            print('%-12s %-40s %14.6g' % (scenario, metric, value))
+    json_file = options.get('--json', options.get('-j'))
+    if json_file:
+        with open(json_file, 'w') as file:
+            json.dump(results, file, indent='\t')
+    baseline_file = options.get('--compare', options.get('-c'))
+    if baseline_file:
+        with open(baseline_file) as file:
+            regressions = compare_results(json.load(file), results, float(options.get('--tolerance', 0.1)))
+        for scenario, metric, old, new, change in regressions:
+            print('REGRESSION %s %s: %.6g -> %.6g (%s)' % (scenario, metric, old, new, old and '%+.0f%%' % (100*change) or '%+.6g' % change))
+        if regressions:
+            sys.exit(1)
+    for metric, budget in STARTUP_BUDGETS.items():
+        value = results['scenarios'].get('startup', {}).get(metric)
+        if value is not None and value > budget:
+            print('OVER BUDGET startup %s: %.3f s > %.3f s' % (metric, value, budget))
+    if results['scenarios'].get('startup', {}).get('budgets_exceeded'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,24 @@ import sys
 import unittest.mock
 import copy
 import random
+import threading
+import tempfile
+import gzip
+import urllib.request
+import urllib.error
+import http.client
+import subprocess
+import socket
+import asyncio
+import csv
+import json
+import zlib
+import hashlib
+import pickle
 
 from word_level_downloader import *
+from word_level_downloader import _line_aligned_chunks, _parse_pages
+from benchmarks import LEVELS, dictionary_page, StubDictionaryServer, make_words, compare_results, scenario_parsing, recorded_pages
 
 class mock_urllib_request_urlopen():
     '''Mock used to speed up tests depending on internet'''
@@ -57,6 +73,22 @@ class mock_urllib_request_urlopen():
         else:
             raise AttributeError('Mock attribute error - read() called after unsuccessful urlopen')
 
+class mock_dictionary_urlopen():
+    '''Mock of urlopen serving an offline dictionary, counts the requests'''
+    def __init__(self, entries=None):
+        #entries: {word from url: (main form of the word, levels)}, words not present get a page without a headword
+        self.entries = entries or {'car':('car',('A1',)), 'need':('need',('A1','B1')), 'needing':('need',('A1','B1')),
+            'key':('key',('A1',)), 'keyboard':('keyboard',('A2',)), 'get-away':('get away',('B2',)), 'perplex':('perplex',())}
+        self.requests = []
+        self.lock = threading.Lock()
+    def __call__(self, url):
+        with self.lock:
+            self.requests.append(url)
+        word = urllib.parse.unquote(url.rsplit('=',1)[-1])
+        if word in self.entries:
+            return io.BytesIO(dictionary_page(*self.entries[word]))
+        return io.BytesIO(b'<html><head><title>Search results</title></head><body></body></html>')
+
 class TestStdout:
     def __init__(self,analyzer,show_output=True):
         self.last_number=0
@@ -71,6 +103,8 @@ class TestStdout:
         if self.show_output:
             self.original_stdout.write(text)
         self.analyzer.write(text)
+    def flush(self):
+        self.original_stdout.flush()
 
 class LevelsDownloaderTestWithMockUrlopen(unittest.TestCase):
     def setUp(self):
@@ -225,6 +259,1204 @@ class requirement_tests(LevelsDownloaderTestWithMockUrlopen):
     #     self.downloader.words=[*(random.random() > 0.95 and 'car' or 'abcd123' for i in range(0,n))] #some quick "not founds" and some which require processing
     #     self.downloader.process_words()
 
+class LevelsDownloaderTestWithOfflineDictionary(unittest.TestCase):
+    def setUp(self):
+        self.downloader=LevelsDownloader(silent_mode=True, dump_config=False)
+        self.downloader.urlopen_function = mock_dictionary_urlopen()
+        self.directory=tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+class cache_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.downloader.options['cache_file'] = self.path('cache.sqlite')
+    def test_warm_run_does_not_download(self):
+        self.downloader.words=['keyboard','key','perplex','ABCD123','get-away']
+        self.downloader.process_words()
+        expected=self.downloader.words_and_levels
+        self.downloader.urlopen_function = mock_dictionary_urlopen()
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,expected)
+        self.assertEqual(self.downloader.urlopen_function.requests,[])
+    def test_cache_is_persistent(self):
+        self.downloader.words=['needing']
+        self.downloader.process_words()
+        self.downloader.cache.close()
+        self.downloader=LevelsDownloader(silent_mode=True, dump_config=False, cache_file=self.path('cache.sqlite'))
+        self.downloader.urlopen_function = mock_dictionary_urlopen()
+        self.downloader.words=['needing']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('need','A1')])
+        self.assertEqual(self.downloader.urlopen_function.requests,[])
+    def test_key_depends_on_options(self):
+        self.downloader.words=['needing']
+        self.downloader.process_words()
+        self.downloader.options['do_not_change_words']=True
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('needing','UNFOUND')])
+    def test_expired_entries_are_downloaded_again(self):
+        self.downloader.options['cache_ttl'] = -1
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(len(self.downloader.urlopen_function.requests),2)
+    def test_eviction(self):
+        cache=WordLevelCache(self.path('evicted.sqlite'), max_entries=10)
+        for i in range(25):
+            cache.put('word%s' % i, 'word%s' % i, 'A1')
+        cache.get('word0')
+        cache.flush()
+        self.assertEqual(len(cache),10)
+        self.assertIsNotNone(cache.get('word0'))
+        cache.close()
+    def test_warm_run_of_many_words(self):
+        self.downloader.words=['word%s' % i for i in range(10000)]
+        self.downloader.process_words()
+        self.downloader.urlopen_function = mock_dictionary_urlopen()
+        start=time.perf_counter()
+        self.downloader.process_words()
+        self.assertLess(time.perf_counter()-start,1)
+        self.assertEqual(self.downloader.urlopen_function.requests,[])
+
+class asyncio_engine_tests(unittest.TestCase):
+    def setUp(self):
+        self.stub=StubDictionaryServer(entries={'needing':('need',('A1','B1')), 'get-away':('get away',('B2',))}).start()
+        self.addCleanup(self.stub.stop)
+    def process(self, words, **options):
+        options.setdefault('link_building', self.stub.link_building)
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, **options)
+        downloader.words=words
+        downloader.process_words()
+        return downloader.words_and_levels
+    def test_same_results_as_threads(self):
+        words=make_words(200)+['needing','get-away']
+        self.assertEqual(self.process(words, engine='asyncio'), self.process(words, engine='threads'))
+    def test_connections_are_reused(self):
+        self.process(make_words(300), engine='asyncio', max_number_of_connections_per_host=4)
+        self.assertEqual(self.stub.counters['requests'],300)
+        self.assertLessEqual(self.stub.counters['connections'],4)
+    def test_unreachable_host(self):
+        result=self.process(['car'], engine='asyncio', link_building={'regexp':r'(.*)', 'repl':r'http://127.0.0.1:1/?q=\1'}, max_retries=0)
+        self.assertEqual(result,[('car','UNRESOLVED')])
+    def test_failed_lookup_is_raised(self):
+        self.stub.pages['blank']=b' \n' #not a document for the parser
+        for engine in ('threads', 'asyncio'):
+            with self.assertRaises(Exception) as raised:
+                self.process(['blank']+make_words(5), engine=engine, max_number_of_threads=1, max_number_of_requests_in_flight=1)
+            self.assertIn('Document is empty', str(raised.exception))
+
+class streaming_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_same_results_as_process_words(self):
+        lines=['keyboard','key','perplex - tricky','ABCD123','get away','key','needing']
+        self.downloader.read(io.StringIO('\n'.join(lines)))
+        self.downloader.process_words()
+        expected=self.downloader.words_and_levels
+        self.downloader.stream_words_to_file(None, self.path('output.txt'), lines)
+        with open(self.path('output.txt')) as f:
+            streamed=[tuple(reversed(line.split(' ',1))) for line in f.read().splitlines()]
+        self.assertCountEqual(streamed,expected)
+    def test_batches_are_bounded(self):
+        self.downloader.options['streaming_window']=10
+        lines=('word'+''.join(chr(ord('a')+int(digit)) for digit in str(i % 45)) for i in range(1000))
+        batches=[len(batch) for batch in self.downloader.stream(lines)]
+        self.assertEqual(batches,[10,10,10,10,5])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),45)
+    def test_results_are_written_during_the_run(self):
+        self.downloader.options['streaming_window']=2
+        with open(self.path('input.txt'),'w') as f:
+            f.write('car\nkey\nkeyboard\nperplex\n')
+        written=[]
+        stream=self.downloader.stream
+        def spying_stream(lines):
+            for batch in stream(lines):
+                yield batch
+                with open(self.path('output.txt')) as f:
+                    written.append(len(f.read().splitlines()))
+        self.downloader.stream=spying_stream
+        self.downloader.stream_words_to_file(self.path('input.txt'), self.path('output.txt'))
+        self.assertEqual(written,[2,4])
+    def test_results_are_kept(self):
+        self.downloader.words={'car'}
+        self.downloader.process_words()
+        self.assertCountEqual([result for batch in self.downloader.stream(['keyboard','needing']) for result in batch],[('keyboard','A2'),('need','A1')])
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1')])
+        self.downloader.words.add('key')
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),4)
+    def test_compact_seen_set(self):
+        seen=CompactSeenSet(capacity=4)
+        self.assertEqual([seen.add(word) for word in ['a','b','a','c','d','e','b']],[True,True,False,True,True,True,False])
+        self.assertEqual(len(seen),5)
+        self.assertIn('e',seen)
+        self.assertNotIn('f',seen)
+
+class extraction_tests(unittest.TestCase):
+    pages=[
+        '<!DOCTYPE html><html><head><title>car Meaning in the Cambridge English Dictionary</title></head><body><span class="def-info"><span>B1</span> x <b>A2<i>A1</i> C1</b></span></body></html>',
+        '<html><title>go away Meaning in the Cambridge English Dictionary</title><body><span class="def-info">A1<span>B<!--c-->2</span></span></body></html>',
+        '<html><head><title>key Meaning in the Cambridge English Dictionary</title></head><body><span class="def-info x"><span>A1</span></span><p><span class="def-info"><em>C1</em></span></p></body></html>',
+        '<html><head><title>car Meaning in the Cambridge English Dictionary</title></head><body><!-- <span class="def-info"><span>A1</span></span> --><span class=def-info><span>B1</span></span></body></html>',
+        '<html><head><title>car Meaning in the Cambridge English Dictionary</title><script>x="<span class=\'def-info\'><span>A1</span></span>"</script></head><body></body></html>',
+        '<html><head><title>car Meaning in the Cambridge English Dictionary</title></head><body><div><span class="def-info"><span>B1</span></div><span class="def-info"><SPAN>A2</SPAN></span></body></html>',
+        '<html><body><title>key Meaning in the Cambridge English Dictionary</title><span class="def-info"><span>B2</span></span></body></html>',
+        '<head> >/',
+        '<html><head><title>car Meaning in the Cambridge English Dictionary</title></head><body><span class="DEF-INFO"><span>A1</span></span><SPAN CLASS="def-info"><span>B2</span></SPAN></body></html>',
+        '<html><head><title>car Meaning in the Cambridge English Dictionary</title></head><body><span data-x="a>b" class="def-info"><span title=\'>\'>A2</span></span><span data-y=\' class="def-info"\'><span>A1</span></span><span class="x" class="def-info"><span>A1</span></span></body></html>',
+        '<html><head><title>key Meaning in the Cambridge English Dictionary</title></head><body><textarea><span class="def-info"><span>A1</span></span></textarea><title><span class="def-info"><span>A2</span></span></title><span class="def-info"><span>C2</span></span></body></html>',
+        '<html><head><title>key Meaning in the Cambridge English Dictionary</title></head><body>'+''.join('<%s><span class="def-info"><span>A1</span></span></%s>' % (tag, tag)
+            for tag in ('xmp','iframe','NoEmbed','noframes'))+'<span class="def-info"><span>B1</span></span><plaintext><span class="def-info"><span>A2</span></span></plaintext><span class="def-info"><span>A1</span></span></body></html>',
+        ]
+    def results(self, **options):
+        downloader=LevelsDownloaderBase(**options)
+        return [downloader._get_level_from_page_text(word, page) for page in self.pages for word in ('car','key')]
+    def test_targeted_same_as_dom(self):
+        for do_not_change_words in (False, True):
+            self.assertEqual(self.results(extraction_engine='targeted', do_not_change_words=do_not_change_words),
+                self.results(extraction_engine='dom', do_not_change_words=do_not_change_words))
+    def test_complex_xpaths_are_not_targeted(self):
+        downloader=LevelsDownloaderBase(levels_extraction_from_xml={'xpath':"//span[contains(@class,'def-info')]//text()", 'regexp':r'[A-C][1-2]'})
+        self.assertIsNone(downloader.page_texts_selection)
+        self.assertEqual(downloader._get_level_from_page_text('key', self.pages[2]),('key','A1'))
+    def test_stops_at_the_lowest_level(self):
+        downloader=LevelsDownloaderBase()
+        page=dictionary_page('key', ('B1','A1')).decode('utf-8').replace('</body>','<span class="def-info"><span>unclosed</body>')
+        self.assertEqual(downloader._get_level_from_page_text('key', page),('key','A1'))
+        self.assertIsNotNone(downloader.page_texts_selection.extract(page,
+            downloader.get_words_from_xml.keywords['regexp_compiled_pattern'], downloader.get_levels_from_xml.keywords['regexp_compiled_pattern'],
+            lowest_level='A1'))
+
+def _slow_parse_pages(pages):
+    time.sleep(0.2)
+    return _parse_pages(pages)
+
+class parsing_processes_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_same_results_as_parsing_in_threads(self):
+        words=['keyboard','key','perplex','ABCD123','get-away','needing']+['word'+letter for letter in 'abcdefghij']
+        self.downloader.words=words
+        self.downloader.process_words()
+        expected=self.downloader.words_and_levels
+        self.downloader.words_and_levels=[]
+        self.downloader.options.update(parsing_processes=2, parsing_batch_size=3)
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,expected)
+    def test_stage_metrics(self):
+        self.downloader.options.update(parsing_processes=1, parsing_batch_size=2)
+        self.downloader.words=['car','key','keyboard']
+        self.downloader.process_words()
+        metrics=self.downloader.stage_metrics
+        self.assertEqual(metrics['downloading']['items'],3)
+        self.assertEqual(metrics['parsing']['items'],3)
+        self.assertEqual(metrics['parsing']['workers'],1)
+        for stage in ('downloading','parsing'):
+            self.assertGreaterEqual(metrics[stage]['utilization'],0)
+            self.assertLessEqual(metrics[stage]['utilization'],1)
+    def test_downloading_does_not_wait_for_parsing(self):
+        downloaded, stored=[], []
+        urlopen=self.downloader.urlopen_function
+        self.downloader.urlopen_function=lambda url: downloaded.append(time.perf_counter()) or urlopen(url)
+        self.downloader.progress_listeners.append(lambda progress: stored.append(time.perf_counter()))
+        self.downloader.options.update(parsing_processes=1, parsing_batch_size=4, max_number_of_threads=1) #up to 8 pages waiting to be parsed
+        self.downloader.words=['car','key','keyboard','needing','get-away']
+        with unittest.mock.patch('word_level_downloader._parse_pages', _slow_parse_pages):
+            self.downloader.process_words()
+        self.assertEqual(len(downloaded),5)
+        self.assertLess(max(downloaded),min(stored))
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1'),('need','A1'),('keyboard','A2'),('get away','B2')])
+    def test_parsing_errors_are_raised(self):
+        with StubDictionaryServer(pages={'blank':b' \n'}) as stub: #not a document for the parser
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, parsing_processes=1)
+            downloader.words=['blank','car','key']
+            with self.assertRaises(Exception) as raised:
+                downloader.process_words()
+        self.assertIn('Document is empty', str(raised.exception))
+
+class benchmark_tests(unittest.TestCase):
+    def test_stub_errors(self):
+        with StubDictionaryServer(error_rate=1.0) as stub:
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, retry_backoff=0.01)
+            downloader.words=['car']
+            downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('car','UNRESOLVED')])
+        self.assertEqual(stub.counters['requests'],4)
+    def test_stub_serves_recorded_pages(self):
+        with StubDictionaryServer(pages={'car':dictionary_page('car',('B2',))}) as stub:
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building)
+            downloader.words=['car']
+            downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('car','B2')])
+    def test_compare_results(self):
+        baseline={'scenarios':{'read':{'lines_per_second':100.0}, 'memory':{'peak_bytes':100.0}, 'bandwidth':{'streamed_saved_bytes_per_word':100.0, 'streamed_wire_bytes_per_word':100.0}}}
+        current={'scenarios':{'read':{'lines_per_second':85.0}, 'memory':{'peak_bytes':105.0}, 'bandwidth':{'streamed_saved_bytes_per_word':150.0, 'streamed_wire_bytes_per_word':50.0}}}
+        self.assertEqual([regression[:2] for regression in compare_results(baseline, current)],[('read','lines_per_second')])
+        self.assertEqual([regression[:2] for regression in compare_results(current, baseline)],
+            [('bandwidth','streamed_saved_bytes_per_word'),('bandwidth','streamed_wire_bytes_per_word')])
+        self.assertEqual(compare_results({'scenarios':{'server':{'server_requests_per_batch':4.0}}}, {'scenarios':{'server':{'server_requests_per_batch':8.0}}}),[])
+    def test_compare_results_with_zeros(self):
+        baseline={'scenarios':{'threads':{'words_per_second':100.0}, 'adaptive':{'lost_ratio':0.0, 'lost_words':0}}}
+        current={'scenarios':{'threads':{'words_per_second':0.0}, 'adaptive':{'lost_ratio':0.38, 'lost_words':0}}}
+        self.assertEqual(compare_results(baseline, current),
+            [('threads','words_per_second',100.0,0.0,-1.0),('adaptive','lost_ratio',0.0,0.38,0.38)])
+        self.assertEqual(compare_results(current, baseline),[]) #both got better
+    def test_parsing_scenario(self):
+        self.assertEqual(sorted(scenario_parsing(quick=True)),['dom_seconds_per_page','targeted_seconds_per_page'])
+
+class profiling_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.downloader.profiler)
+    def test_stages_and_counters(self):
+        profiler=self.downloader.start_profiling()
+        self.downloader.words=['keyboard','key','perplex','ABCD123']
+        self.downloader.process_words()
+        profile=profiler.to_dict()
+        for stage in ('connecting','downloading','decoding','targeted_extraction','storing'):
+            self.assertEqual(profile['stages'][stage]['count'],4,msg=stage)
+        self.assertEqual(profile['counters']['requests'],4)
+        self.assertEqual(profile['counters']['words_found'],2)
+        self.assertEqual(profile['counters']['words_undefined'],1)
+        self.assertEqual(profile['counters']['words_unfound'],1)
+        self.assertGreater(profile['counters']['bytes'],0)
+    def test_dom_stages(self):
+        profiler=self.downloader.start_profiling()
+        self.downloader.options['extraction_engine']='dom'
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.assertEqual(sorted(stage for stage in profiler.to_dict()['stages'] if stage in ('parsing','xpath','regexp')),['parsing','regexp','xpath'])
+    def test_prometheus_format(self):
+        profiler=Profiler()
+        profiler.observe('downloading',0.003)
+        profiler.observe('downloading',20)
+        profiler.count('requests',2)
+        text=profiler.to_prometheus()
+        self.assertIn('word_level_downloader_stage_seconds_bucket{stage="downloading",le="0.005"} 1\n',text)
+        self.assertIn('word_level_downloader_stage_seconds_bucket{stage="downloading",le="+Inf"} 2\n',text)
+        self.assertIn('word_level_downloader_stage_seconds_count{stage="downloading"} 2\n',text)
+        self.assertIn('word_level_downloader_events_total{event="requests"} 2\n',text)
+    def test_saving(self):
+        self.downloader.start_profiling().count('requests')
+        self.downloader.save_profile(self.path('profile.json'))
+        with open(self.path('profile.json')) as f:
+            self.assertEqual(json.load(f)['counters'],{'requests':1})
+
+class single_flight_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_concurrent_lookups_are_coalesced(self):
+        urlopen=self.downloader.urlopen_function
+        def slow_urlopen(url):
+            time.sleep(0.05)
+            return urlopen(url)
+        self.downloader.urlopen_function=slow_urlopen
+        self.downloader.words=['car']*20+['key']*20
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1')])
+        self.assertEqual(len(urlopen.requests),2)
+    def test_lookups_are_coalesced_with_parsing_processes(self):
+        urlopen=self.downloader.urlopen_function
+        def slow_urlopen(url):
+            time.sleep(0.05)
+            return urlopen(url)
+        self.downloader.urlopen_function=slow_urlopen
+        self.downloader.options['parsing_processes']=2
+        self.downloader.words=['car']*20+['key']*20
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1')])
+        self.assertEqual(len(urlopen.requests),2)
+    def test_main_form_is_not_looked_up_again(self):
+        self.downloader.options['max_number_of_threads']=1 #in the order of the words
+        self.downloader.words=['needing','need']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('need','A1')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),1)
+    def test_phrasal_verb_main_form(self):
+        self.downloader.options['max_number_of_threads']=1
+        self.downloader.urlopen_function.entries['get-into-sth']=('get into sth',('C1',))
+        self.downloader.urlopen_function.entries['into-sth']=('get into sth',('C1',))
+        self.downloader.words=['into-sth','get-into-sth']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('get into sth','C1')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),1)
+    def test_results_are_forgotten_after_a_run(self):
+        self.downloader.options['max_remembered_lookups']=2
+        words=make_words(50, found_ratio=1.0)
+        for batch in self.downloader.stream(['%s %s' % (word, words[i % 3]) for i, word in enumerate(words)]):
+            pass
+        self.assertEqual(len(self.downloader.urlopen_function.requests),50)
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(len(self.downloader.urlopen_function.requests),52)
+    def test_results_depend_on_changing_words(self):
+        self.downloader.words=['needing']
+        self.downloader.process_words()
+        self.downloader.options['do_not_change_words']=True
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('needing','UNFOUND')])
+    def test_asyncio_lookups_are_coalesced(self):
+        with StubDictionaryServer(entries={'car':('car',('A1',))}, latency=0.05) as stub:
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, engine='asyncio')
+            downloader.words=['car']*20
+            downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('car','A1')])
+        self.assertEqual(stub.counters['requests'],1)
+
+class headword_index_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_no_false_negatives_and_tunable_false_positives(self):
+        known=['word%s' % i for i in range(2000)]
+        index=HeadwordIndex.build(known, self.path('index.bloom'), false_positive_rate=0.01)
+        self.assertTrue(all(word in index for word in known))
+        false_positives=sum('other%s' % i in index for i in range(10000))
+        self.assertLess(false_positives,300)
+        index.close()
+    def test_absent_words_are_not_downloaded(self):
+        HeadwordIndex.build(['car','key','need','get away'], self.path('index.bloom'))
+        self.downloader.options.update(headword_index_file=self.path('index.bloom'), do_not_change_words=True)
+        self.downloader.words=['car','key','ABCD123','get-away','qwerty']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1'),('get away','B2'),('qwerty','UNFOUND'),('abcd123','UNFOUND')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),3)
+    def test_words_to_be_changed_are_downloaded(self):
+        with open(self.path('results.txt'),'w') as f:
+            f.write('A1 need\nA1 car\n')
+        self.downloader.build_headword_index(self.path('index.bloom'), [self.path('results.txt')])
+        self.downloader.options['headword_index_file']=self.path('index.bloom')
+        self.downloader.words=['needing','car']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('need','A1')])
+        self.downloader.options['do_not_change_words']=True
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('needing','UNFOUND')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),3)
+    def test_index_of_surface_forms_skips_words_to_be_changed(self):
+        HeadwordIndex.build(['car','need','needing','get away'], self.path('forms.bloom'), surface_forms=True)
+        self.downloader.options['headword_index_file']=self.path('forms.bloom')
+        self.assertTrue(self.downloader._open_headword_index().surface_forms)
+        self.downloader.words=['needing','car','carz','qwerty']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('need','A1'),('carz','UNFOUND'),('qwerty','UNFOUND')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),2)
+        HeadwordIndex.build(['car','need','needing','get away'], self.path('index.bloom'))
+        self.downloader.options['headword_index_file']=self.path('index.bloom')
+        self.assertFalse(self.downloader._open_headword_index().surface_forms)
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(len(self.downloader.urlopen_function.requests),6) #the words missing from an index of headwords could still be changed
+    def test_building_from_past_runs(self):
+        self.downloader.options['cache_file']=self.path('cache.sqlite')
+        self.downloader.words=['needing','abcd']
+        self.downloader.process_words()
+        with open(self.path('results.txt'),'w') as f:
+            f.write('A2 keyboard\nUNFOUND qwerty\nperplex\n')
+        index=self.downloader.build_headword_index(self.path('index.bloom'), [self.path('results.txt')])
+        for word in ('needing','need','keyboard','perplex'):
+            self.assertIn(word,index)
+        self.assertNotIn('qwerty',index)
+        self.assertNotIn('abcd',index)
+    def test_not_an_index(self):
+        with open(self.path('index.bloom'),'wb') as f:
+            f.write(b'something else entirely')
+        self.assertRaises(ValueError, HeadwordIndex, self.path('index.bloom'))
+
+class adaptive_concurrency_tests(unittest.TestCase):
+    def test_additive_increase_and_multiplicative_decrease(self):
+        limiter=AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=6)
+        for _ in range(100):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit,6)
+        limiter.release(limiter.acquire()-1.0, 'throttled')
+        self.assertEqual(limiter.limit,3)
+        limiter.release(limiter.acquire()-1.0, 'failed') #in the same round trip as the previous decrease
+        self.assertEqual(limiter.limit,3)
+        self.assertEqual(limiter.counters['decreases'],1)
+    def test_slow_responses_decrease_the_limit(self):
+        limiter=AdaptiveConcurrencyLimiter(initial_limit=8, latency_tolerance=2.0)
+        limiter.release(limiter.acquire()-0.01)
+        limiter.release(limiter.acquire()-0.05)
+        self.assertLess(limiter.limit,8)
+    def test_requests_per_second(self):
+        limiter=AdaptiveConcurrencyLimiter(max_limit=50, requests_per_second=100)
+        start=time.monotonic()
+        for _ in range(150):
+            limiter.release(limiter.acquire())
+        self.assertGreaterEqual(time.monotonic()-start,0.45) #100 at once then 50 more at 100 per second
+    def test_throttling_stub_dictionary(self):
+        with StubDictionaryServer(latency=0.02, capacity=5) as stub:
+            results={}
+            for adaptive in (False, True):
+                downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building,
+                    max_number_of_threads=40, adaptive_concurrency=adaptive, max_retries=0)
+                downloader.words=make_words(200, found_ratio=1.0)
+                downloader.process_words()
+                results[adaptive]=sum(level == 'UNRESOLVED' for word, level in downloader.words_and_levels)
+        self.assertGreater(results[False],50)
+        self.assertLess(results[True],results[False]/3)
+        self.assertLessEqual(downloader.concurrency_limiter.limit,10)
+
+class retry_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.downloader.options['retry_backoff']=0.01
+        self.failures={}
+        urlopen=self.downloader.urlopen_function
+        def failing_urlopen(url):
+            error=self.failures.get(urllib.parse.unquote(url.rsplit('=',1)[-1]))
+            if isinstance(error, list):
+                error=error and error.pop()
+            if error:
+                urlopen.requests.append(url)
+                raise error
+            return urlopen(url)
+        self.downloader.urlopen_function=failing_urlopen
+        self.requests=urlopen.requests
+    def test_transient_errors_are_retried(self):
+        self.failures['car']=[ConnectionResetError(), urllib.error.URLError(TimeoutError())]
+        self.failures['key']=[urllib.error.HTTPError('', 503, 'Service unavailable', {}, None), http.client.IncompleteRead(b'')]
+        self.downloader.words=['car','key','need']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1'),('need','A1')])
+        self.assertEqual(len(self.requests),7)
+    def test_definitive_errors_are_not_retried(self):
+        self.failures['car']=urllib.error.HTTPError('', 404, 'Not found', {}, None)
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','UNFOUND')])
+        self.assertEqual(len(self.requests),1)
+    def test_unresolved_words_are_not_cached(self):
+        self.downloader.options['cache_file']=self.path('cache.sqlite')
+        self.failures['car']=ConnectionRefusedError()
+        self.downloader.words=['car','key']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('key','A1'),('car','UNRESOLVED')])
+        self.assertEqual(len(self.requests),5)
+        del self.failures['car']
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1')])
+    def test_retry_budget(self):
+        words=['word%s' % i for i in range(100)]
+        self.failures.update((word, ConnectionResetError()) for word in words)
+        self.downloader.options['retry_budget']=0.3
+        self.downloader.words=words
+        self.downloader.process_words()
+        self.assertEqual(len(self.requests),130)
+        self.assertTrue(all(level == 'UNRESOLVED' for word, level in self.downloader.words_and_levels))
+    def test_parsing_processes_and_asyncio(self):
+        with StubDictionaryServer(error_rate=0.3) as stub:
+            for options in ({'parsing_processes':1}, {'engine':'asyncio'}):
+                downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, retry_backoff=0.01, max_retries=10, retry_budget=1.0, **options)
+                downloader.words=make_words(50, found_ratio=1.0)
+                downloader.process_words()
+                self.assertFalse([word for word, level in downloader.words_and_levels if level in ('UNFOUND','UNRESOLVED')])
+
+class streamed_fetching_tests(unittest.TestCase):
+    def setUp(self):
+        self.stub=StubDictionaryServer(entries={'car':('car',('B2','A1','C1')), 'needing':('need',('B1','A2')), 'perplex':('perplex',())},
+            padding=100000).start()
+        self.addCleanup(self.stub.stop)
+    def process(self, words, **options):
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=self.stub.link_building, **options)
+        profiler=downloader.start_profiling()
+        downloader.words=words
+        downloader.process_words()
+        return downloader.words_and_levels, profiler.counters
+    def test_same_results_with_fewer_bytes(self):
+        words=make_words(30)+['car','needing','perplex']
+        full, full_counters=self.process(words)
+        streamed, streamed_counters=self.process(words, fetch_mode='streamed')
+        self.assertEqual(streamed,full)
+        self.assertLess(streamed_counters['bytes_on_wire'],full_counters['bytes']/2)
+    def test_reading_stops_once_the_result_is_known(self):
+        result, counters=self.process(['car'], fetch_mode='streamed', fetch_chunk_size=4096)
+        self.assertEqual(result,[('car','A1')])
+        self.assertEqual(counters['early_terminated_pages'],1)
+        self.assertLess(counters['bytes'],len(self.stub.page('car'))*0.75)
+    def test_levels_to_read(self):
+        for options in ({}, {'fetch_mode':'streamed'}):
+            result, counters=self.process(['car','needing'], levels_to_read=1, **options)
+            self.assertEqual(result,[('need','B1'),('car','B2')])
+    def test_deflate_and_identity(self):
+        page=self.stub.page('needing')
+        class response(io.BytesIO):
+            def __init__(self, body, encoding):
+                super().__init__(body)
+                self.headers={'Content-Encoding':encoding}
+        for encoding, body in (('identity', page), ('deflate', zlib.compress(page)), ('deflate', zlib.compress(page)[2:-4]), ('gzip', gzip.compress(page))):
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, fetch_mode='streamed')
+            downloader.urlopen_function=lambda request: response(body, encoding)
+            downloader.words=['needing']
+            downloader.process_words()
+            self.assertEqual(downloader.words_and_levels,[('need','A2')])
+    def test_asyncio_engine_asks_for_compressed_pages(self):
+        result, counters=self.process(['car','needing'], fetch_mode='streamed', engine='asyncio')
+        self.assertEqual(result,[('car','A1'),('need','A2')])
+        self.assertLess(counters['bytes_on_wire'],counters['bytes']/2)
+
+class reading_processes_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        generator=random.Random(0)
+        lines=['%s %s - %s' % (generator.choice(('get','look','* take','1. put','żółw','Straße','')), ''.join(generator.choice('abcdefghij') for _ in range(generator.randint(0,6))),
+            generator.choice(('sth','sb','explanation'))) for _ in range(5000)]
+        self.text=generator.choice(('\n','\r\n','\r')).join(lines)
+    def read(self, encoding='utf-8', **options):
+        with open(self.path('notes.txt'),'w',encoding=encoding,newline='') as f:
+            f.write(self.text)
+        downloaders=[]
+        for reading_processes in (0, 3):
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, reading_processes=reading_processes, reading_chunk_size=4096, **options)
+            downloader.read_words_from_file(self.path('notes.txt'), encoding)
+            downloaders.append(downloader.words)
+        return downloaders
+    def test_same_words_as_reading_in_one_thread(self):
+        for options in ({}, {'many_phrasal_verbs':True, 'max_number_of_words_in_phrasal_verb':2}):
+            in_one_thread, in_processes=self.read(**options)
+            self.assertGreater(len(in_one_thread),1000)
+            self.assertEqual(in_processes,in_one_thread)
+    def test_newlines(self):
+        self.text='\r\n'.join(['get sth done']*2000)+'\rcar\r\nkey\nlast'
+        in_one_thread, in_processes=self.read()
+        self.assertEqual(in_processes,{'get-sth-done','car','key','last'})
+        self.assertEqual(in_processes,in_one_thread)
+    def test_encodings_with_other_newlines(self):
+        in_one_thread, in_processes=self.read('utf-16')
+        self.assertEqual(in_processes,in_one_thread)
+    def test_line_aligned_chunks(self):
+        data=b'abc\ndefgh\n\nij\nk'
+        chunks=list(_line_aligned_chunks(data, 3))
+        self.assertEqual([data[start:end] for start, end in chunks],[b'abc\n',b'defgh\n',b'\nij\n',b'k'])
+
+class incremental_processing_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_only_new_words_are_looked_up(self):
+        self.downloader.words={'keyboard','perplex','ABCD123'}
+        self.downloader.process_words()
+        self.downloader.words|={'get-away','key'}
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('key','A1'),('keyboard','A2'),('get away','B2'),('perplex','UNDEFINED'),('abcd123','UNFOUND')])
+        self.assertEqual(len(self.downloader.urlopen_function.requests),5)
+    def test_changed_results_are_sorted_again(self):
+        self.downloader.words=['key','car']
+        self.downloader.process_words()
+        self.downloader.words_and_levels.append(('keyboard','A2'))
+        self.downloader.words_and_levels.insert(0,('zebra','A2'))
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1'),('zebra','A2'),('keyboard','A2')])
+    def test_unresolved_words_are_looked_up_again(self):
+        urlopen=self.downloader.urlopen_function
+        self.downloader.options['max_retries']=0
+        self.downloader.urlopen_function=unittest.mock.Mock(side_effect=ConnectionResetError())
+        self.downloader.words=['car','key']
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','UNRESOLVED'),('key','UNRESOLVED')])
+        self.downloader.urlopen_function=urlopen
+        self.downloader.process_words()
+        self.assertEqual(self.downloader.words_and_levels,[('car','A1'),('key','A1')])
+    def test_cost_grows_with_the_delta(self):
+        self.downloader._download_words=lambda words: [self.downloader._store_result(word, word, LEVELS[len(word) % len(LEVELS)]) for word in words]
+        self.downloader.words=set('word%s' % i for i in range(200000))
+        self.downloader.process_words()
+        start=time.perf_counter()
+        for i in range(20):
+            self.downloader.words.add('new%s' % i)
+            self.downloader.process_words()
+        self.assertLess(time.perf_counter()-start,1)
+        self.assertEqual(self.downloader.words_and_levels,sorted(self.downloader.words_and_levels,key=LevelsDownloaderBase.result_sorting_key))
+        self.assertEqual(len(self.downloader.words_and_levels),200020)
+
+class result_store_tests(unittest.TestCase):
+    def test_order_and_duplicates(self):
+        generator=random.Random(0)
+        results=[(''.join(generator.choice('abc ') for _ in range(generator.randint(1,5))).strip() or 'a', generator.choice(ResultStore.levels+('B3',)))
+            for _ in range(3000)]
+        store=ResultStore()
+        threads=[threading.Thread(target=lambda part: [store.add(*result) for result in part], args=(results[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        records=store.take()
+        self.assertEqual(len(records),3000)
+        store.merge(records)
+        self.assertEqual(len(store.take()),0)
+        expected=sorted(set(results), key=LevelsDownloaderBase.result_sorting_key)
+        self.assertEqual(ResultsView(store),expected)
+        store.add('zz','A1')
+        store.add('a','A1')
+        store.merge(store.take())
+        self.assertEqual(ResultsView(store),sorted(set(expected+[('zz','A1'),('a','A1')]), key=LevelsDownloaderBase.result_sorting_key))
+    def test_view(self):
+        downloader=LevelsDownloaderBase()
+        downloader.words_and_levels=[('key','A1'),('car','A1'),('keyboard','A2')]
+        downloader.process_words()
+        view=downloader.words_and_levels
+        self.assertEqual(view,[('car','A1'),('key','A1'),('keyboard','A2')])
+        self.assertEqual((view[0],view[-1],view[1:]),(('car','A1'),('keyboard','A2'),[('key','A1'),('keyboard','A2')]))
+        self.assertEqual(len(view),3)
+        self.assertNotEqual(view,[('car','A1')])
+        downloader.words_and_levels=[]
+        self.assertEqual(len(view),3) #like a list replaced with another one
+        self.assertFalse(downloader.words_and_levels)
+    def test_view_of_assigned_results(self):
+        downloader=LevelsDownloader()
+        downloader.words_and_levels=[('key','A2'),('car','A1')]
+        self.assertEqual(downloader.words_and_levels,[('key','A2'),('car','A1')]) #as assigned until the next process_words
+        self.assertEqual(len(downloader.words_and_levels),2)
+        self.assertEqual(pickle.loads(pickle.dumps(downloader.words_and_levels)),[('key','A2'),('car','A1')])
+        self.assertEqual(copy.deepcopy(downloader.words_and_levels),[('key','A2'),('car','A1')])
+        self.assertEqual(json.loads(json.dumps(list(downloader.words_and_levels))),[['key','A2'],['car','A1']])
+        with tempfile.TemporaryDirectory() as directory:
+            downloader.save_words_to_file(os.path.join(directory,'levels.txt'))
+            with open(os.path.join(directory,'levels.txt')) as file:
+                self.assertEqual(file.read(),'A2 key\nA1 car\n')
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('car','A1'),('key','A2')])
+    def test_view_changed_like_a_list(self):
+        downloader=LevelsDownloaderBase()
+        downloader.words_and_levels=[('key','A1'),('car','A1')]
+        downloader.process_words()
+        view=downloader.words_and_levels
+        view.insert(0,('zebra','B2'))
+        view.extend([('ant','A2'),('bee','B1')])
+        view+=[('key','A1')]
+        view[1]=('cat','A1')
+        del view[2]
+        self.assertEqual(view,[('zebra','B2'),('cat','A1'),('ant','A2'),('bee','B1'),('key','A1')])
+        self.assertEqual(view.pop(),('key','A1'))
+        view.remove(('bee','B1'))
+        view.sort()
+        self.assertEqual(view+[('x','C1')],[('ant','A2'),('cat','A1'),('zebra','B2'),('x','C1')])
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('cat','A1'),('ant','A2'),('zebra','B2')])
+        view.clear()
+        downloader.process_words()
+        self.assertEqual(len(downloader.words_and_levels),0)
+
+class journal_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.downloader.options['journal_file'] = self.path('run.journal')
+    def resumed_downloader(self, **options):
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, journal_file=self.path('run.journal'), **options)
+        downloader.urlopen_function = mock_dictionary_urlopen()
+        return downloader
+    def test_resumed_run_does_not_download_journaled_words(self):
+        self.downloader.words=['keyboard','needing','ABCD123']
+        self.downloader.process_words()
+        self.downloader.close_journal()
+        downloader=self.resumed_downloader()
+        self.assertEqual(downloader.resume(),3)
+        downloader.words=['keyboard','needing','ABCD123','get-away']
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('need','A1'),('keyboard','A2'),('get away','B2'),('abcd123','UNFOUND')])
+        self.assertEqual(len(downloader.urlopen_function.requests),1)
+        downloader.close_journal()
+        self.assertEqual(len(ResultJournal.read(self.path('run.journal'),{})[0]),4)
+    def test_concurrent_flushes(self):
+        journal=ResultJournal(self.path('flushed.journal'), {}, sync_interval=0.001)
+        def add_and_flush(part):
+            for i in range(500):
+                journal.add('word%s_%s' % (part, i), 'word', 'A1')
+                if i % 10 == 0:
+                    journal.flush()
+        threads=[threading.Thread(target=add_and_flush, args=(part,)) for part in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.close()
+        records, length=ResultJournal.read(self.path('flushed.journal'), {})
+        self.assertEqual(len(records),2000)
+        self.assertEqual(length,os.path.getsize(self.path('flushed.journal')))
+    def test_torn_last_line_is_ignored(self):
+        self.downloader.words=['keyboard','car']
+        self.downloader.process_words()
+        self.downloader.close_journal()
+        with open(self.path('run.journal'),'a') as file:
+            file.write('["key", "ke')
+        downloader=self.resumed_downloader()
+        self.assertEqual(downloader.resume(),2)
+        downloader.words=['key']
+        downloader.process_words()
+        downloader.close_journal()
+        records,length=ResultJournal.read(self.path('run.journal'),{})
+        self.assertEqual(records['key'],('key','A1'))
+        self.assertEqual(length,os.path.getsize(self.path('run.journal')))
+    def test_unresolved_words_are_not_journaled(self):
+        self.downloader.options['max_retries']=0
+        self.downloader.urlopen_function=unittest.mock.Mock(side_effect=ConnectionResetError())
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.downloader.close_journal()
+        self.assertEqual(ResultJournal.read(self.path('run.journal'),{})[0],{})
+    def test_journal_of_other_options_is_refused(self):
+        self.downloader.words=['needing']
+        self.downloader.process_words()
+        self.downloader.close_journal()
+        with self.assertRaises(ValueError):
+            self.resumed_downloader(do_not_change_words=True).resume()
+    def test_records_are_synced_while_running(self):
+        self.downloader.options['journal_sync_interval']=0.01
+        self.downloader._download_words=lambda words: [self.downloader._store_result(word, word, 'A1') or time.sleep(0.05) for word in words]
+        self.downloader.words=['car','key','dog']
+        thread=threading.Thread(target=self.downloader.process_words)
+        thread.start()
+        time.sleep(0.08)
+        records=ResultJournal.read(self.path('run.journal'),{})[0]
+        thread.join()
+        self.downloader.close_journal(remove=True)
+        self.assertIn('car',records)
+        self.assertNotIn('dog',records)
+        self.assertFalse(os.path.exists(self.path('run.journal')))
+    def run_main(self, *arguments):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.path(''))
+        with unittest.mock.patch('word_level_downloader.urlopen', mock_dictionary_urlopen()), unittest.mock.patch('sys.argv', ['word_level_downloader', '--silent']+list(arguments)):
+            main()
+    def test_command_line_journals_only_when_asked(self):
+        self.run_main('--output', 'levels.txt', 'car')
+        self.assertEqual(sorted(os.listdir(self.path(''))),['config.json','levels.txt'])
+        self.run_main('--journal', 'run.journal', '--output', 'levels.txt', 'car')
+        self.assertFalse(os.path.exists(self.path('run.journal')))
+    def test_journal_is_kept_when_saving_fails(self):
+        os.mkdir(self.path('levels.txt'))
+        with self.assertRaises(IOError):
+            self.run_main('--journal', 'run.journal', '--output', 'levels.txt', 'car')
+        self.assertEqual(ResultJournal.read(self.path('run.journal'),{})[0]['car'],('car','A1'))
+        with unittest.mock.patch.object(LevelsDownloader, 'save_words_to_file', return_value=False): #as when the problem is printed
+            self.run_main('--resume', '--journal', 'run.journal', '--output', 'levels.txt', 'car')
+        self.assertTrue(os.path.exists(self.path('run.journal')))
+
+class lookup_server_tests(unittest.TestCase):
+    def setUp(self):
+        self.stub=StubDictionaryServer(entries={'needing':('need',('A1','B1')), 'get-away':('get away',('B2',))}, latency=0.02).start()
+        self.addCleanup(self.stub.stop)
+        self.directory=tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=self.stub.link_building, engine='asyncio', keep_connections=True,
+            cache_file=os.path.join(self.directory.name, 'cache.sqlite'))
+        self.server=LookupServer(('127.0.0.1', 0), self.downloader, batch_delay=0.05)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.address='127.0.0.1:%s' % self.server.server_address[1]
+    def client(self, **options):
+        return LevelsDownloader(silent_mode=True, dump_config=False, server_address=self.address, **options)
+    def test_same_results_as_looking_up_here(self):
+        words=make_words(50)+['needing','get-away']
+        client=self.client()
+        client.words=words
+        client.process_words()
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=self.stub.link_building)
+        downloader.words=words
+        downloader.process_words()
+        self.assertEqual(client.words_and_levels,downloader.words_and_levels)
+    def test_concurrent_requests_are_batched(self):
+        clients=[self.client() for _ in range(8)]
+        for i, client in enumerate(clients):
+            client.words=['word%s' % chr(ord('a')+i), 'needing']
+        threads=[threading.Thread(target=client.process_words) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        status=json.load(urllib.request.urlopen('http://%s/status' % self.address))
+        self.assertEqual(status['requests'],8)
+        self.assertLess(status['batches'],8)
+        self.assertEqual(self.stub.counters['requests'],9)
+        self.assertEqual(clients[3].words_and_levels.index(('need','A1')),0)
+    def test_warm_state_is_kept_between_requests(self):
+        for _ in range(3):
+            client=self.client()
+            client.words=make_words(20)
+            client.process_words()
+        self.assertEqual(self.stub.counters['requests'],20)
+        self.assertLessEqual(self.stub.counters['connections'],self.downloader.options['max_number_of_connections_per_host'])
+    def test_request_options(self):
+        client=self.client(do_not_change_words=True)
+        client.words=['needing']
+        client.process_words()
+        self.assertEqual(client.words_and_levels,[('needing','UNFOUND')])
+        self.assertFalse(self.downloader.options['do_not_change_words'])
+    def test_unreachable_server(self):
+        with socket.socket() as unused: #a port nothing listens on
+            unused.bind(('127.0.0.1', 0))
+            client=LevelsDownloader(silent_mode=True, dump_config=False, server_address='127.0.0.1:%s' % unused.getsockname()[1])
+            client.words=['car','get-away']
+            client.process_words()
+        self.assertEqual(client.words_and_levels,[('car','UNRESOLVED'),('get away','UNRESOLVED')])
+    def test_malformed_answer(self):
+        with StubDictionaryServer() as stub: #answers like the dictionary rather than like a lookup server
+            client=LevelsDownloader(silent_mode=True, dump_config=False, server_address='127.0.0.1:%s' % stub.server.server_address[1])
+            client.words=['car']
+            client.process_words()
+        self.assertEqual(client.words_and_levels,[('car','UNRESOLVED')])
+    def test_malformed_request(self):
+        request=urllib.request.Request('http://%s/lookup' % self.address, b'{"words": "car"}')
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        self.assertEqual(error.exception.code,400)
+
+class hedging_tests(unittest.TestCase):
+    def setUp(self):
+        self.slow=StubDictionaryServer(entries={'needing':('need',('A1','B1'))}, latency=0.5).start()
+        self.fast=StubDictionaryServer(entries={'needing':('need',('A1','B1'))}).start()
+        self.addCleanup(self.slow.stop)
+        self.addCleanup(self.fast.stop)
+    def process(self, words, main, backends, **options):
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=main.link_building,
+            backends=[{'link_building':backend.link_building} for backend in backends], hedge_delay=0.05, max_retries=0, **options)
+        profiler=downloader.start_profiling()
+        downloader.words=words
+        start=time.perf_counter()
+        downloader.process_words()
+        return downloader.words_and_levels, time.perf_counter()-start, profiler.counters
+    def test_slow_backend_is_hedged(self):
+        for options in ({'engine':'threads'}, {'engine':'asyncio'}, {'parsing_processes':1}):
+            results, elapsed, counters=self.process(['needing','car','abc1'], self.slow, [self.fast], hedge_drain_timeout=0, **options) #the time of the answers
+            self.assertEqual(results,[('need','A1'),('car','C1'),('abc1','UNFOUND')])
+            self.assertLess(elapsed,0.45)
+            self.assertEqual(counters['hedged_requests'],3)
+            self.assertEqual(counters['hedged_answers'],3)
+    def test_losing_requests_are_waited_for(self):
+        for drain_timeout, left in ((None, 0), (0, 3)):
+            downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=self.slow.link_building,
+                backends=[{'link_building':self.fast.link_building}], hedge_delay=0.05, max_retries=0, hedge_drain_timeout=drain_timeout)
+            downloading=[]
+            download=downloader._download
+            def tracked_download(link):
+                downloading.append(link)
+                try:
+                    return download(link)
+                finally:
+                    downloading.remove(link)
+            downloader._download=tracked_download
+            downloader.words=['needing','car','abc1']
+            downloader.process_words()
+            self.assertEqual(downloader.words_and_levels,[('need','A1'),('car','C1'),('abc1','UNFOUND')])
+            self.assertEqual(len(downloading),left)
+            time.sleep(0.5)
+    def test_fast_backend_is_not_hedged(self):
+        results, elapsed, counters=self.process(['needing'], self.fast, [self.slow])
+        self.assertEqual(results,[('need','A1')])
+        self.assertEqual(self.slow.counters['requests'],0)
+        self.assertNotIn('hedged_answers',counters)
+    def test_failing_backend_is_hedged_at_once(self):
+        failing=StubDictionaryServer(error_rate=1.0).start()
+        self.addCleanup(failing.stop)
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=failing.link_building,
+            backends=[{'link_building':self.fast.link_building}], hedge_delay=10, max_retries=0)
+        downloader.words=['needing']
+        start=time.perf_counter()
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('need','A1')])
+        self.assertLess(time.perf_counter()-start,1)
+    def test_backends_have_their_own_extraction(self):
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=self.slow.link_building, hedge_delay=0.05,
+            backends=[{'link_building':self.fast.link_building, 'levels_extraction_from_xml':{'xpath':"//span[@class='def-info']/*/text()", 'regexp':r'B[1-2]'}}])
+        downloader.words=['needing']
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('need','B1')])
+    def test_delay_follows_the_percentile(self):
+        delay=LatencyPercentile(0.9, initial=1.0, refresh=10, min_observations=20)
+        for i in range(19):
+            delay.observe(i/100)
+        self.assertEqual(delay.value,1.0)
+        delay.observe(0.19)
+        self.assertEqual(delay.value,0.18)
+
+class sharding_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.words=['keyboard','key','perplex','ABCD123','get-away','needing','need','car']+make_words(40)
+        self.entries=dict(mock_dictionary_urlopen().entries, **{word:(word,(LEVELS[len(word) % len(LEVELS)],)) for word in make_words(40)[::3]})
+    def run_shard(self, shard, output_file):
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, shard=shard)
+        downloader.urlopen_function=mock_dictionary_urlopen(self.entries)
+        downloader.words=set(self.words)
+        downloader.process_words()
+        downloader.save_words_to_file(output_file)
+        return downloader.urlopen_function.requests
+    def test_shards_look_up_every_word_once(self):
+        requests=[set(self.run_shard([i, 3], self.path('part%s.txt' % i))) for i in range(3)]
+        self.assertTrue(all(requests))
+        self.assertEqual(sum(map(len, requests)),len(set.union(*requests)))
+        self.assertLessEqual(set(self.run_shard(None, self.path('whole.txt'))),set.union(*requests)) #a shard cannot reuse the main forms found by the others
+    def test_merged_shards_are_the_whole_run(self):
+        parts=[self.path('part%s.txt' % i) for i in range(3)]
+        for i, part in enumerate(parts):
+            self.run_shard([i, 3], part)
+        self.run_shard(None, self.path('whole.txt'))
+        merge_results_files(self.path('merged.txt'), parts)
+        with open(self.path('merged.txt')) as merged, open(self.path('whole.txt')) as whole:
+            self.assertEqual(merged.read(),whole.read())
+    def test_merge_deduplicates(self):
+        for name in ('a.txt','b.txt'):
+            with open(self.path(name),'w') as f:
+                f.write('A1 car\nA1 need\nB2 get away\n')
+        merge_results_files(self.path('merged.txt'), [self.path('a.txt'), self.path('b.txt')])
+        with open(self.path('merged.txt')) as f:
+            self.assertEqual(f.read(),'A1 car\nA1 need\nB2 get away\n')
+    def test_unordered_part_is_refused(self):
+        with open(self.path('a.txt'),'w') as f:
+            f.write('B2 get away\nA1 car\n')
+        with self.assertRaises(ValueError):
+            merge_results_files(self.path('merged.txt'), [self.path('a.txt')])
+
+class startup_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def test_importing_does_not_load_the_modules_of_looking_up(self):
+        modules=['lxml.etree','urllib.request','http.server','asyncio','multiprocessing.dummy','concurrent.futures','sqlite3','pdb','getopt']
+        loaded=subprocess.run([sys.executable, '-c', 'import sys, word_level_downloader; print(" ".join(sorted(set(sys.argv[1:]) & set(sys.modules))))']+modules,
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.split()
+        self.assertEqual(loaded,[])
+    def test_help_is_printed_without_creating_files(self):
+        printed=subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'word_level_downloader.py'), '--help'], cwd=self.path(''), capture_output=True, text=True)
+        self.assertEqual(printed.returncode,0)
+        self.assertIn('Example Usage',printed.stdout)
+        self.assertEqual(os.listdir(self.path('')),[])
+    def test_patterns_are_compiled_once_for_the_same_options(self):
+        other=LevelsDownloader(silent_mode=True, dump_config=False)
+        self.assertIs(other.page_texts_selection,self.downloader.page_texts_selection)
+        self.assertIs(other.words_regexp_pattern,self.downloader.words_regexp_pattern)
+        changed=LevelsDownloader(silent_mode=True, dump_config=False, max_number_of_words_in_phrasal_verb=5)
+        self.assertIsNot(changed.words_regexp_pattern,self.downloader.words_regexp_pattern)
+        self.assertEqual(changed.words_regexp_pattern.groups,6) #the first word and 5 more
+    def test_unchanged_config_is_not_rewritten(self):
+        config_file=self.path('config.json')
+        LevelsDownloader(silent_mode=True, config_file=config_file).dump()
+        os.utime(config_file, ns=(10**18, 10**18)) #a write would change the modification time
+        downloader=LevelsDownloader(silent_mode=True, config_file=config_file)
+        downloader.dump()
+        self.assertEqual(os.stat(config_file).st_mtime_ns,10**18)
+        downloader.options['test option']='test'
+        downloader.dump()
+        self.assertNotEqual(os.stat(config_file).st_mtime_ns,10**18)
+        self.assertEqual(LevelsDownloader(silent_mode=True, dump_config=False, config_file=config_file).options['test option'],'test')
+
+class progress_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.downloader.words=['keyboard','key','perplex','ABCD123','get-away']
+    def test_listeners_see_every_word_in_order(self):
+        seen=[]
+        self.downloader.progress_listeners.append(seen.append)
+        self.downloader.process_words()
+        self.assertEqual([progress.completed for progress in seen],[1,2,3,4,5,5])
+        self.assertEqual([progress.done for progress in seen],[False]*5+[True])
+        self.assertEqual((seen[-1].total,seen[-1].fraction,seen[-1].eta),(5,1.0,0.0))
+    def test_words_without_results_are_not_waited_for(self):
+        seen=[]
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, shard=[0, 2])
+        downloader.urlopen_function=mock_dictionary_urlopen()
+        downloader.progress_listeners.append(seen.append)
+        downloader.words=set(self.downloader.words)
+        downloader.process_words()
+        self.assertEqual(seen[-1].total,seen[-1].completed)
+        self.assertLess(seen[-1].total,5)
+    def test_silent_run_follows_nothing(self):
+        with unittest.mock.patch('word_level_downloader.ProgressTracker') as tracker:
+            self.downloader.process_words()
+        tracker.assert_not_called()
+    def test_rate_and_time_left(self):
+        progress=Progress(10, 4, 2.0, 2.0)
+        self.assertEqual((progress.fraction,progress.eta),(0.4,3.0))
+        self.assertIsNone(Progress(10, 0, 0.0, 0.0).eta)
+        seen=[]
+        tracker=ProgressTracker([seen.append], window=0.5)
+        tracker.add(100)
+        for _ in range(20):
+            time.sleep(0.01)
+            tracker.complete()
+        self.assertGreater(seen[-1].rate,20)
+        self.assertLess(seen[-1].rate,200)
+        self.assertAlmostEqual(seen[-1].eta,80/seen[-1].rate)
+    def test_terminal_printing_is_throttled(self):
+        output=io.StringIO()
+        printer=TerminalProgress(interval=60, file=output)
+        for completed in range(1, 101):
+            printer(Progress(100, completed, 1.0, 10.0))
+        printer(Progress(100, 100, 1.0, 10.0, done=True))
+        self.assertEqual(output.getvalue().count('\r'),2)
+        self.assertTrue(output.getvalue().split('\r')[-1].startswith('100% completed... 10.0 words/s'))
+    def test_asynchronous_iteration(self):
+        async def follow():
+            updates=self.downloader.progress_updates()
+            run=asyncio.ensure_future(asyncio.to_thread(self.downloader.process_words))
+            seen=[progress async for progress in updates]
+            await run
+            return seen
+        seen=asyncio.run(follow())
+        self.assertTrue(seen[-1].done)
+        self.assertEqual(seen[-1].completed,5)
+        self.assertEqual(sorted(progress.completed for progress in seen),[progress.completed for progress in seen])
+        self.assertEqual(self.downloader.progress_listeners,[])
+
+class output_format_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.downloader.words=['keyboard','key','perplex','ABCD123','get-away','needing','car']
+        self.downloader.process_words()
+    def read(self, file_path):
+        if file_path.endswith('.wlr'):
+            with open(file_path,'rb') as f:
+                return list(read_binary_results(f))
+        with open(file_path, newline='') as f:
+            if file_path.endswith('.jsonl'):
+                return [(result['word'],result['level']) for result in map(json.loads, f)]
+            if file_path.endswith('.csv'):
+                rows=list(csv.reader(f))
+                self.assertEqual(rows[0],['level','word'])
+                return [(word,level) for level, word in rows[1:]]
+            return [tuple(reversed(line.split(' ',1))) for line in f.read().splitlines()]
+    def test_formats_chosen_by_extension(self):
+        for name in ('levels.txt','levels.jsonl','levels.csv','levels.wlr'):
+            self.downloader.save_words_to_file(self.path(name))
+            self.assertEqual(self.read(self.path(name)),list(self.downloader.words_and_levels),msg=name)
+    def test_format_option_overrides_extension(self):
+        self.downloader.options['output_format']='jsonl'
+        self.downloader.save_words_to_file(self.path('levels.txt'))
+        with open(self.path('levels.txt')) as f:
+            self.assertEqual(json.loads(f.readline()),{'word':'car','level':'A1'})
+    def test_binary_blocks(self):
+        results=[('word%s' % i, LEVELS[i % 6]) for i in range(1000)]+[('żółw','UNFOUND'),('x'*300,'B2'),('get away','B2')] #the block of the long word stores 4 byte lengths
+        output=io.BytesIO()
+        writer=BinaryResultsWriter(output, block_size=100)
+        writer.write(results[:150])
+        writer.write(results[150:])
+        writer.close()
+        self.assertEqual(list(read_binary_results(io.BytesIO(output.getvalue()))),results)
+        with self.assertRaises(ValueError):
+            list(read_binary_results(io.BytesIO(output.getvalue()[:-1])))
+    def test_external_sort_spills_and_deduplicates(self):
+        generator=random.Random(0)
+        results=[('%s%s' % (generator.choice(['get ','']), generator.choice(make_words(300))), generator.choice(LEVELS)) for _ in range(3000)]
+        with ExternalSorter(run_size=100, max_runs=4) as sorter:
+            for start in range(0, len(results), 50):
+                sorter.add(results[start:start+50])
+            self.assertGreater(sorter.spilled,30)
+            self.assertEqual(list(sorter),sorted(set(results), key=LevelsDownloaderBase.result_sorting_key))
+    def test_sorted_stream(self):
+        lines=['keyboard','key','perplex - tricky','ABCD123','get away','key','needing','car']
+        self.downloader.options.update(streaming_window=2, sort_run_size=3)
+        self.downloader.stream_words_to_file(None, self.path('unsorted.csv'), lines)
+        self.downloader.stream_words_to_file(None, self.path('sorted.csv'), lines, sort=True)
+        self.assertEqual(self.read(self.path('sorted.csv')),sorted(self.read(self.path('unsorted.csv')), key=LevelsDownloaderBase.result_sorting_key))
+
+class page_store_tests(LevelsDownloaderTestWithOfflineDictionary):
+    def setUp(self):
+        super().setUp()
+        self.requests=self.downloader.urlopen_function.requests
+        self.downloader.options['page_store_file']=self.path('pages.pack')
+        self.downloader.words=['keyboard','key','perplex','ABCD123','get-away']
+        self.addCleanup(self.downloader.close_page_store)
+    def test_round_trip_and_latest_record(self):
+        with PageStore(self.path('store.pack')) as store:
+            pages={'https://example.com/?q=word%s' % i:('page %s ' % i*(i % 50)).encode() for i in range(3000)} #the index grows a few times
+            for url, page in pages.items():
+                store.put(url, page, status=200, etag='"%s"' % len(page))
+            store.put('https://example.com/?q=word7', b'changed', status=200)
+            pages['https://example.com/?q=word7']=b'changed'
+            self.assertEqual(len(store),3000)
+            self.assertEqual(store.get('https://example.com/?q=word5'),({'status':200,'etag':'"35"'},pages['https://example.com/?q=word5']))
+            self.assertEqual(store.get('https://example.com/?q=word7'),({'status':200},b'changed'))
+            self.assertIsNone(store.get('https://example.com/?q=missing'))
+        for remove_index in (False, True):
+            if remove_index:
+                os.remove(self.path('store.pack.index'))
+            with PageStore(self.path('store.pack')) as store:
+                self.assertEqual({url:page for url, metadata, page in store.items()},pages)
+    def test_partly_written_record_is_cut_off(self):
+        with PageStore(self.path('store.pack')) as store:
+            store.put('a', b'first')
+            store.put('b', b'second')
+        size=os.path.getsize(self.path('store.pack'))
+        with open(self.path('store.pack'),'r+b') as f:
+            f.truncate(size-3)
+        os.remove(self.path('store.pack.index'))
+        with PageStore(self.path('store.pack')) as store:
+            self.assertEqual((len(store),store.get('a')[1],store.get('b')),(1,b'first',None))
+            store.put('b', b'again')
+        with PageStore(self.path('store.pack')) as store:
+            self.assertEqual(store.get('b')[1],b'again')
+    def test_recorded_pages_are_not_downloaded_again(self):
+        self.downloader.process_words()
+        expected=self.downloader.words_and_levels
+        self.assertEqual(len(self.requests),5)
+        self.downloader.words_and_levels=[]
+        self.downloader.process_words()
+        self.assertEqual((self.downloader.words_and_levels,len(self.requests)),(expected,5))
+        self.assertEqual(self.downloader.page_recorder.counters['replayed'],5)
+    def test_offline_replay(self):
+        self.downloader.words=['keyboard','key']
+        self.downloader.process_words()
+        self.downloader.close_page_store()
+        downloader=LevelsDownloader(silent_mode=True, dump_config=False, page_store_file=self.path('pages.pack'), page_store_mode='replay', max_retries=0)
+        self.addCleanup(downloader.close_page_store)
+        def offline(url):
+            raise AssertionError('Downloading while replaying')
+        downloader.urlopen_function=offline
+        downloader.words=['keyboard','key','car']
+        downloader.process_words()
+        self.assertEqual(downloader.words_and_levels,[('key','A1'),('keyboard','A2'),('car','UNRESOLVED')])
+    def test_definitive_errors_are_replayed(self):
+        urlopen=self.downloader.urlopen_function
+        def failing_urlopen(url):
+            if url.endswith('=car'):
+                urlopen.requests.append(url)
+                raise urllib.error.HTTPError(url, 404, 'Not found', {}, None)
+            return urlopen(url)
+        self.downloader.urlopen_function=failing_urlopen
+        self.downloader.words=['car','key']
+        for _ in range(2):
+            self.downloader.words_and_levels=[]
+            self.downloader.process_words()
+            self.assertEqual(self.downloader.words_and_levels,[('key','A1'),('car','UNFOUND')])
+        self.assertEqual(len(self.requests),2)
+    def test_revalidation(self):
+        pages={'car':dictionary_page('car',('A1',))}
+        requests=[]
+        def urlopen(request):
+            url=getattr(request, 'full_url', request)
+            headers=getattr(request, 'headers', {})
+            requests.append(headers)
+            word=url.rsplit('=',1)[-1]
+            etag='"%s"' % hashlib.md5(pages[word]).hexdigest()
+            if headers.get('If-none-match') == etag:
+                raise urllib.error.HTTPError(url, 304, 'Not modified', {}, None)
+            response=io.BytesIO(gzip.compress(pages[word]))
+            response.headers={'ETag':etag, 'Content-Encoding':'gzip'}
+            return response
+        self.downloader.urlopen_function=urlopen
+        self.downloader.words=['car']
+        self.downloader.process_words()
+        self.downloader.options['page_store_mode']='revalidate'
+        for levels, counters in ((('A1',), {'revalidated':1}), (('B2',), {'recorded':1})):
+            pages['car']=dictionary_page('car', levels)
+            self.downloader.words_and_levels=[]
+            self.downloader.process_words()
+            self.assertEqual(self.downloader.words_and_levels,[('car',levels[0])])
+            self.assertEqual(self.downloader.page_recorder.counters,counters)
+        self.assertEqual([headers.get('If-none-match') is not None for headers in requests],[False,True,True])
+    def test_revalidation_against_the_stub(self):
+        with StubDictionaryServer(entries={'car':('car',('A1',)), 'key':('key',('B1',))}) as stub:
+            for mode in ('record', 'revalidate'):
+                downloader=LevelsDownloader(silent_mode=True, dump_config=False, link_building=stub.link_building, fetch_mode='streamed',
+                    page_store_file=self.path('pages.pack'), page_store_mode=mode)
+                downloader.words=['car','key']
+                downloader.process_words()
+                downloader.close_page_store()
+                self.assertEqual(downloader.words_and_levels,[('car','A1'),('key','B1')])
+        self.assertEqual((stub.counters['requests'],stub.counters.get('not_modified')),(4,2))
+        self.assertEqual(sorted(word for word, page in recorded_pages(self.path('pages.pack'))),['car','key'])
+    def test_asyncio_engine_is_refused(self):
+        self.downloader.options['engine']='asyncio'
+        with self.assertRaises(ValueError):
+            self.downloader.process_words()
+
 # class performance_test(unittest.TestCase):
 #     def setUp(self):
 #         self.downloader=LevelsDownloader()
@@ -6,43 +6,460 @@ import re
 import sys
 import os
 import threading
-import pdb
-import urllib.request
 import urllib.parse
-import lxml.html
-import getopt
 import functools
 import json
-import multiprocessing.dummy
 import io
+import contextlib
+import itertools
+import hashlib
+import array
+import struct
+import mmap
+import math
+import bisect
+import time
+import operator
+import collections.abc
+import zlib
+import codecs
+import random
+import heapq
+
+class CompactSeenSet:
+    """Set of strings remembering only 8 bytes long hashes of them in an open addressing table"""
+    def __init__(self, capacity=1024):
+        self.__table = array.array('Q', bytes(8*capacity))
+        self.__mask = capacity-1 #capacity has to be a power of 2
+        self.__length = 0
+    def __len__(self):
+        return self.__length
+    @staticmethod
+    def _hash(text):
+        return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') or 1 #0 marks an empty slot
+    def __insert(self, value):
+        """Inserts a hash, returns False if it was already there"""
+        table, mask = self.__table, self.__mask
+        index = value & mask
+        while table[index]:
+            if table[index] == value:
+                return False
+            index = (index+1) & mask
+        table[index] = value
+        return True
+    def add(self, text):
+        """Adds a string, returns whether it was not seen before"""
+        if not self.__insert(self._hash(text)):
+            return False
+        self.__length += 1
+        if 2*self.__length > len(self.__table): #keeping the load factor below 0.5
+            old_table = self.__table
+            self.__table = array.array('Q', bytes(16*len(old_table)))
+            self.__mask = len(self.__table)-1
+            for value in old_table:
+                if value:
+                    self.__insert(value)
+        return True
+    def __contains__(self, text):
+        table, mask = self.__table, self.__mask
+        value = self._hash(text)
+        index = value & mask
+        while table[index]:
+            if table[index] == value:
+                return True
+            index = (index+1) & mask
+        return False
+
+class LazyXPath:
+    """XPath compiled when it is evaluated for the first time, so that lxml is only imported once pages are parsed"""
+    def __init__(self, path):
+        self.path = path
+        self.__compiled = None
+    def __call__(self, element):
+        if self.__compiled is None:
+            import lxml.etree
+            self.__compiled = lxml.etree.XPath(self.path)
+        return self.__compiled(element)
+
+class PageTextsSelection:
+    """Texts of a page selected by the simple xpaths: head/path/text() for words and //tag[@attribute='value']/*/text() for levels,
+    located with regular expressions so that only the small parts of a page containing them are parsed"""
+    words_xpath_pattern = re.compile(r'^(/?)((?:[\w\-]+/)*[\w\-]+)/text\(\)$')
+    levels_xpath_pattern = re.compile(r'''^//([\w\-]+)\[@([\w\-]+)=(?:'([^']*)'|"([^"]*)")\]/\*/text\(\)$''')
+    ignored_pattern = re.compile(r'<(?=[!iInNpPsStTxX])(?:!--.*?(?:-->|$)|(script|style|textarea|title|xmp|iframe|noembed|noframes)\b.*?(?:</\1\s*>|$)|plaintext\b.*)',
+        re.IGNORECASE|re.DOTALL) #markup inside is not parsed, plaintext lasts until the end of the page
+    children_texts_xpath = LazyXPath('*/text()')
+    def __init__(self, words_path, levels_tag, levels_attribute, levels_value):
+        self.words_path = words_path #tags from the root element, for example ('html', 'head', 'title')
+        self.words_xpath = LazyXPath('/'.join(words_path[1:])+'/text()')
+        self.head_end_pattern = re.compile(r'</head\s*>|<body\b', re.IGNORECASE)
+        #the names of tags and attributes are case-insensitive, the values are not and can contain >, the first of repeated attributes counts,
+        #the runs of other characters are only separated by spaces and quoted values, so that there is only one way to match them
+        attribute = r'(?i:%s)\s*=' % re.escape(levels_attribute)
+        self.levels_start_pattern = re.compile(r'''<(?i:%s)\b[^>"'\s]*(?:(?:\s(?!%s)|"[^"]*"|'[^']*')[^>"'\s]*)*\s%s\s*(?:"%s"|'%s'|%s(?=[\s/>]))''' % (
+            re.escape(levels_tag), attribute, attribute, re.escape(levels_value), re.escape(levels_value), re.escape(levels_value)))
+        self.levels_tag_pattern = re.compile(r'''<(/?)(?i:%s)\b[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>''' % re.escape(levels_tag))
+    @classmethod
+    def from_xpaths(cls, words_xpath, levels_xpath):
+        """Returns the selection of the xpaths, None if they are not simple enough"""
+        words_match = cls.words_xpath_pattern.match(words_xpath.strip())
+        levels_match = cls.levels_xpath_pattern.match(levels_xpath.strip())
+        if not words_match or not levels_match:
+            return None
+        words_path = tuple(words_match.group(2).split('/'))
+        if not words_match.group(1): #relative to the root element of the page
+            words_path = ('html',)+words_path
+        if words_path[:2] != ('html', 'head'):
+            return None
+        value = levels_match.group(3) if levels_match.group(3) is not None else levels_match.group(4)
+        return cls(words_path, levels_match.group(1), levels_match.group(2), value)
+    def __element_end(self, text, start, ignored):
+        """Returns the end of the element starting at start, None if it is not closed"""
+        depth = 0
+        for match in self.levels_tag_pattern.finditer(text, start):
+            if self.__is_ignored(match.start(), ignored):
+                continue
+            depth += match.group(1) and -1 or 1
+            if not depth:
+                return match.end()
+        return None
+    @staticmethod
+    def __is_ignored(position, ignored):
+        index = bisect.bisect_right(ignored, (position, float('inf')))-1
+        return index >= 0 and ignored[index][1] > position
+    def __words(self, text, head_end, words_regexp_compiled_pattern):
+        import lxml.html
+        words = []
+        for found in self.words_xpath(lxml.html.document_fromstring(text[:head_end.start()] or ' ')):
+            words.extend(words_regexp_compiled_pattern.findall(found))
+        return words
+    def __levels(self, text, levels_regexp_compiled_pattern, lowest_level=None, max_elements=None):
+        """Returns the levels found in the elements with levels and the number of the elements, None instead of the levels if one is not closed"""
+        import lxml.html
+        levels = []
+        elements = 0
+        ignored = None
+        for match in self.levels_start_pattern.finditer(text):
+            if max_elements is not None and elements >= max_elements:
+                break
+            if ignored is None:
+                ignored = [match.span() for match in self.ignored_pattern.finditer(text)]
+            if self.__is_ignored(match.start(), ignored):
+                continue
+            end = self.__element_end(text, match.start(), ignored)
+            if end is None:
+                return None, elements
+            elements += 1
+            for found in self.children_texts_xpath(lxml.html.fragment_fromstring(text[match.start():end])):
+                levels.extend(levels_regexp_compiled_pattern.findall(found))
+            if lowest_level in levels:
+                break
+        return levels, elements
+    def extract(self, text, words_regexp_compiled_pattern, levels_regexp_compiled_pattern, fixed_word=None, lowest_level=None, max_elements=None):
+        """Returns the words and levels found in the page, stops as soon as the rest of it cannot change the result
+        (fixed_word: another word makes the page useless, lowest_level: no level can be lower,
+        max_elements: only that many elements with levels are taken into account), None when in doubt"""
+        head_end = self.head_end_pattern.search(text)
+        if not head_end:
+            return None
+        words = self.__words(text, head_end, words_regexp_compiled_pattern)
+        if not words: #the title could be somewhere the regular expressions do not expect
+            return None
+        if fixed_word is not None and words[0] != fixed_word:
+            return words, []
+        levels, elements = self.__levels(text, levels_regexp_compiled_pattern, lowest_level, max_elements)
+        if levels is None:
+            return None
+        return words, levels
+    def is_settled(self, text, words_regexp_compiled_pattern, levels_regexp_compiled_pattern, fixed_word=None, lowest_level=None, max_elements=None):
+        """Whether the rest of a page beginning with the text cannot change the result of extracting words and levels from it"""
+        head_end = self.head_end_pattern.search(text)
+        if not head_end:
+            return False
+        words = self.__words(text, head_end, words_regexp_compiled_pattern)
+        if not words or (fixed_word is not None and words[0] != fixed_word): #the whole page would not have a word to be found either
+            return True
+        levels, elements = self.__levels(text, levels_regexp_compiled_pattern, lowest_level, max_elements)
+        return levels is not None and (lowest_level in levels or (max_elements is not None and elements >= max_elements))
+
+class ResultStore:
+    """Results of looking words up kept as records of interned word ids and level codes, appended by every thread
+    to an array of its own without locking, and their order without duplicates sorted by partly precomputed keys"""
+    levels = ('A1', 'A2', 'B1', 'B2', 'C1', 'C2', 'UNDEFINED', 'UNFOUND', 'UNRESOLVED') #other levels get the next codes
+    level_bits = 8 #a record is word id << level_bits | level code
+    def __init__(self):
+        self.words = [] #word of every word id
+        self.__word_ids = {}
+        self.__shapes = array.array('L') #of every word id: whether it is a phrasal verb and its length, as a part of the sort key
+        self.__levels = list(self.levels)
+        self.__level_codes = {level:code for code, level in enumerate(self.levels)}
+        self.__lock = threading.Lock() #only for the words and levels seen for the first time and for new threads
+        self.__local = threading.local()
+        self.__shards = [] #array of the records added by every thread and not taken yet
+        self.order = array.array('Q') #the records sorted, without duplicates
+        self.modified = False #whether the results were changed from outside of process_words
+    def __intern(self, word, level):
+        with self.__lock:
+            word_id = self.__word_ids.get(word)
+            if word_id is None:
+                word_id = self.__word_ids[word] = len(self.words)
+                self.words.append(word)
+                self.__shapes.append((' ' in word) << 31 | min(len(word), 2**31-1))
+            code = self.__level_codes.get(level)
+            if code is None:
+                if len(self.__levels) >= 2**self.level_bits:
+                    raise ValueError('Too many different levels')
+                code = self.__level_codes[level] = len(self.__levels)
+                self.__levels.append(level)
+            return word_id, code
+    def add(self, word, level):
+        """Adds a result, safe to be called by many threads"""
+        word_id = self.__word_ids.get(word)
+        code = self.__level_codes.get(level)
+        if word_id is None or code is None:
+            word_id, code = self.__intern(word, level)
+        try:
+            shard = self.__local.shard
+        except AttributeError:
+            shard = self.__local.shard = array.array('Q')
+            with self.__lock:
+                self.__shards.append(shard)
+        shard.append(word_id << self.level_bits | code)
+    def take(self):
+        """Returns the records added since the last time and forgets them, not to be called while they are being added"""
+        with self.__lock:
+            shards, self.__shards = self.__shards, []
+            self.__local = threading.local()
+        return shards and len(shards) == 1 and shards[0] or array.array('Q', itertools.chain.from_iterable(shards))
+    def result(self, record):
+        return self.words[record >> self.level_bits], self.__levels[record & (2**self.level_bits-1)]
+    def new_record(self, word, level):
+        """The record of a result, its word and level are interned when they are seen for the first time"""
+        word_id, code = self.__intern(word, level)
+        return word_id << self.level_bits | code
+    def record(self, word, level):
+        """The record of a result, None if it has never been added"""
+        word_id = self.__word_ids.get(word)
+        code = self.__level_codes.get(level)
+        return None if word_id is None or code is None else word_id << self.level_bits | code
+    def __level_and_shape_key(self):
+        ranks = [0]*len(self.__levels)
+        for rank, code in enumerate(sorted(range(len(self.__levels)), key=self.__levels.__getitem__)):
+            ranks[code] = rank << 32
+        shapes, level_bits, level_mask = self.__shapes, self.level_bits, 2**self.level_bits-1
+        return lambda record: ranks[record & level_mask] | shapes[record >> level_bits]
+    def __word_key(self):
+        words, level_bits = self.words, self.level_bits
+        return lambda record: words[record >> level_bits]
+    def sorting_key(self):
+        """Returns the function giving the sort key of a record, ordering them like LevelsDownloaderBase.result_sorting_key"""
+        level_and_shape, word = self.__level_and_shape_key(), self.__word_key()
+        return lambda record: (level_and_shape(record), word(record))
+    def sort(self, records=()):
+        """Orders the ordered and the given records again"""
+        ordered = sorted(itertools.chain(self.order, records), key=self.__word_key())
+        ordered.sort(key=self.__level_and_shape_key()) #stable, so that the words stay alphabetical, two keys take less memory than tuples
+        self.order = array.array('Q', (record for record, _ in itertools.groupby(ordered))) #equal records are next to each other
+    def merge(self, records):
+        """Merges the records into the order, only about log(n) keys are computed for each of them if there are few"""
+        if len(records) > len(self.order)//8:
+            return self.sort(records)
+        key = self.sorting_key()
+        for record in records:
+            record_key = key(record)
+            position = bisect.bisect_left(self.order, record_key, key=key)
+            if position == len(self.order) or self.order[position] != record: #the same key means the same record
+                self.order.insert(position, record)
+    def discard(self, records):
+        """Removes the records from the order"""
+        records = set(records)
+        if records:
+            self.order = array.array('Q', (record for record in self.order if record not in records))
+
+class ResultsView(collections.abc.MutableSequence):
+    """The ordered results of a ResultStore as (word, level) tuples, made when they are needed,
+    changed like a list, the changed results are ordered again by the next process_words,
+    pickled and copied as a list, list(view) gives what json.dumps takes"""
+    def __init__(self, store):
+        self.store = store
+    def __reduce__(self):
+        return list, (list(self),) #the store holds locks and thread locals, which are not to be copied
+    def __len__(self):
+        return len(self.store.order)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.result(record) for record in self.store.order[index]]
+        return self.store.result(self.store.order[index])
+    def __iter__(self):
+        return map(self.store.result, self.store.order)
+    def __eq__(self, other):
+        if isinstance(other, (ResultsView, list, tuple)):
+            return len(self) == len(other) and all(map(operator.eq, self, other))
+        return NotImplemented
+    def __repr__(self):
+        return repr(list(self))
+    def __add__(self, other):
+        return list(self)+list(other)
+    def __radd__(self, other):
+        return list(other)+list(self)
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.store.order[index] = array.array('Q', (self.store.new_record(*word_and_level) for word_and_level in value))
+        else:
+            self.store.order[index] = self.store.new_record(*value)
+        self.store.modified = True
+    def __delitem__(self, index):
+        del self.store.order[index]
+        self.store.modified = True
+    def insert(self, index, word_and_level):
+        self.store.order.insert(index, self.store.new_record(*word_and_level))
+        self.store.modified = True
+    def extend(self, words_and_levels):
+        self.store.order.extend(array.array('Q', (self.store.new_record(*word_and_level) for word_and_level in words_and_levels)))
+        self.store.modified = True
+    def clear(self):
+        self.store.order = array.array('Q')
+        self.store.modified = True
+    def copy(self):
+        return list(self)
+    def sort(self, key=None, reverse=False):
+        self[:] = sorted(self, key=key, reverse=reverse)
+
+class Profiler:
+    """Latency histograms of the stages of looking words up and counters of what happened, safe to be used by many threads"""
+    buckets = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float('inf')) #upper bounds in seconds
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {} #stage: [count in each bucket, sum of seconds]
+        self.counters = {}
+    def observe(self, stage, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = [[0]*len(self.buckets), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+    def count(self, name, number=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0)+number
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter()-start)
+    def __quantile(self, counts, quantile):
+        """Upper bound of the bucket in which the quantile falls"""
+        rank = quantile*sum(counts)
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+    def to_dict(self):
+        with self.lock:
+            histograms = {stage:(list(counts), seconds) for stage, (counts, seconds) in self.histograms.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for stage, (counts, seconds) in sorted(histograms.items()):
+            number = sum(counts)
+            stages[stage] = {'count':number, 'sum_seconds':seconds, 'mean_seconds':number and seconds/number,
+                'p50_seconds':self.__quantile(counts, 0.5), 'p90_seconds':self.__quantile(counts, 0.9), 'p99_seconds':self.__quantile(counts, 0.99),
+                'buckets':{str(bound):count for bound, count in zip(self.buckets, itertools.accumulate(counts))}}
+        return {'stages':stages, 'counters':dict(sorted(counters.items()))}
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent='\t')
+    def to_prometheus(self, prefix='word_level_downloader'):
+        """Returns the metrics in the Prometheus text exposition format"""
+        profile = self.to_dict()
+        lines = ['# TYPE %s_stage_seconds histogram' % prefix]
+        for stage, histogram in profile['stages'].items():
+            for bound, count in histogram['buckets'].items():
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="%s"} %d' % (prefix, stage, bound == 'inf' and '+Inf' or bound, count))
+            lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (prefix, stage, histogram['sum_seconds']))
+            lines.append('%s_stage_seconds_count{stage="%s"} %d' % (prefix, stage, histogram['count']))
+        lines.append('# TYPE %s_events_total counter' % prefix)
+        for name, number in profile['counters'].items():
+            lines.append('%s_events_total{event="%s"} %d' % (prefix, name, number))
+        return '\n'.join(lines)+'\n'
+
+def urlopen(*args, **kwargs):
+    """urllib.request.urlopen, imported when the first page is downloaded"""
+    import urllib.request
+    return urllib.request.urlopen(*args, **kwargs)
+
+class CompiledPatterns:
+    """The patterns built of the options of a downloader"""
+    options = ('words_extraction_from_source_file', 'words_extraction_from_xml', 'levels_extraction_from_xml', 'link_building', 'max_number_of_words_in_phrasal_verb')
+    def __init__(self, options):
+        self.words_xpath = LazyXPath(options['words_extraction_from_xml']['xpath'])
+        self.words_regexp = re.compile(options['words_extraction_from_xml']['regexp'], flags=re.VERBOSE)
+        self.levels_xpath = LazyXPath(options['levels_extraction_from_xml']['xpath'])
+        self.levels_regexp = re.compile(options['levels_extraction_from_xml']['regexp'], flags=re.VERBOSE)
+        self.page_texts_selection = PageTextsSelection.from_xpaths(
+            options['words_extraction_from_xml']['xpath'],
+            options['levels_extraction_from_xml']['xpath'])
+        self.link_regexp = re.compile(options['link_building']['regexp'], flags=re.VERBOSE)
+        self.words_regexp_pattern = re.compile(options['words_extraction_from_source_file']['prefix']+\
+            options['max_number_of_words_in_phrasal_verb']*options['words_extraction_from_source_file']['repeated_part'],
+            flags=re.VERBOSE)
+    @classmethod
+    def of(cls, options):
+        """Returns the patterns of the options, compiled once for all the downloaders with the same ones"""
+        return cls.__compiled(json.dumps({name:options[name] for name in cls.options}, sort_keys=True))
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def __compiled(options_json):
+        return CompiledPatterns(json.loads(options_json))
+
+def _then(found, function):
+    """Applies the function to a (main form, level) result of _lookup, or to the result of a future of it once it is done,
+    returning a future of what the function returns then, so that the layers of _lookup work with pages parsed in processes too"""
+    import concurrent.futures
+    if isinstance(found, tuple):
+        return function(found)
+    then = concurrent.futures.Future()
+    def done(future):
+        try:
+            then.set_result(function(future.result()))
+        except BaseException as error:
+            then.set_exception(error)
+    found.add_done_callback(done)
+    return then
 
 class LevelsDownloaderBase:
     def __init__(self,**kwargs):
         self.words=set() #place to store words which are to be processed after calling the process_words method
-        self.words_and_levels=[] #place to store words and levels which are a result of calling the process_words method
+        self.results=ResultStore() #place to store words and levels which are a result of calling the process_words method, viewed as self.words_and_levels
+        self.__words_and_levels=ResultsView(self.results)
         self.lock=threading.Lock()
-        self.urlopen_function = urllib.request.urlopen
+        self.urlopen_function = urlopen
+        self.profiler = None #a Profiler timing the stages of processing words, set by start_profiling
+        self.__resolved = set() #words whose results are in self.words_and_levels, not to be looked up again by process_words
+        self.__unresolved = {} #word: the record of its UNRESOLVED result, replaced when it is looked up again
+        self.__ordered_options = None #the options of the last process_words, the results are only merged into the order if they have not been changed
+        self.__looked_up = None #word: (main form, level) collected by lookup_words instead of the results
 
         self.__default_options_for_LevelsDownloaderBase()
         self.update_options(kwargs)             
 
+        patterns = CompiledPatterns.of(self.options)
         self.get_words_from_xml = functools.partial(
             self._parse_with_xpath_and_regexp,
-            xpath=self.options['words_extraction_from_xml']['xpath'],
-            regexp_compiled_pattern=re.compile(self.options['words_extraction_from_xml']['regexp'],
-            flags=re.VERBOSE))
+            xpath=patterns.words_xpath,
+            regexp_compiled_pattern=patterns.words_regexp)
         self.get_levels_from_xml = functools.partial(
             self._parse_with_xpath_and_regexp,
-            xpath=self.options['levels_extraction_from_xml']['xpath'],
-            regexp_compiled_pattern=re.compile(self.options['levels_extraction_from_xml']['regexp'],
-            flags=re.VERBOSE))
-        self.get_source_link = functools.partial(re.sub,
-            self.options['link_building']['regexp'],
+            xpath=patterns.levels_xpath,
+            regexp_compiled_pattern=patterns.levels_regexp)
+        self.page_texts_selection = patterns.page_texts_selection #None if the xpaths are too complex to be followed by events
+        self.get_source_link = functools.partial(patterns.link_regexp.sub,
             self.options['link_building']['repl'],
-            flags=re.VERBOSE)
-        self.words_regexp_pattern = re.compile(self.options['words_extraction_from_source_file']['prefix']+\
-            self.options['max_number_of_words_in_phrasal_verb']*self.options['words_extraction_from_source_file']['repeated_part'],
-            flags=re.VERBOSE)
+            count=1) #the (.*) pattern matches the empty string at the end as well
+        self.words_regexp_pattern = patterns.words_regexp_pattern
     def __del__(self,**kwargs):
         pass
     def update_options(self,dictionary,options_allowed_to_be_changed=set()):
@@ -84,30 +501,68 @@ class LevelsDownloaderBase:
             #the characters which are used in the urls of a dictionary to denote phrasal verbs
             'phrasal_verb_separator':'-',
             #whether to print any output
-            'silent_mode':False})
+            'silent_mode':False,
+            #'targeted' parses only the parts of pages containing words and levels, 'dom' parses whole pages (and is used for xpaths too complex to be targeted)
+            'extraction_engine':'targeted',
+            #the lowest level which can be found on a page, the rest of a page is not parsed once it is found
+            'lowest_level':'A1',
+            #number of elements with levels of a page taken into account by the targeted extraction (and read by the streamed fetch mode), None for all of them
+            'levels_to_read':None,
+            #maximal number of words read ahead and being looked up at a time in the streaming mode
+            'streaming_window':1000})
     @staticmethod
-    def _parse_with_xpath_and_regexp(lxml_object, xpath, regexp_compiled_pattern=None):
+    def _parse_with_xpath_and_regexp(lxml_object, xpath, regexp_compiled_pattern=None, profiler=None):
         """Takes an lxml object, xpath and regular expression,\
         applies regexp to the results of xpath and returns the result\
         xpath must return text not anything else (use text())"""
         ret = []
-        for text in lxml_object.xpath(xpath):
+        if profiler is not None:
+            start = time.perf_counter()
+        texts = xpath(lxml_object) if callable(xpath) else lxml_object.xpath(xpath)
+        if profiler is not None:
+            profiler.observe('xpath', time.perf_counter()-start)
+            start = time.perf_counter()
+        for text in texts:
             if regexp_compiled_pattern:
                 match = regexp_compiled_pattern.findall(text)
                 if match:
                     ret.extend(match)
             else:
                 ret.extend(text)
+        if profiler is not None:
+            profiler.observe('regexp', time.perf_counter()-start)
         return ret
     def _get_level_from_page_text(self,suggested_word,text):
-        """Takes a webpage text and returns the main form of the word in it
+        """Takes a webpage text (or its bytes in utf-8) and returns the main form of the word in it
         and the lowest found level"""
+        import lxml.html
         processed_suggested_word = ' '.join(suggested_word.split(self.options['phrasal_verb_separator'])) #removing phrasal verb separator
+        if text is None: #the page could not be downloaded this time
+            return processed_suggested_word, 'UNRESOLVED'
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
         if text == '':
             return processed_suggested_word, 'UNFOUND'
-        lxml_page = lxml.html.fromstring(text)
-        words = self.get_words_from_xml(lxml_page)
-        levels = self.get_levels_from_xml(lxml_page)
+        profiler = self.profiler
+        found = None
+        if self.options['extraction_engine'] == 'targeted' and self.page_texts_selection:
+            if profiler is not None:
+                start = time.perf_counter()
+            found = self.page_texts_selection.extract(text,
+                self.get_words_from_xml.keywords['regexp_compiled_pattern'], self.get_levels_from_xml.keywords['regexp_compiled_pattern'],
+                self.options['do_not_change_words'] and processed_suggested_word or None, self.options['lowest_level'], self.options['levels_to_read'])
+            if profiler is not None:
+                profiler.observe('targeted_extraction', time.perf_counter()-start)
+        if found:
+            words, levels = found
+        else:
+            if profiler is not None:
+                start = time.perf_counter()
+            lxml_page = lxml.html.fromstring(text)
+            if profiler is not None:
+                profiler.observe('parsing', time.perf_counter()-start)
+            words = self.get_words_from_xml(lxml_page, profiler=profiler)
+            levels = self.get_levels_from_xml(lxml_page, profiler=profiler)
         if words:
             word = words[0]
             if word != processed_suggested_word and self.options['do_not_change_words']:
@@ -121,47 +576,182 @@ class LevelsDownloaderBase:
             word = processed_suggested_word
             level = 'UNFOUND'    
         return word, level
-    def _get_page_from_dictionary(self, word):
-        """Takes a page for a specific word from the dictionary"""
-        page = ''
+    def _get_link(self, word):
+        """Builds a link to the page of a word in the dictionary"""
+        return self.get_source_link(urllib.parse.quote(word.lower(),encoding='utf-8'))
+    def _download(self, link):
+        """Downloads the page under the link without decoding it, raises IOError when it is not possible"""
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.count('requests')
+            start = time.perf_counter()
+        with self.urlopen_function(link) as response:
+            if profiler is not None:
+                profiler.observe('connecting', time.perf_counter()-start) #resolving, connecting and waiting for the headers
+                start = time.perf_counter()
+            page = response.read()
+            if profiler is not None:
+                profiler.observe('downloading', time.perf_counter()-start)
+                profiler.count('bytes', len(page))
+        return page
+    @staticmethod
+    def _is_transient_error(error):
+        """Whether a download failed for a reason which may be gone the next time: a timeout, a reset or refused connection,
+        a partial read, a failed name resolution or a 429 or 5xx response, rather than a definitive answer like 404"""
+        import asyncio
+        import http.client
+        import socket
+        import urllib.error
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code == 429 or error.code >= 500
+        if isinstance(error, urllib.error.URLError):
+            error = error.reason
+        return isinstance(error, (TimeoutError, ConnectionError, socket.gaierror, http.client.IncompleteRead, asyncio.TimeoutError))
+    def _get_raw_page_from_dictionary(self, word, link=None):
+        """Takes a page for a specific word from the dictionary (or from the link) without decoding it, None if it failed transiently"""
+        import http.client
+        page = b''
         try:
-            link = self.get_source_link(urllib.parse.quote(word.lower(),encoding='utf-8'))
-            with self.urlopen_function(link) as response:
-                page = response.read().decode('utf-8')
-        except (IOError, urllib.request.http.client.IncompleteRead):
-            pass
+            page = self._download(link or self._get_link(word))
+        except (IOError, http.client.IncompleteRead) as error:
+            if self._is_transient_error(error):
+                page = None
+            if self.profiler is not None:
+                self.profiler.count('failed_requests')
         return word, page
+    def _get_page_from_dictionary(self, word, link=None):
+        """Takes a page for a specific word from the dictionary (or from the link), None if it failed transiently"""
+        word, page = self._get_raw_page_from_dictionary(word, link)
+        if page is None:
+            return word, page
+        if self.profiler is not None:
+            with self.profiler.stage('decoding'):
+                return word, page.decode('utf-8')
+        return word, page.decode('utf-8')
+    def _lookup(self, word):
+        """Gets a main form of a word and level for a given word"""
+        return self._get_level_from_page_text(*self._get_page_from_dictionary(word))
+    def _store_result(self, suggested_word, word, level):
+        """Stores a main form of a word and level found for the suggested word in the self.words_and_levels"""
+        if self.profiler is not None:
+            self.profiler.count(level in ('UNFOUND', 'UNDEFINED', 'UNRESOLVED') and 'words_%s' % level.lower() or 'words_found')
+        word = word.lower()
+        if self.__looked_up is not None:
+            self.__looked_up[suggested_word] = (word, level)
+        else:
+            self.results.add(word, level)
+            if level == 'UNRESOLVED':
+                self.__unresolved[suggested_word] = self.results.record(word, level)
+            else:
+                self.__resolved.add(suggested_word)
+        self._word_completed(suggested_word, word, level)
+    def _word_completed(self, suggested_word, word, level):
+        """Called once the final result of a word has been stored, the hook for following the progress"""
+        pass
+    @property
+    def words_and_levels(self):
+        """The results sorted by process_words, as a sequence of (word, level) tuples"""
+        return self.__words_and_levels
+    @words_and_levels.setter
+    def words_and_levels(self, words_and_levels):
+        """Replaces the results, they are sorted by the next process_words"""
+        self.results = ResultStore() #the view of the previous results stays as it was, as a list would
+        self.__words_and_levels = ResultsView(self.results)
+        self.__words_and_levels.extend(words_and_levels)
+    @staticmethod
+    def result_sorting_key(word_and_level):
+        """The order of the results: by level, single words before phrasal verbs, shorter before longer, then alphabetically"""
+        word, level = word_and_level
+        return level, ' ' in word, len(word), word
+    def _words_to_process(self, words):
+        """Returns those of the words which have to be looked up, the hook for skipping words resolved in some other way"""
+        return words
     def __get_word_and_level(self, word):
         """Gets a main form of a word and level for a given word, stores it in the self.words_and_levels"""
-        word, level = self._get_level_from_page_text(*self._get_page_from_dictionary(word))
-        self.words_and_levels.append((word.lower(), level))
-    def process_words(self):
-        """Returns a list of tuples containing words and their levels sorted by their levels"""
+        if self.profiler is None:
+            return self._store_result(word, *self._lookup(word))
+        found = self._lookup(word)
+        with self.profiler.stage('storing'): #including waiting for the locks of the results
+            self._store_result(word, *found)
+    def start_profiling(self):
+        """Starts timing the stages of processing words, returns the Profiler collecting the measurements"""
+        self.profiler = Profiler()
+        return self.profiler
+    def _download_words(self, words):
+        """Looks up all the given words, the hook for alternative engines"""
+        import multiprocessing.dummy
         #initiating the threads
-        #print('Min:%s' % min(self.options['max_number_of_threads'],len(self.words)))
         pool = multiprocessing.dummy.Pool(
-            min(self.options['max_number_of_threads'],len(self.words)) #no more threads than words to be processed
+            min(self.options['max_number_of_threads'],len(words)) #no more threads than words to be processed
             )
-        pool.map(self.__get_word_and_level,self.words)
+        pool.map(self.__get_word_and_level,words)
         pool.close()
         pool.join()
-        self.words_and_levels=sorted(list(set(self.words_and_levels)), key=lambda x: (x[1], ' ' in x[0], len(x[0]), x[0]))
+    def process_words(self):
+        """Returns a list of tuples containing words and their levels sorted by their levels,
+        the words resolved by the previous calls are not looked up again as long as the results have not been changed in the meantime"""
+        options = json.dumps(self.options, sort_keys=True, default=str)
+        if self.results.modified or options != self.__ordered_options:
+            self.__resolved, self.__unresolved = set(), {}
+            self.results.sort(self.results.take())
+            self.results.modified = False
+        unresolved = (self.words - self.__resolved if isinstance(self.words, (set, frozenset))
+            else [word for word in self.words if word not in self.__resolved])
+        stale = {self.__unresolved.pop(word) for word in unresolved if word in self.__unresolved} #to be replaced by the new results
+        words = list(self._words_to_process(unresolved)) #can store results already
+        if words:
+            self._download_words(words)
+        found = self.results.take()
+        self.results.discard(stale.difference(found))
+        self.results.merge(found)
+        self.__ordered_options = options
+    def lookup_words(self, words):
+        """Looks the words up without changing self.words and the results, returns a dictionary of the words and (main form, level) tuples,
+        not to be called concurrently with itself or process_words"""
+        looked_up = self.__looked_up = {}
+        try:
+            words = list(self._words_to_process(list(words))) #can store results already
+            if words:
+                self._download_words(words)
+        finally:
+            self.__looked_up = None
+        return looked_up
+    def _extract_words(self, line):
+        """Yields words to be looked up found in a line of a source file"""
+        match = self.words_regexp_pattern.search(line)
+        if match:
+            separator = self.options['phrasal_verb_separator']
+            many_phrasal_verbs = self.options['many_phrasal_verbs']
+            words = []
+            for word in match.groups()[:self.options['max_number_of_words_in_phrasal_verb']]:
+                if word:
+                    words.append(word.lower())
+                    if many_phrasal_verbs:
+                        yield separator.join(words)
+            if not many_phrasal_verbs:
+                yield separator.join(words)
     def read(self,file):
         """reads words from a given file-like object"""
         for line in file:
-            match = self.words_regexp_pattern.search(line)
-            if match:
-                text = ''
-                for number_of_words in range(1, self.options['max_number_of_words_in_phrasal_verb']+1):
-                    try:
-                        if match.group(number_of_words):
-                            text += ' ' + match.group(number_of_words).lower()
-                            if self.options['many_phrasal_verbs']:
-                                self.words.add(self.options['phrasal_verb_separator'].join(text.split()))
-                    except IndexError:
-                        break
-                if not self.options['many_phrasal_verbs']:
-                    self.words.add(self.options['phrasal_verb_separator'].join(text.split()))
+            for word in self._extract_words(line):
+                self.words.add(word)
+    def stream(self, lines):
+        """Looks up words read from the lines in batches of at most streaming_window words, each word only once,
+        yields a list of tuples containing words and their levels as soon as a batch is done, without changing self.words and the results"""
+        seen = CompactSeenSet()
+        words = (word for line in lines for word in self._extract_words(line) if seen.add(word))
+        while True:
+            batch = list(itertools.islice(words, self.options['streaming_window'])) #the next batch is read when the previous one is consumed
+            if not batch:
+                break
+            looked_up = self.__looked_up = {}
+            try:
+                batch = list(self._words_to_process(batch))
+                if batch:
+                    self._download_words(batch)
+            finally:
+                self.__looked_up = None
+            yield list(looked_up.values())
 
 def not_in_silent_mode(func):
     @functools.wraps(func)
@@ -170,27 +760,297 @@ def not_in_silent_mode(func):
             return func(self,*args,**kwargs)
     return decorated
 
+_reading_downloader = None #the downloader extracting words in a reading process
+
+def _initialize_reading_process(options):
+    global _reading_downloader
+    _reading_downloader = LevelsDownloaderBase(**options)
+
+def _read_chunk(file_path, start, end, encoding):
+    """Returns the words extracted in a reading process from the lines of the file between the bytes start and end"""
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = mapped[start:end]
+    words = set()
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding=encoding): #the newlines are translated as when reading the file
+        words.update(_reading_downloader._extract_words(line))
+    return words
+
+def _line_aligned_chunks(mapped, chunk_size):
+    """Yields the starts and ends of parts of about chunk_size bytes of the mapped file, each ending right after a newline or at the end"""
+    start = 0
+    while start < len(mapped):
+        end = mapped.find(b'\n', start+chunk_size-1)
+        end = end < 0 and len(mapped) or end+1
+        yield start, end
+        start = end
+
+class ResultsWriter:
+    """Writes results, (word, level) tuples, as the "LEVEL word" lines read by the rest of the tools, the base of the other output formats"""
+    binary = False
+    newline = None #as for open, the csv module needs ''
+    extensions = ('.txt',) #of the output files written in the format when none is given
+    def __init__(self, file):
+        self.file = file
+    def write(self, words_and_levels):
+        self.file.writelines('%s %s\n' % (level, word) for word, level in words_and_levels)
+    def close(self):
+        """Writes what is still buffered and whatever the format needs at the end, the file is closed by the caller"""
+        pass
+
+class JSONLinesResultsWriter(ResultsWriter):
+    """Writes a {"word": ..., "level": ...} object in each line"""
+    extensions = ('.jsonl', '.ndjson')
+    def write(self, words_and_levels):
+        encode = json.encoder.encode_basestring_ascii
+        self.file.writelines('{"word":%s,"level":%s}\n' % (encode(word), encode(level)) for word, level in words_and_levels)
+
+class CSVResultsWriter(ResultsWriter):
+    """Writes level,word rows after a header row"""
+    newline = ''
+    extensions = ('.csv',)
+    def __init__(self, file):
+        import csv
+        super().__init__(file)
+        self.__writer = csv.writer(file, lineterminator='\n')
+        self.__writer.writerow(('level', 'word'))
+    def write(self, words_and_levels):
+        self.__writer.writerows((level, word) for word, level in words_and_levels)
+
+class BinaryResultsWriter(ResultsWriter):
+    """Writes the results in blocks of at most block_size of them stored by columns, after the magic bytes of the format:
+    a header of the number of results, the number of bytes of their words, the number of levels used and the number of bytes
+    of a word length, 1 if all the words of the block are shorter than 256 bytes, otherwise 4 (little endian '<IIBB'),
+    the levels (a byte of the length and UTF-8), a byte of the index of the level of each result, the length of each word
+    and the UTF-8 words one after another; read by read_binary_results"""
+    binary = True
+    extensions = ('.wlr',)
+    magic = b'WLR1'
+    header = struct.Struct('<IIBB')
+    def __init__(self, file, block_size=65536):
+        super().__init__(file)
+        self.block_size = block_size
+        self.__pending = []
+        file.write(self.magic)
+    def write(self, words_and_levels):
+        pending = self.__pending
+        pending.extend(words_and_levels)
+        while len(pending) >= self.block_size:
+            self.__write_block(pending[:self.block_size])
+            del pending[:self.block_size]
+    def close(self):
+        if self.__pending:
+            self.__write_block(self.__pending)
+            self.__pending = []
+    def __write_block(self, results):
+        levels = sorted({level for _, level in results})
+        codes = {level:code for code, level in enumerate(levels)}
+        words = [word.encode('utf-8') for word, _ in results]
+        lengths = list(map(len, words))
+        lengths = max(lengths) < 256 and bytes(lengths) or array.array('I', lengths)
+        if sys.byteorder == 'big' and isinstance(lengths, array.array):
+            lengths.byteswap()
+        levels = [level.encode('utf-8') for level in levels]
+        self.file.write(b''.join([self.header.pack(len(results), sum(map(len, words)), len(levels), isinstance(lengths, bytes) and 1 or 4)]
+            +[bytes((len(level),))+level for level in levels]+[bytes(codes[level] for _, level in results), bytes(lengths)]+words))
+
+def read_binary_results(file):
+    """Yields the results, (word, level) tuples, of a file opened in binary mode written in the binary output format"""
+    def read(number):
+        data = file.read(number)
+        if len(data) != number:
+            raise ValueError('Truncated binary results')
+        return data
+    if file.read(len(BinaryResultsWriter.magic)) != BinaryResultsWriter.magic:
+        raise ValueError('Not binary results')
+    while True:
+        header = file.read(BinaryResultsWriter.header.size)
+        if not header:
+            return
+        if len(header) != BinaryResultsWriter.header.size:
+            raise ValueError('Truncated binary results')
+        number, words_length, number_of_levels, length_size = BinaryResultsWriter.header.unpack(header)
+        levels = [read(read(1)[0]).decode('utf-8') for _ in range(number_of_levels)]
+        codes = read(number)
+        lengths = read(length_size*number)
+        if length_size != 1:
+            lengths = array.array('I', lengths)
+            if sys.byteorder == 'big':
+                lengths.byteswap()
+        words = read(words_length)
+        start = 0
+        for code, end in zip(codes, itertools.accumulate(lengths)):
+            yield words[start:end].decode('utf-8'), levels[code]
+            start = end
+
+#the formats results can be written in, by name, other writers can be added
+OUTPUT_FORMATS = {'text':ResultsWriter, 'jsonl':JSONLinesResultsWriter, 'csv':CSVResultsWriter, 'binary':BinaryResultsWriter}
+
+def results_writer_class(output_format, file_path):
+    """Returns the writer class of the output format, of the extension of the file path if the format is None"""
+    if output_format is not None:
+        return OUTPUT_FORMATS[output_format]
+    extension = os.path.splitext(file_path)[1].lower()
+    return next((writer for writer in OUTPUT_FORMATS.values() if extension in writer.extensions), ResultsWriter)
+
+class ExternalSorter:
+    """Sorts results like LevelsDownloaderBase.result_sorting_key keeping at most run_size of them in memory, sorted runs of them are spilled
+    to temporary files in the directory and merged, at most max_runs at once; iterating yields the same results once"""
+    def __init__(self, run_size=1000000, directory=None, max_runs=64, buffer_size=1024*1024):
+        self.run_size = run_size
+        self.directory = directory
+        self.max_runs = max_runs
+        self.buffer_size = buffer_size
+        self.spilled = 0 #number of runs written to the temporary files
+        self.__pending = []
+        self.__runs = []
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def add(self, words_and_levels):
+        self.__pending.extend(words_and_levels)
+        if len(self.__pending) >= self.run_size:
+            self.__pending.sort(key=LevelsDownloaderBase.result_sorting_key)
+            self.__runs.append(self.__spill(self.__pending))
+            self.__pending = []
+            if len(self.__runs) >= self.max_runs:
+                runs, self.__runs = self.__runs, []
+                self.__runs.append(self.__spill(self.__merge(runs, [])))
+                for run in runs:
+                    run.close()
+    def __spill(self, ordered):
+        import tempfile
+        run = tempfile.TemporaryFile('w+', encoding='utf-8', dir=self.directory, buffering=self.buffer_size)
+        run.writelines('%s %s\n' % (level, word) for word, level in ordered)
+        run.seek(0)
+        self.spilled += 1
+        return run
+    @staticmethod
+    def __read(run):
+        for line in run:
+            level, _, word = line.rstrip('\n').partition(' ')
+            yield word, level
+    def __merge(self, runs, ordered):
+        merged = heapq.merge(*map(self.__read, runs), ordered, key=LevelsDownloaderBase.result_sorting_key)
+        return (result for result, _ in itertools.groupby(merged)) #equal results are next to each other
+    def __iter__(self):
+        self.__pending.sort(key=LevelsDownloaderBase.result_sorting_key)
+        return self.__merge(self.__runs, self.__pending)
+    def close(self):
+        for run in self.__runs:
+            run.close()
+        self.__runs, self.__pending = [], []
+
 class LevelsDownloaderWithFiles(LevelsDownloaderBase):
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithFiles()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithFiles(self):
+        self.update_options({
+            #number of processes extracting words from the input files bigger than reading_chunk_size, None for as many as processors, 0 to read in one thread
+            'reading_processes':None,
+            #number of bytes of an input file read by a reading process at once
+            'reading_chunk_size':8*1024*1024,
+            #format of the output files, one of OUTPUT_FORMATS, None to choose it by the extension of the file name (text for unknown ones)
+            'output_format':None,
+            #number of bytes of the output written at once
+            'output_buffer_size':1024*1024,
+            #maximal number of results of a sorted stream kept in memory, the rest is sorted in temporary files
+            'sort_run_size':1000000,
+            #directory of the temporary files of sorting, None for the default one
+            'sort_directory':None})
     @not_in_silent_mode
     def problem_info(self, text='Some kind of problem'):
         print(text)
+    @contextlib.contextmanager
+    def _results_writer(self, file_path, encoding='utf-8'):
+        """Opens the file for a writer of the output format and yields the writer"""
+        writer_class = results_writer_class(self.options['output_format'], file_path)
+        if writer_class.binary:
+            file = open(file_path, 'wb', buffering=self.options['output_buffer_size'])
+        else:
+            file = open(file_path, 'w', encoding=encoding, newline=writer_class.newline, buffering=self.options['output_buffer_size'])
+        with file:
+            writer = writer_class(file)
+            yield writer
+            writer.close()
     def save_words_to_file(self, file_path, encoding='utf-8'):
-        """Saves words and levels into a file"""
+        """Saves words and levels into a file, in the output format, returns whether they have been saved"""
         try:
-            with open(file_path, 'w', encoding=encoding) as file:
-                file.writelines(('%s %s\n' % (level, word) for word, level in self.words_and_levels))
+            with self._results_writer(file_path, encoding) as writer:
+                writer.write(self.words_and_levels)
         except (IOError, TypeError) as error:
             if __name__ == '__main__':
                 self.problem_info('Problem during saving to the file.')
+                return False
+            else:
+                raise error
+        return True
+    def stream_words_to_file(self, input_file_path, output_file_path, lines=(), encoding='utf-8', sort=False):
+        """Looks up words from the input file and from the lines and writes their levels to the output file as they come,
+        without keeping all of them in memory, the levels are not sorted unless sort is set, then they are written at the end
+        after an external merge sort keeping at most sort_run_size of them in memory, returns whether all of them have been written"""
+        seen = CompactSeenSet()
+        try:
+            with self._results_writer(output_file_path, encoding) as writer, \
+                    ExternalSorter(self.options['sort_run_size'], self.options['sort_directory'], buffer_size=self.options['output_buffer_size']) as sorter:
+                with (input_file_path and open(input_file_path, 'r', encoding=encoding) or io.StringIO()) as source:
+                    for words_and_levels in self.stream(itertools.chain(source, lines)):
+                        if sort:
+                            sorter.add(words_and_levels) #duplicates are dropped by the sorter
+                            continue
+                        writer.write([(word, level) for word, level in words_and_levels if seen.add('%s %s' % (level, word))])
+                        writer.file.flush()
+                if sort:
+                    writer.write(sorter)
+        except (IOError, UnicodeDecodeError) as error:
+            if __name__ == '__main__':
+                self.problem_info('Problem during streaming words between the files.')
+                return False
             else:
                 raise error
+        return True
+    def save_profile(self, file_path=None):
+        """Writes the measurements of the profiler into a file, Prometheus text format for the .prom files and JSON for others,
+        without a file path JSON is written to the standard error"""
+        if self.profiler is None:
+            return
+        try:
+            if not file_path:
+                sys.stderr.write(self.profiler.to_json()+'\n')
+            else:
+                with open(file_path, 'w') as file:
+                    file.write(file_path.endswith('.prom') and self.profiler.to_prometheus() or self.profiler.to_json())
+        except IOError as error:
+            if __name__ == '__main__':
+                self.problem_info('Problem during saving the profile.')
+            else:
+                raise error
+    def __can_be_read_in_processes(self, file, encoding):
+        return (self.options['reading_processes'] != 0 and os.fstat(file.fileno()).st_size > self.options['reading_chunk_size']
+            and '\n'.encode(encoding) == b'\n') #newlines are the same bytes in every part of the file and nothing else contains them
+    def read_file_in_processes(self, file_path, encoding='utf-8'):
+        """Reads words from a file like read does, extracting them from line aligned chunks of the memory mapped file in reading_processes processes"""
+        import concurrent.futures
+        with open(file_path, 'rb') as file:
+            if not os.fstat(file.fileno()).st_size: #an empty file cannot be mapped
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                chunks = list(_line_aligned_chunks(mapped, self.options['reading_chunk_size']))
+        with concurrent.futures.ProcessPoolExecutor(min(self.options['reading_processes'] or os.cpu_count() or 1, len(chunks)),
+                initializer=_initialize_reading_process, initargs=(self.options,)) as readers:
+            for words in readers.map(_read_chunk, itertools.repeat(file_path), *zip(*chunks), itertools.repeat(encoding)):
+                self.words.update(words)
     def read_words_from_file(self, file_path=None, encoding='utf-8'):
         """Reads words from a file"""
         if not file_path:
             return None
         try:
             with open(file_path, 'r', encoding=encoding) as file:
-                self.read(file)
+                if self.__can_be_read_in_processes(file, encoding):
+                    self.read_file_in_processes(file_path, encoding)
+                else:
+                    self.read(file)
         except Exception as error:
             if __name__ == '__main__':
                 if isinstance(error, UnicodeDecodeError):
@@ -204,36 +1064,1738 @@ class LevelsDownloaderWithFiles(LevelsDownloaderBase):
             else:
                 raise error  
 
+class Progress:
+    """How far a run looking words up has got, passed to the progress listeners"""
+    def __init__(self, total, completed, elapsed, rate, done=False):
+        self.total = total #number of words of the run known so far, a stream adds the words of each batch
+        self.completed = completed
+        self.elapsed = elapsed #seconds since the start of the run
+        self.rate = rate #words per second completed within the last progress_window seconds
+        self.done = done #the run has ended, this is the last progress of it
+    @property
+    def fraction(self):
+        return self.done and 1.0 or self.total and min(1.0, self.completed/self.total) or 0.0
+    @property
+    def eta(self):
+        """Estimated number of seconds until all the words are completed, None while the rate is not known"""
+        if self.done:
+            return 0.0
+        return self.rate and max(0, self.total-self.completed)/self.rate or None
+    def __repr__(self):
+        return 'Progress(total=%r, completed=%r, elapsed=%.3f, rate=%.3f, done=%r)' % (self.total, self.completed, self.elapsed, self.rate, self.done)
+
+class ProgressTracker:
+    """Counts the completed words of a run and passes the progress to the listeners after each of them, one listener call at a time,
+    so that they see the words completed in order and have to return quickly"""
+    def __init__(self, listeners, window=5.0):
+        self.listeners = listeners
+        self.window = window
+        self.total = 0
+        self.completed = 0
+        self.started = time.monotonic()
+        self.__samples = collections.deque([(self.started, 0)]) #(time, completed words) spanning the last window seconds, at most 100 of them
+        self.__lock = threading.Lock()
+    def add(self, number):
+        """Adds words to the total, a negative number removes the words which are not going to be completed"""
+        with self.__lock:
+            self.total += number
+    def __progress(self, now, done=False):
+        first_time, first_completed = self.__samples[0]
+        rate = now > first_time and (self.completed-first_completed)/(now-first_time) or 0.0
+        return Progress(self.total, self.completed, now-self.started, rate, done)
+    def complete(self):
+        with self.__lock:
+            self.completed += 1
+            now = time.monotonic()
+            samples = self.__samples
+            if now-samples[-1][0] >= self.window/100:
+                samples.append((now, self.completed))
+                while len(samples) > 2 and samples[1][0] <= now-self.window:
+                    samples.popleft()
+            progress = self.__progress(now)
+            for listener in self.listeners:
+                listener(progress)
+    def finish(self):
+        with self.__lock:
+            progress = self.__progress(time.monotonic(), done=True)
+            for listener in self.listeners:
+                listener(progress)
+
+class TerminalProgress:
+    """Progress listener printing the progress on one line, at most once every interval seconds"""
+    def __init__(self, interval=0.2, file=None):
+        self.interval = interval
+        self.file = file #None for the standard output at the time of printing
+        self.__printed = None
+        self.__length = 0
+    def __call__(self, progress):
+        now = time.monotonic()
+        if not progress.total or not progress.done and self.__printed is not None and now-self.__printed < self.interval:
+            return
+        self.__printed = now
+        text = '{:.0%} completed...'.format(progress.fraction)
+        if progress.rate:
+            text += ' %.1f words/s' % progress.rate
+        if progress.eta:
+            text += ', %d:%02d left' % divmod(round(progress.eta), 60)
+        print('\r'+text.ljust(self.__length), end='', file=self.file, flush=True)
+        self.__length = len(text)
+
+class ProgressUpdates:
+    """Asynchronous iterator over the progress of the next run of a downloader, which runs in another thread
+    (for example started with asyncio.to_thread), created in the event loop of the iteration; progresses the iteration
+    has not kept up with are skipped, the last one is done"""
+    def __init__(self, listeners):
+        import asyncio
+        self.__loop = asyncio.get_running_loop()
+        self.__changed = asyncio.Event()
+        self.__lock = threading.Lock()
+        self.__latest = None
+        self.__listeners = listeners
+        self.__finished = False
+        listeners.append(self)
+    def __call__(self, progress):
+        with self.__lock:
+            wake = self.__latest is None
+            self.__latest = progress
+        if wake:
+            self.__loop.call_soon_threadsafe(self.__changed.set)
+    def __aiter__(self):
+        return self
+    async def __anext__(self):
+        progress = None
+        while progress is None:
+            if self.__finished:
+                raise StopAsyncIteration
+            await self.__changed.wait()
+            with self.__lock:
+                self.__changed.clear()
+                progress, self.__latest = self.__latest, None
+        if progress.done:
+            self.__finished = True
+            self.__listeners.remove(self)
+        return progress
+
 class LevelsDownloaderWithReporting(LevelsDownloaderBase):
-    @not_in_silent_mode
-    def __print_info(self,percent):
-        print("\r{:.0%} completed...".format(percent),end='')
-    def __report_progress(self):
-        """Reports progress of the process"""
-        number_of_words_to_be_processed=len(self.words)
-        number_of_already_processed_words=len(self.words_and_levels)
-        while number_of_words_to_be_processed and not self.__exit_event.is_set():
-            self.__print_info((len(self.words_and_levels)-number_of_already_processed_words)/(number_of_words_to_be_processed))
-            self.__exit_event.wait(0.2)
-    def __start_reporting(self):
-        self.__exit_event = threading.Event()
-        self.reporting = threading.Thread(target=self.__report_progress)
-        self.reporting.start()
-    def __stop_reporting(self):
-        self.__exit_event.set()
-        self.reporting.join()
+    """Follows the progress of the runs as their words complete, for the progress listeners and, unless in silent mode, the terminal;
+    without them nothing is followed"""
+    def __init__(self,**kwargs):
+        self.progress_listeners = [] #callables called with the Progress of a run after each completed word and at its end
+        self.__tracker = None #ProgressTracker of the current run
+        self.__default_options_for_LevelsDownloaderWithReporting()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithReporting(self):
+        self.update_options({
+            #number of seconds of the latest completed words the words per second and the time left are measured over
+            'progress_window':5.0,
+            #minimal number of seconds between printing the progress in the terminal
+            'progress_interval':0.2})
+    def progress_updates(self):
+        """Returns an asynchronous iterator over the progress of the next run, to be called in an event loop"""
+        return ProgressUpdates(self.progress_listeners)
+    @contextlib.contextmanager
+    def __following_progress(self):
+        listeners = list(self.progress_listeners)
+        if not self.options['silent_mode']:
+            listeners.append(TerminalProgress(self.options['progress_interval']))
+        if not listeners or self.__tracker is not None:
+            yield
+            return
+        tracker = self.__tracker = ProgressTracker(listeners, self.options['progress_window'])
+        try:
+            yield
+        finally:
+            self.__tracker = None
+            tracker.finish()
+    def _words_to_process(self, words):
+        tracker = self.__tracker
+        if tracker is None:
+            return super()._words_to_process(words)
+        words = list(words)
+        tracker.add(len(words))
+        completed = tracker.completed
+        remaining = list(super()._words_to_process(words))
+        tracker.add(tracker.completed-completed+len(remaining)-len(words)) #words skipped without results, for example of other shards
+        return remaining
+    def _word_completed(self, suggested_word, word, level):
+        if self.__tracker is not None:
+            self.__tracker.complete()
+        super()._word_completed(suggested_word, word, level)
     @not_in_silent_mode
     def present(self):
         if self.words_and_levels:
             print('\rDownloaded words:\n'+'\n'.join(['%s: %s' % (level, word) for word, level in self.words_and_levels]))
     def process_words(self):
         """Returns a list of tuples containing words and their levels sorted by their levels"""
-        self.__start_reporting()
-        super().process_words()
-        self.__stop_reporting()
+        with self.__following_progress():
+            super().process_words()
         self.present()
+    def lookup_words(self, words):
+        with self.__following_progress():
+            return super().lookup_words(words)
+    def stream(self, lines):
+        with self.__following_progress():
+            yield from super().stream(lines)
+
+class LevelsDownloaderWithRetries(LevelsDownloaderBase):
+    """Looks the words which failed transiently up again after a jittered exponential backoff, in rounds of the words
+    whose time has come, so that no downloading worker waits, the words still failing in the end are UNRESOLVED"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithRetries()
+        self.__retries_lock = threading.Lock()
+        self.__retries = None #heap of (when to look a word up again, word) while downloading words
+        self.__attempts = {} #word: number of retries so far
+        self.__budget = 0
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithRetries(self):
+        self.update_options({
+            #maximal number of times a word which failed transiently (a timeout, a reset, a 429 or 5xx response) is looked up again before it is UNRESOLVED
+            'max_retries':3,
+            #number of seconds the first retry can be delayed by, doubled for every next one, the delay is chosen at random up to it
+            'retry_backoff':0.5,
+            #maximal number of seconds a retry can be delayed by
+            'max_retry_backoff':30,
+            #maximal number of retries as a fraction of the words being downloaded (but at least 10), so that a failing dictionary is not flooded
+            'retry_budget':0.2})
+    def _store_result(self, suggested_word, word, level):
+        if level == 'UNRESOLVED' and self.__retries is not None:
+            with self.__retries_lock:
+                attempt = self.__attempts.get(suggested_word, 0)+1
+                if attempt <= self.options['max_retries'] and self.__budget > 0:
+                    self.__budget -= 1
+                    self.__attempts[suggested_word] = attempt
+                    delay = random.uniform(0, min(self.options['max_retry_backoff'], self.options['retry_backoff']*2**(attempt-1)))
+                    heapq.heappush(self.__retries, (time.monotonic()+delay, suggested_word))
+                    if self.profiler is not None:
+                        self.profiler.count('retried_lookups')
+                    return
+        super()._store_result(suggested_word, word, level)
+    def _download_words(self, words):
+        self.__retries, self.__attempts = [], {}
+        self.__budget = max(10, int(self.options['retry_budget']*len(words)))
+        try:
+            super()._download_words(words)
+            while self.__retries:
+                time.sleep(max(0.0, self.__retries[0][0]-time.monotonic()))
+                due = []
+                with self.__retries_lock:
+                    while self.__retries and self.__retries[0][0] <= time.monotonic():
+                        due.append(heapq.heappop(self.__retries)[1])
+                super()._download_words(due)
+        finally:
+            self.__retries, self.__attempts = None, {}
+
+class WordLevelCache:
+    """Persistent, thread-safe word -> (main form, level) store kept in an SQLite file"""
+    def __init__(self, file_path, ttl=30*24*3600, max_entries=1000000):
+        import sqlite3
+        self.file_path = file_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS words_and_levels (
+            key TEXT PRIMARY KEY,
+            word TEXT NOT NULL,
+            level TEXT NOT NULL,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL)''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS words_and_levels_accessed ON words_and_levels (accessed)')
+        self.__pending_writes = {} #key: (word, level, expires, accessed), written in batches by flush
+        self.__pending_accesses = {} #key: accessed, access times of hits are only needed for eviction so they are written lazily
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM words_and_levels').fetchone()[0]+len(self.__pending_writes)
+    def get_many(self, keys, now=None):
+        """Returns a dictionary of not expired (word, level) tuples for those of the keys which are stored"""
+        now = now or time.time()
+        ret = {}
+        keys = list(keys)
+        with self.lock:
+            for start in range(0, len(keys), 500): #sqlite limits the number of parameters of a query
+                chunk = keys[start:start+500]
+                rows = self.connection.execute(
+                    'SELECT key, word, level, expires FROM words_and_levels WHERE key IN (%s)' % ','.join('?'*len(chunk)),
+                    chunk)
+                for key, word, level, expires in rows:
+                    if expires > now:
+                        ret[key] = (word, level)
+            for key in keys:
+                if key in self.__pending_writes:
+                    word, level, expires, _ = self.__pending_writes[key]
+                    if expires > now:
+                        ret[key] = (word, level)
+            self.__pending_accesses.update(dict.fromkeys(ret, now))
+        return ret
+    def get(self, key):
+        return self.get_many((key,)).get(key)
+    def put(self, key, word, level, ttl=None):
+        now = time.time()
+        with self.lock:
+            self.__pending_writes[key] = (word, level, now+(self.ttl if ttl is None else ttl), now)
+            if len(self.__pending_writes) >= 1000:
+                self.__flush()
+    def flush(self):
+        """Writes pending entries into the file and evicts the least recently used ones above max_entries"""
+        with self.lock:
+            self.__flush()
+    def __flush(self):
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany('INSERT OR REPLACE INTO words_and_levels VALUES (?,?,?,?,?)',
+                ((key,)+value for key, value in self.__pending_writes.items()))
+            self.connection.executemany('UPDATE words_and_levels SET accessed=? WHERE key=?',
+                ((accessed, key) for key, accessed in self.__pending_accesses.items()))
+            self.connection.execute('DELETE FROM words_and_levels WHERE expires<=?', (time.time(),))
+            excess = self.connection.execute('SELECT COUNT(*) FROM words_and_levels').fetchone()[0]-self.max_entries
+            if excess > 0:
+                self.connection.execute('DELETE FROM words_and_levels WHERE key IN '
+                    '(SELECT key FROM words_and_levels ORDER BY accessed LIMIT ?)', (excess,))
+        self.__pending_writes.clear()
+        self.__pending_accesses.clear()
+    def known_words(self):
+        """Yields words which were looked up and their main forms, for the words which were found"""
+        self.flush()
+        with self.lock:
+            rows = self.connection.execute("SELECT key, word FROM words_and_levels WHERE level NOT IN ('UNFOUND', 'UNRESOLVED')").fetchall()
+        for key, word in rows:
+            yield key.rsplit(' ', 1)[-1], word
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+class LevelsDownloaderWithCache(LevelsDownloaderBase):
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithCache()
+        self.cache=None
+        self.__cache_hits=set()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithCache(self):
+        self.update_options({
+            #path of a file where downloaded levels are remembered between runs, None to always download
+            'cache_file':None,
+            #number of seconds after which a remembered level is downloaded again
+            'cache_ttl':30*24*3600,
+            #maximal number of remembered words, the least recently used ones are forgotten first
+            'cache_max_entries':1000000})
+    def _cache_key(self, word):
+        """Builds a cache key of a word, results depend on the dictionary used and on whether words can be changed"""
+        return '%s %s %s %s' % (self.options['link_building']['repl'], self.options['link_building']['regexp'],
+            self.options['do_not_change_words'] and 'fixed' or 'suggested',
+            self.options['phrasal_verb_separator'].join(word.lower().split(self.options['phrasal_verb_separator'])))
+    def _open_cache(self):
+        """Opens the cache file given in the options, returns None if caching is switched off"""
+        if not self.options['cache_file']:
+            return None
+        if self.cache is None or self.cache.file_path != self.options['cache_file']:
+            self.cache = WordLevelCache(self.options['cache_file'], self.options['cache_ttl'], self.options['cache_max_entries'])
+        return self.cache
+    def _words_to_process(self, words):
+        words = super()._words_to_process(words)
+        cache = self._open_cache()
+        if cache is None:
+            return words
+        keys = {word:self._cache_key(word) for word in words}
+        found = cache.get_many(keys.values())
+        self.__cache_hits = {word for word, key in keys.items() if key in found}
+        for word in self.__cache_hits:
+            self._store_result(word, *found[keys[word]])
+        return [word for word, key in keys.items() if key not in found]
+    def _store_result(self, suggested_word, word, level):
+        if self.cache is not None and suggested_word not in self.__cache_hits and level != 'UNRESOLVED': #hits are not rewritten, so that they expire
+            self.cache.put(self._cache_key(suggested_word), word, level)
+            separated_word = self.options['phrasal_verb_separator'].join(word.lower().split())
+            if separated_word != suggested_word.lower() and level not in ('UNFOUND', 'UNRESOLVED'):
+                self.cache.put(self._cache_key(separated_word), word, level) #the main form the word was changed to
+        super()._store_result(suggested_word, word, level)
+    def process_words(self):
+        try:
+            super().process_words()
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+    def stream(self, lines):
+        try:
+            yield from super().stream(lines)
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+    def lookup_words(self, words):
+        try:
+            return super().lookup_words(words)
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+
+class PageNotRecorded(ConnectionError):
+    """Raised when replaying a page which has not been recorded, the word is UNRESOLVED rather than UNFOUND"""
+
+class PageStore:
+    """Raw pages by URL in a single append-only file of zlib compressed records, found through an open addressing hash index
+    kept in a memory mapped file next to it (file_path+'.index'), which is brought up to date from the records when it is behind
+    or missing; a partly written last record is cut off. The latest record of a URL is the one found, the pages are decompressed
+    straight from the memory mapped file. Thread-safe, but only one process may write the file at a time"""
+    record_header = struct.Struct('<4sHIII') #magic, bytes of the URL, of the metadata and of the compressed page, CRC32 of them
+    record_magic = b'WLPR'
+    index_header = struct.Struct('<4s4xQQQ') #magic, capacity, number of URLs, number of bytes of the pack file indexed
+    index_magic = b'WLPI'
+    slot = struct.Struct('<QQ') #hash of the URL, offset of its latest record+1 (0 for an empty slot)
+    def __init__(self, file_path, compression_level=6):
+        self.file_path = file_path
+        self.compression_level = compression_level
+        self.__lock = threading.Lock()
+        self.__file = open(file_path, 'a+b')
+        self.__mapped = None #of the pack file, mapped again when it has grown
+        self.__index_file = None
+        self.__index = None
+        size = os.fstat(self.__file.fileno()).st_size
+        try:
+            self.__open_index()
+            if self.__covered() > size:
+                raise ValueError('The index is ahead of the pages')
+        except (IOError, ValueError, struct.error):
+            self.__create_index(1024)
+        self.__scan(self.__covered(), size)
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def __len__(self):
+        with self.__lock:
+            return self.index_header.unpack_from(self.__index)[2]
+    def __covered(self):
+        return self.index_header.unpack_from(self.__index)[3]
+    def __open_index(self):
+        index_file = open(self.file_path+'.index', 'r+b')
+        try:
+            index = mmap.mmap(index_file.fileno(), 0)
+        except ValueError: #an empty file
+            index_file.close()
+            raise
+        magic, capacity, _, _ = self.index_header.unpack_from(index)
+        if magic != self.index_magic or len(index) != self.index_header.size+capacity*self.slot.size:
+            index.close()
+            index_file.close()
+            raise ValueError('Not an index of pages')
+        self.__index_file, self.__index = index_file, index
+    def __create_index(self, capacity, slots=(), covered=0):
+        """Replaces the index with an empty one of the capacity (a power of 2) with the slots and the number of bytes of the pack file indexed"""
+        with open(self.file_path+'.index.new', 'wb') as index_file:
+            index_file.write(self.index_header.pack(self.index_magic, capacity, 0, covered))
+            index_file.truncate(self.index_header.size+capacity*self.slot.size)
+        os.replace(self.file_path+'.index.new', self.file_path+'.index')
+        if self.__index is not None:
+            self.__index.close()
+            self.__index_file.close()
+        self.__open_index()
+        for url_hash, offset in slots:
+            self.__insert(url_hash, offset, None)
+    def __slots(self):
+        capacity = self.index_header.unpack_from(self.__index)[1]
+        for position in range(capacity):
+            url_hash, offset = self.slot.unpack_from(self.__index, self.index_header.size+position*self.slot.size)
+            if offset:
+                yield url_hash, offset
+    def __map(self, end):
+        """Returns the pack file mapped at least up to the end"""
+        if self.__mapped is None or len(self.__mapped) < end:
+            self.__file.flush()
+            self.__mapped = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) #the previous map is closed when it is not used anymore
+        return self.__mapped
+    def __record(self, offset):
+        """Returns the URL, the metadata and a view of the compressed page of the record at the offset"""
+        mapped = self.__map(offset+self.record_header.size)
+        _, url_length, metadata_length, page_length, _ = self.record_header.unpack_from(mapped, offset)
+        start = offset+self.record_header.size
+        mapped = self.__map(start+url_length+metadata_length+page_length)
+        view = memoryview(mapped)
+        return (str(view[start:start+url_length], 'utf-8'), view[start+url_length:start+url_length+metadata_length],
+            view[start+url_length+metadata_length:start+url_length+metadata_length+page_length])
+    def __find(self, url_hash, url):
+        """Returns the position of the slot of the URL or of the empty slot it would take, and the offset of its record+1 (0 if there is none)"""
+        capacity = self.index_header.unpack_from(self.__index)[1]
+        position = url_hash & (capacity-1)
+        while True:
+            slot_hash, offset = self.slot.unpack_from(self.__index, self.index_header.size+position*self.slot.size)
+            if not offset or slot_hash == url_hash and (url is None or self.__record(offset-1)[0] == url):
+                return position, offset
+            position = (position+1) & (capacity-1)
+    def __insert(self, url_hash, offset, url):
+        """Points the slot of the URL to the record at the offset+1, URL None for the slots known to be of different URLs"""
+        _, capacity, number, covered = self.index_header.unpack_from(self.__index)
+        position, previous = self.__find(url_hash, url)
+        if not previous:
+            if 2*(number+1) > capacity:
+                self.__create_index(2*capacity, list(self.__slots()), covered)
+                return self.__insert(url_hash, offset, None) #the URL is not among the slots
+            number += 1
+        self.slot.pack_into(self.__index, self.index_header.size+position*self.slot.size, url_hash, offset)
+        self.index_header.pack_into(self.__index, 0, self.index_magic, capacity, number, covered)
+    def __set_covered(self, covered):
+        _, capacity, number, _ = self.index_header.unpack_from(self.__index)
+        self.index_header.pack_into(self.__index, 0, self.index_magic, capacity, number, covered)
+    def __scan(self, start, size):
+        """Indexes the records between start and size, cuts the pack file off at the first one which is not whole"""
+        self.__file.seek(start)
+        position = start
+        while position < size:
+            header = self.__file.read(self.record_header.size)
+            try:
+                magic, url_length, metadata_length, page_length, crc = self.record_header.unpack(header)
+            except struct.error:
+                break
+            body = self.__file.read(url_length+metadata_length+page_length)
+            if magic != self.record_magic or len(body) != url_length+metadata_length+page_length or zlib.crc32(body) != crc:
+                break
+            url = body[:url_length].decode('utf-8')
+            self.__insert(CompactSeenSet._hash(url), position+1, url)
+            position += len(header)+len(body)
+        if position < size:
+            self.__file.truncate(position)
+        self.__set_covered(position)
+    def get(self, url):
+        """Returns the metadata and the page last recorded for the URL, None if there is none"""
+        with self.__lock:
+            _, offset = self.__find(CompactSeenSet._hash(url), url)
+            if not offset:
+                return None
+            _, metadata, page = self.__record(offset-1)
+        return json.loads(bytes(metadata)), zlib.decompress(page)
+    def put(self, url, page, **metadata):
+        """Records the page of the URL with the metadata (for example the status, ETag and Last-Modified), replacing the previous one"""
+        parts = [url.encode('utf-8'), json.dumps(metadata).encode('utf-8'), zlib.compress(page, self.compression_level)]
+        body = b''.join(parts)
+        header = self.record_header.pack(self.record_magic, *map(len, parts), zlib.crc32(body))
+        with self.__lock:
+            offset = self.__covered()
+            self.__file.write(header+body)
+            self.__file.flush()
+            self.__insert(CompactSeenSet._hash(url), offset+1, url)
+            self.__set_covered(offset+len(header)+len(body))
+    def items(self):
+        """Yields the URLs, metadata and pages last recorded for them, in the order of the index"""
+        with self.__lock:
+            records = [self.__record(offset-1) for _, offset in self.__slots()]
+        for url, metadata, page in records:
+            yield url, json.loads(bytes(metadata)), zlib.decompress(page)
+    def close(self):
+        with self.__lock:
+            self.__index.flush()
+            self.__index.close()
+            self.__index_file.close()
+            self.__file.close()
+            self.__mapped = None
+
+class RecordedResponse:
+    """A recorded page answered like by urlopen"""
+    def __init__(self, url, page, status=200, headers=None):
+        self.url = url
+        self.status = self.code = status
+        self.headers = headers or {}
+        self.__page = io.BytesIO(page)
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def read(self, size=-1):
+        return self.__page.read(size)
+    def geturl(self):
+        return self.url
+    def close(self):
+        self.__page.close()
+
+class PageRecorder:
+    """urlopen_function answering from a PageStore, in the mode 'record' with the recorded pages and downloading and recording
+    the others, in 'revalidate' asking the dictionary whether the recorded pages have changed by their ETag and Last-Modified headers,
+    in 'replay' without downloading, the pages not recorded raise PageNotRecorded; definitive HTTP errors are recorded and raised again"""
+    modes = ('record', 'revalidate', 'replay')
+    def __init__(self, store, mode='record', urlopen=urlopen):
+        if mode not in self.modes:
+            raise ValueError('Unknown mode of recording pages: %s' % mode)
+        self.store = store
+        self.mode = mode
+        self.urlopen = urlopen
+        self.counters = collections.Counter() #of 'replayed', 'recorded' and 'revalidated' (unchanged) pages, counted by many threads, so approximate
+    def __call__(self, url, *args, **kwargs):
+        import urllib.error
+        import urllib.request
+        request = url
+        url = isinstance(request, urllib.request.Request) and request.full_url or request
+        recorded = self.store.get(url)
+        if recorded is not None and self.mode != 'revalidate' or self.mode == 'replay':
+            if recorded is None:
+                raise PageNotRecorded('The page has not been recorded: %s' % url)
+            self.counters['replayed'] += 1
+            return self.__response(url, *recorded)
+        validators = recorded is not None and {name:recorded[0][key] for name, key in (('If-None-Match', 'etag'), ('If-Modified-Since', 'last_modified'))
+            if recorded[0].get(key)} or {}
+        if validators:
+            request = urllib.request.Request(url, headers=dict(getattr(request, 'headers', {}), **validators))
+        try:
+            with self.urlopen(request, *args, **kwargs) as response:
+                page = response.read()
+                headers = getattr(response, 'headers', None) or {}
+        except urllib.error.HTTPError as error:
+            if error.code == 304 and recorded is not None:
+                self.counters['revalidated'] += 1
+                return self.__response(url, *recorded)
+            if error.code != 429 and 400 <= error.code < 500: #the same answer would be given again
+                self.store.put(url, b'', status=error.code)
+                self.counters['recorded'] += 1
+            raise
+        encoding = headers.get('Content-Encoding', 'identity').strip().lower()
+        if encoding in ('gzip', 'x-gzip', 'deflate'): #recorded decoded, so that they can be replayed to any request
+            try:
+                page = zlib.decompress(page, 32+zlib.MAX_WBITS)
+            except zlib.error:
+                page = zlib.decompress(page, -zlib.MAX_WBITS)
+        self.store.put(url, page, status=200, etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'), recorded=time.time())
+        self.counters['recorded'] += 1
+        return RecordedResponse(url, page)
+    @staticmethod
+    def __response(url, metadata, page):
+        if metadata.get('status', 200) != 200:
+            import urllib.error
+            raise urllib.error.HTTPError(url, metadata['status'], 'Recorded error', {}, None)
+        return RecordedResponse(url, page)
+
+class LevelsDownloaderWithPageStore(LevelsDownloaderBase):
+    """Records the pages downloaded by the threads engine in a PageStore and answers from it, so that all of them can be parsed again,
+    for example after changing the extraction options, without the network"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithPageStore()
+        self.page_store=None #PageStore of the page_store_file option, opened by the first run using it
+        self.page_recorder=None #PageRecorder of the last run, with its counters
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithPageStore(self):
+        self.update_options({
+            #file in which the downloaded pages are recorded, None not to record them
+            'page_store_file':None,
+            #'record' answers with the recorded pages and records the others, 'revalidate' asks the dictionary whether the recorded pages have changed,
+            #'replay' never downloads, the words with pages which are not recorded are UNRESOLVED
+            'page_store_mode':'record'})
+    def _open_page_store(self):
+        """Opens the page store file given in the options, returns None if pages are not recorded"""
+        if not self.options['page_store_file']:
+            return None
+        if self.page_store is None or self.page_store.file_path != self.options['page_store_file']:
+            self.close_page_store()
+            self.page_store = PageStore(self.options['page_store_file'])
+        return self.page_store
+    def close_page_store(self):
+        if self.page_store is not None:
+            self.page_store.close()
+            self.page_store = None
+    def _download_words(self, words):
+        store = self._open_page_store()
+        if store is None:
+            return super()._download_words(words)
+        if self.options['engine'] != 'threads':
+            raise ValueError('Pages are recorded and replayed by the threads engine only')
+        urlopen = self.urlopen_function
+        self.urlopen_function = self.page_recorder = PageRecorder(store, self.options['page_store_mode'], urlopen)
+        try:
+            super()._download_words(words)
+        finally:
+            self.urlopen_function = urlopen
+
+class ResultJournal:
+    """Append-only file of the results of a run, [word as it was looked up, main form, level] in JSON on every line,
+    written and synced to the disk in batches by a thread of its own, the first line tells what the results depend on"""
+    def __init__(self, file_path, context, resume=False, sync_interval=1.0):
+        self.file_path = file_path
+        self.context = context
+        self.sync_interval = sync_interval
+        self.records = {} #word: (main form, level) read from the journal when resuming
+        valid_length = 0
+        if resume and os.path.exists(file_path):
+            self.records, valid_length = self.read(file_path, context)
+            os.truncate(file_path, valid_length) #a torn last line would spoil the next one
+        self.__file = open(file_path, valid_length and 'a' or 'w', encoding='utf-8')
+        if not valid_length:
+            self.__file.write(json.dumps(dict(context, journal=1))+'\n')
+        self.__pending = collections.deque()
+        self.__lock = threading.Lock() #the writing thread and the end of a run flush the same file
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__write_periodically, daemon=True)
+        self.__thread.start()
+    @staticmethod
+    def read(file_path, context):
+        """Returns the records of a journal and the length of its part which is not torn"""
+        records = {}
+        with open(file_path, 'rb') as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('journal') != 1:
+                raise ValueError('Not a journal: %s' % file_path)
+            if {name:header.get(name) for name in context} != context:
+                raise ValueError('The journal was written with other options: %s' % file_path)
+            valid_length = file.tell()
+            for line in file:
+                try:
+                    word, main_form, level = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                records[word] = (main_form, level)
+                valid_length += len(line)
+        return records, valid_length
+    def add(self, word, main_form, level):
+        """Adds a record to be written with the next batch, safe to be called by many threads"""
+        self.__pending.append((word, main_form, level))
+    def flush(self):
+        """Writes the added records and syncs them to the disk, safe to be called by many threads"""
+        with self.__lock:
+            records = []
+            try:
+                while True:
+                    records.append(self.__pending.popleft())
+            except IndexError:
+                pass
+            if records: #encoding the strings alone is several times faster than dumping every record, so the GIL is held shortly
+                encode = json.encoder.encode_basestring_ascii
+                self.__file.write(''.join(['[%s,%s,%s]\n' % (encode(word), encode(main_form), encode(level)) for word, main_form, level in records]))
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+    def __write_periodically(self):
+        while not self.__stop.wait(self.sync_interval):
+            self.flush()
+    def close(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.flush()
+        self.__file.close()
+
+class LevelsDownloaderWithJournal(LevelsDownloaderBase):
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithJournal()
+        self.journal=None
+        self.__replayed={} #word: (main form, level) of the results of an interrupted run, not to be looked up or journaled again
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithJournal(self):
+        self.update_options({
+            #path of a file where results are journaled during a run, so that an interrupted run can be resumed, None for no journal
+            'journal_file':None,
+            #number of seconds between writing the journaled results to the disk
+            'journal_sync_interval':1.0})
+    def __journal_context(self):
+        """The options the results depend on"""
+        return {name:self.options[name] for name in ('link_building', 'do_not_change_words', 'phrasal_verb_separator')}
+    def _open_journal(self, resume=False):
+        """Opens the journal file given in the options, returns None if journaling is switched off"""
+        if not self.options['journal_file']:
+            return None
+        if resume or self.journal is None or self.journal.file_path != self.options['journal_file']:
+            self.close_journal()
+            self.journal = ResultJournal(self.options['journal_file'], self.__journal_context(), resume, self.options['journal_sync_interval'])
+            self.__replayed = self.journal.records
+        return self.journal
+    def resume(self):
+        """Reads the results journaled by an interrupted run, their words are not looked up again and the journal is continued,
+        returns the number of the results"""
+        return len(self._open_journal(resume=True).records)
+    def close_journal(self, remove=False):
+        """Writes the rest of the journal and closes it, removes the file when the results are safe elsewhere"""
+        if self.journal is not None:
+            self.journal.close()
+            if remove:
+                os.remove(self.journal.file_path)
+            self.journal = None
+            self.__replayed = {}
+    def _words_to_process(self, words):
+        words = super()._words_to_process(words)
+        if self._open_journal() is None or not self.__replayed:
+            return words
+        remaining = []
+        for word in words:
+            found = self.__replayed.get(word)
+            if found is None:
+                remaining.append(word)
+            else:
+                self._store_result(word, *found)
+        return remaining
+    def _store_result(self, suggested_word, word, level):
+        if self.journal is not None and level != 'UNRESOLVED' and suggested_word not in self.__replayed:
+            self.journal.add(suggested_word, word, level)
+        super()._store_result(suggested_word, word, level)
+    def process_words(self):
+        try:
+            super().process_words()
+        finally:
+            if self.journal is not None:
+                self.journal.flush()
+    def stream(self, lines):
+        try:
+            yield from super().stream(lines)
+        finally:
+            if self.journal is not None:
+                self.journal.flush()
+    def lookup_words(self, words):
+        try:
+            return super().lookup_words(words)
+        finally:
+            if self.journal is not None:
+                self.journal.flush()
+
+class HeadwordIndex:
+    """Bloom filter of the words known to the dictionary kept in a memory mapped file,
+    a word not in it is certainly not in the dictionary, a word in it is there with probability 1-false_positive_rate,
+    an index of surface forms holds the words as they can be typed (inflected forms too), not only the headwords"""
+    magic = b'WLDBLOM2'
+    header = struct.Struct('<8sQQII') #magic, number of bits, number of words, number of hashes, flags
+    surface_forms_flag = 1
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.number_of_bits, self.number_of_words, self.number_of_hashes, flags = (len(self.__map) >= self.header.size
+            and self.header.unpack_from(self.__map) or (b'', 0, 0, 0, 0))
+        self.surface_forms = bool(flags & self.surface_forms_flag)
+        if magic != self.magic or len(self.__map) < self.header.size+(self.number_of_bits+7)//8:
+            self.__map.close()
+            raise ValueError('Not a headword index: %s' % file_path)
+    @staticmethod
+    def normalize(word, phrasal_verb_separator='-'):
+        return phrasal_verb_separator.join(word.lower().replace(phrasal_verb_separator, ' ').split())
+    @classmethod
+    def __positions(cls, word, number_of_bits, number_of_hashes):
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first+i*second) % number_of_bits for i in range(number_of_hashes)]
+    @classmethod
+    def build(cls, words, file_path, false_positive_rate=0.01, phrasal_verb_separator='-', surface_forms=False):
+        """Writes the index of the words into the file and returns it opened, surface_forms tells that the words
+        are all the forms the words can be typed in, so that the words missing from it do not have to be looked up even to be changed"""
+        words = {cls.normalize(word, phrasal_verb_separator) for word in words if word.strip()}
+        number_of_bits = max(64, math.ceil(-max(len(words), 1)*math.log(false_positive_rate)/math.log(2)**2))
+        number_of_hashes = max(1, round(number_of_bits/max(len(words), 1)*math.log(2)))
+        bits = bytearray((number_of_bits+7)//8)
+        for word in words:
+            for position in cls.__positions(word, number_of_bits, number_of_hashes):
+                bits[position >> 3] |= 1 << (position & 7)
+        temporary_path = file_path+'.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(cls.header.pack(cls.magic, number_of_bits, len(words), number_of_hashes, surface_forms and cls.surface_forms_flag or 0))
+            file.write(bits)
+        os.replace(temporary_path, file_path) #readers never see a half written index
+        return cls(file_path)
+    def __contains__(self, word):
+        offset = self.header.size
+        for position in self.__positions(word, self.number_of_bits, self.number_of_hashes):
+            if not self.__map[offset+(position >> 3)] >> (position & 7) & 1:
+                return False
+        return True
+    def close(self):
+        self.__map.close()
+
+def words_known_from_results(file_path, encoding='utf-8'):
+    """Yields words from a file with a word in each line, or with levels and words as written by save_words_to_file,
+    skipping the words which were not found"""
+    with open(file_path, 'r', encoding=encoding) as file:
+        for line in file:
+            level, _, word = line.strip().partition(' ')
+            if word and (level in ('UNDEFINED', 'UNFOUND', 'UNRESOLVED') or re.fullmatch(r'[A-C][1-2]', level)):
+                if level not in ('UNFOUND', 'UNRESOLVED'):
+                    yield word
+            elif line.strip():
+                yield line.strip()
+
+class LevelsDownloaderWithHeadwordIndex(LevelsDownloaderBase):
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithHeadwordIndex()
+        self.headword_index=None
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithHeadwordIndex(self):
+        self.update_options({
+            #path of a headword index built by --build-index, with do_not_change_words the words not in it are UNFOUND without downloading
+            #(otherwise the dictionary could still change them to a headword, unless the index was built of surface forms), None to download all words
+            'headword_index_file':None})
+    def _open_headword_index(self):
+        if not self.options['headword_index_file']:
+            return None
+        if self.headword_index is None or self.headword_index.file_path != self.options['headword_index_file']:
+            self.headword_index = HeadwordIndex(self.options['headword_index_file'])
+        return self.headword_index
+    def _words_to_process(self, words):
+        words = super()._words_to_process(words)
+        index = self._open_headword_index()
+        if index is None or not (self.options['do_not_change_words'] or index.surface_forms): #the main forms the words would be changed to are not known yet
+            return words
+        separator = self.options['phrasal_verb_separator']
+        known = []
+        for word in words:
+            if HeadwordIndex.normalize(word, separator) in index:
+                known.append(word)
+            else:
+                self._store_result(word, ' '.join(word.split(separator)), 'UNFOUND')
+        return known
+    def build_headword_index(self, file_path, sources=(), false_positive_rate=0.01, surface_forms=False):
+        """Builds the headword index from the word lists or result files and from the words found in the cache,
+        surface_forms when the word lists hold all the forms of the words, like a list of inflected forms"""
+        words = [word for source in sources for word in words_known_from_results(source)]
+        cache = hasattr(self, '_open_cache') and self._open_cache()
+        if cache:
+            words.extend(itertools.chain.from_iterable(cache.known_words()))
+        self.headword_index = HeadwordIndex.build(words, file_path, false_positive_rate, self.options['phrasal_verb_separator'], surface_forms)
+        return self.headword_index
+
+class LevelsDownloaderWithSingleFlight(LevelsDownloaderBase):
+    """Looks every link up only once during a run: concurrent lookups of a link wait for the first one, later ones reuse its result,
+    and the main form a word was changed to is remembered to be resolved without another lookup. The results are forgotten at the end
+    of each run (and the least recently used ones during it), so that they take no memory between runs and the cache decides what has expired"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithSingleFlight()
+        self.__flights_lock=threading.Lock()
+        self.__flights={} #key of a link: threading.Event or asyncio.Future of the lookup in progress
+        self.__results=collections.OrderedDict() #key of a link: (main form of the word, level), the least recently used first
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithSingleFlight(self):
+        self.update_options({
+            #maximal number of results remembered during a run for the later lookups of the same links and of the main forms
+            'max_remembered_lookups':10000})
+    def forget_lookups(self):
+        """Forgets the remembered results"""
+        with self.__flights_lock:
+            self.__results.clear()
+    def _download_words(self, words):
+        try:
+            return super()._download_words(words)
+        finally:
+            self.forget_lookups()
+    def __key(self, word):
+        """Results of a link depend also on whether words can be changed"""
+        return self.options['do_not_change_words'], self._get_link(word)
+    def __recall(self, key):
+        """Returns the remembered result of the key, None if there is none, under the lock"""
+        found = self.__results.get(key)
+        if found is not None:
+            self.__results.move_to_end(key)
+        return found
+    def __remember(self, suggested_word, key, found):
+        """Remembers the found result, returns it"""
+        word, level = found
+        if level == 'UNRESOLVED': #shared only with the concurrent lookups, later ones try again
+            return found
+        with self.__flights_lock:
+            self.__results[key] = (word, level)
+            processed_suggested_word = ' '.join(suggested_word.split(self.options['phrasal_verb_separator']))
+            if word.lower() != processed_suggested_word.lower() and level not in ('UNFOUND', 'UNRESOLVED'):
+                self.__results.setdefault(self.__key(self.options['phrasal_verb_separator'].join(word.split())), (word, level))
+            while len(self.__results) > self.options['max_remembered_lookups']:
+                self.__results.popitem(last=False)
+        return found
+    def __land(self, key, _=None):
+        with self.__flights_lock:
+            del self.__flights[key]
+    def __reuse(self, suggested_word, found):
+        if self.profiler is not None:
+            self.profiler.count('reused_lookups')
+        word, level = found
+        processed_suggested_word = ' '.join(suggested_word.split(self.options['phrasal_verb_separator']))
+        if word.lower() == processed_suggested_word.lower():
+            word = processed_suggested_word #as if it was looked up, only the case could differ
+        return word, level
+    def _lookup(self, word):
+        key = self.__key(word)
+        with self.__flights_lock:
+            found = self.__recall(key)
+            flight = found is None and self.__flights.get(key)
+            leader = found is None and not flight
+            if leader:
+                flight = self.__flights[key] = threading.Event()
+        if found is not None:
+            return self.__reuse(word, found)
+        if not leader:
+            flight.wait()
+            with self.__flights_lock:
+                found = self.__recall(key) or getattr(flight, 'found', None)
+            if found is None: #the first lookup has failed
+                return super()._lookup(word)
+            return _then(found, functools.partial(self.__reuse, word))
+        try:
+            flight.found = _then(super()._lookup(word), functools.partial(self.__remember, word, key))
+            return flight.found
+        finally:
+            found = getattr(flight, 'found', None)
+            if found is not None and not isinstance(found, tuple): #a future of a page parsed in a process, the flight lands once it is done
+                found.add_done_callback(functools.partial(self.__land, key))
+            else:
+                self.__land(key)
+            flight.set()
+    async def _lookup_asynchronously(self, connection_pool, word):
+        import asyncio
+        key = self.__key(word)
+        with self.__flights_lock:
+            found = self.__recall(key)
+        if found is not None:
+            return self.__reuse(word, found)
+        flight = self.__flights.get(key)
+        if flight is not None:
+            try:
+                return self.__reuse(word, await asyncio.shield(flight))
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                return await super()._lookup_asynchronously(connection_pool, word) #the first lookup has failed
+        flight = self.__flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            found = self.__remember(word, key, await super()._lookup_asynchronously(connection_pool, word))
+            flight.set_result(found)
+            return found
+        except BaseException:
+            flight.cancel()
+            raise
+        finally:
+            del self.__flights[key]
+
+class HTTPResponseError(IOError):
+    """Raised when a response of a server cannot be understood"""
+
+class AsyncHTTPConnectionPool:
+    """Sends HTTP/1.1 GET requests over persistent connections, at most limit_per_host of them open for every host"""
+    redirect_statuses = {301, 302, 303, 307, 308}
+    def __init__(self, limit_per_host=8, timeout=30, max_redirects=5):
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.__semaphores = {} #host: asyncio.Semaphore limiting the number of connections
+        self.__idle = {} #host: list of (reader, writer) ready to be reused
+        self.__ssl_context = None
+    def __host(self, url):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise HTTPResponseError('Unsupported scheme: %s' % parts.scheme)
+        port = parts.port or (parts.scheme == 'https' and 443 or 80)
+        return (parts.scheme, parts.hostname, port), urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    async def __connect(self, host):
+        import asyncio
+        import ssl
+        scheme, hostname, port = host
+        if scheme == 'https' and self.__ssl_context is None:
+            self.__ssl_context = ssl.create_default_context()
+        return await asyncio.open_connection(hostname, port, ssl=scheme == 'https' and self.__ssl_context or None)
+    async def get(self, url, headers=None):
+        """Returns the status, headers and body of the response, redirects are followed"""
+        import asyncio
+        for _ in range(self.max_redirects+1):
+            status, response_headers, body = await asyncio.wait_for(self.__get_once(url, headers or {}), self.timeout)
+            if status in self.redirect_statuses and 'location' in response_headers:
+                url = urllib.parse.urljoin(url, response_headers['location'])
+            else:
+                return status, response_headers, body
+        raise HTTPResponseError('Too many redirects')
+    async def __get_once(self, url, headers):
+        import asyncio
+        host, path = self.__host(url)
+        semaphore = self.__semaphores.setdefault(host, asyncio.Semaphore(self.limit_per_host))
+        async with semaphore:
+            idle = self.__idle.setdefault(host, [])
+            while True:
+                reused = bool(idle)
+                reader, writer = reused and idle.pop() or await self.__connect(host)
+                try:
+                    status, response_headers, body, keep_alive = await self.__exchange(reader, writer, host, path, headers)
+                except (ConnectionError, asyncio.IncompleteReadError, HTTPResponseError) as error:
+                    writer.close()
+                    if reused and not isinstance(error, HTTPResponseError): #the server may have closed an idle connection in the meantime
+                        continue
+                    raise HTTPResponseError(str(error)) from error
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, response_headers, body
+    async def __exchange(self, reader, writer, host, path, headers):
+        scheme, hostname, port = host
+        request_headers = {'Host': port in (80, 443) and hostname or '%s:%s' % (hostname, port),
+            'User-Agent': 'Python-urllib/%s.%s' % sys.version_info[:2], 'Accept-Encoding': 'identity', 'Connection': 'keep-alive'}
+        request_headers.update(headers)
+        writer.write(('GET %s HTTP/1.1\r\n%s\r\n' % (path, ''.join('%s: %s\r\n' % item for item in request_headers.items()))).encode('latin-1'))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed before the response')
+        try:
+            version, status = status_line.decode('latin-1').split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise HTTPResponseError('Malformed status line: %r' % status_line)
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise ConnectionResetError('Connection closed while reading headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if not size:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''): #trailers
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, response_headers, body, keep_alive
+    async def close(self):
+        for connections in self.__idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.__idle.clear()
+
+class LevelsDownloaderWithAsyncio(LevelsDownloaderBase):
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithAsyncio()
+        self.__event_loop = None #the loop and the pool kept between the calls if keep_connections is set
+        self.__connection_pool = None
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithAsyncio(self):
+        self.update_options({
+            #'threads' downloads with max_number_of_threads threads using urlopen_function, 'asyncio' multiplexes the downloads over persistent connections
+            'engine':'threads',
+            #maximal number of words being looked up at the same time by the asyncio engine
+            'max_number_of_requests_in_flight':1000,
+            #maximal number of connections to a single host opened by the asyncio engine
+            'max_number_of_connections_per_host':8,
+            #number of seconds after which a request of the asyncio engine is abandoned
+            'request_timeout':30,
+            #whether the asyncio engine keeps its connections open for the next words to be looked up, until close_connections is called
+            'keep_connections':False})
+    async def _get_page_from_dictionary_asynchronously(self, connection_pool, word, link=None):
+        """Takes a page for a specific word from the dictionary (or from the link) using the connection pool, None if it failed transiently"""
+        import asyncio
+        page = ''
+        profiler = self.profiler
+        try:
+            if profiler is not None:
+                profiler.count('requests')
+                start = time.perf_counter()
+            compressed = self.options['fetch_mode'] == 'streamed' #the whole page is read, but compressed
+            status, headers, body = await connection_pool.get(link or self._get_link(word), compressed and {'Accept-Encoding':'gzip, deflate'} or None)
+            if profiler is not None:
+                profiler.observe('downloading', time.perf_counter()-start) #including waiting for a free connection
+                if compressed:
+                    profiler.count('bytes_on_wire', len(body))
+            if compressed and headers.get('content-encoding', 'identity').lower() in ('gzip', 'x-gzip', 'deflate'):
+                try:
+                    body = zlib.decompress(body, 32+zlib.MAX_WBITS) #gzip or zlib wrapped
+                except zlib.error:
+                    body = zlib.decompress(body, -zlib.MAX_WBITS) #raw deflate
+            if profiler is not None:
+                profiler.count('bytes', len(body))
+            if status == 200:
+                page = body.decode('utf-8')
+            elif status == 429 or status >= 500:
+                page = None
+        except (IOError, asyncio.TimeoutError, UnicodeDecodeError, zlib.error) as error:
+            if self._is_transient_error(error) or self._is_transient_error(error.__cause__): #the pool wraps connection errors
+                page = None
+            if profiler is not None:
+                profiler.count('failed_requests')
+        return word, page
+    async def _lookup_asynchronously(self, connection_pool, word):
+        """Gets a main form of a word and level for a given word"""
+        return self._get_level_from_page_text(*await self._get_page_from_dictionary_asynchronously(connection_pool, word))
+    async def __download_words_asynchronously(self, words, connection_pool=None):
+        import asyncio
+        kept_pool = connection_pool is not None
+        connection_pool = connection_pool or AsyncHTTPConnectionPool(self.options['max_number_of_connections_per_host'], self.options['request_timeout'])
+        in_flight = asyncio.Semaphore(self.options['max_number_of_requests_in_flight'])
+        async def get_word_and_level(word):
+            try:
+                self._store_result(word, *await self._lookup_asynchronously(connection_pool, word))
+            finally:
+                in_flight.release()
+        tasks, errors = set(), []
+        def done(task):
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception()) #raised once all the words are done, as by the threads engine
+        try:
+            for word in words:
+                await in_flight.acquire() #no more tasks than requests in flight are created
+                task = asyncio.ensure_future(get_word_and_level(word))
+                tasks.add(task)
+                task.add_done_callback(done)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if errors:
+                raise errors[0]
+        finally:
+            if not kept_pool:
+                await connection_pool.close()
+    def _download_words(self, words):
+        import asyncio
+        if self.options['engine'] != 'asyncio':
+            super()._download_words(words)
+        elif not self.options['keep_connections']:
+            asyncio.run(self.__download_words_asynchronously(words))
+        else:
+            if self.__event_loop is None:
+                self.__event_loop = asyncio.new_event_loop()
+                self.__connection_pool = AsyncHTTPConnectionPool(self.options['max_number_of_connections_per_host'], self.options['request_timeout'])
+            self.__event_loop.run_until_complete(self.__download_words_asynchronously(words, self.__connection_pool))
+    def close_connections(self):
+        """Closes the connections kept by the asyncio engine"""
+        if self.__event_loop is not None:
+            self.__event_loop.run_until_complete(self.__connection_pool.close())
+            self.__event_loop.close()
+            self.__event_loop = self.__connection_pool = None
+
+_parsing_downloader = None #the downloader used for parsing in a parsing process
+
+def _initialize_parsing_process(options):
+    global _parsing_downloader
+    _parsing_downloader = LevelsDownloaderBase(**options)
+
+def _parse_pages(pages):
+    """Decodes and parses the pages of words in a parsing process, returns their main forms and levels (or the errors
+    of parsing them) and the time it took"""
+    import pickle
+    start = time.perf_counter()
+    results = []
+    for word, page in pages:
+        try:
+            results.append(_parsing_downloader._get_level_from_page_text(word, page))
+        except Exception as error:
+            try:
+                pickle.dumps(error)
+            except Exception: #lxml errors keep their logs, which cannot be pickled
+                error = RuntimeError('%s: %s' % (type(error).__name__, error))
+            results.append(error)
+    return results, time.perf_counter()-start
+
+class ParsingBatcher:
+    """Sends the pages of the downloading threads to parsing processes in batches and completes the futures of their results,
+    both from a thread of its own, so that the downloading threads go on downloading. A batch is sent while fewer batches
+    than processes are being parsed, the downloading threads wait only while max_waiting pages are waiting to be sent"""
+    def __init__(self, parsers, number_of_processes, batch_size, parsed=None, max_waiting=None):
+        self.parsers = parsers #concurrent.futures.ProcessPoolExecutor
+        self.number_of_processes = number_of_processes
+        self.batch_size = batch_size
+        self.parsed = parsed #called with the number of pages and the seconds of every parsed batch
+        self.max_waiting = max_waiting or 2*number_of_processes*batch_size
+        self.__condition = threading.Condition()
+        self.__waiting = [] #(word, page, concurrent.futures.Future of its result)
+        self.__done = [] #(batch, concurrent.futures.Future of its parsing) parsed and not completed yet
+        self.__in_flight = 0
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+    def parse(self, word, page):
+        """Returns a future of the main form and the level found in the page of the word"""
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        with self.__condition:
+            while len(self.__waiting) >= self.max_waiting:
+                self.__condition.wait()
+            self.__waiting.append((word, page, future))
+            self.__condition.notify_all()
+        return future
+    def close(self):
+        """Waits until all the pages have been parsed and their futures completed"""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__done and not (self.__waiting and self.__in_flight < self.number_of_processes):
+                    if self.__closed and not self.__waiting and not self.__in_flight:
+                        return
+                    self.__condition.wait()
+                done, self.__done = self.__done, []
+                self.__in_flight -= len(done)
+                batches = []
+                while self.__waiting and self.__in_flight < self.number_of_processes:
+                    batches.append(self.__waiting[:self.batch_size])
+                    del self.__waiting[:self.batch_size]
+                    self.__in_flight += 1
+                self.__condition.notify_all() #the downloading threads can add pages again
+            for batch in batches:
+                self.__submit(batch)
+            for batch, parsing in done:
+                self.__complete(batch, parsing)
+    def __submit(self, batch):
+        import concurrent.futures
+        try:
+            parsing = self.parsers.submit(_parse_pages, [(word, page) for word, page, _ in batch])
+        except RuntimeError as error: #a broken or shut down pool
+            parsing = concurrent.futures.Future()
+            parsing.set_exception(error)
+        parsing.add_done_callback(functools.partial(self.__parsed, batch))
+    def __parsed(self, batch, parsing):
+        """Called by the thread of the executor, which is not to send batches itself"""
+        with self.__condition:
+            self.__done.append((batch, parsing))
+            self.__condition.notify_all()
+    def __complete(self, batch, parsing):
+        try:
+            results, elapsed = parsing.result()
+        except BaseException as error: #also a broken pool, the words are not left waiting
+            for _, _, future in batch:
+                future.set_exception(error)
+        else:
+            if self.parsed is not None:
+                self.parsed(len(results), elapsed)
+            for (_, _, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+class LevelsDownloaderWithParsingProcesses(LevelsDownloaderBase):
+    """Decodes and parses the pages downloaded by the threads engine in processes: the downloading threads take the usual way
+    through _lookup, which gives a future of the result of a page then, and go on downloading while it is parsed and stored"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithParsingProcesses()
+        self.stage_metrics={} #how busy the downloading and parsing stages were during the last run
+        self.__batcher=None #ParsingBatcher while the words are being downloaded
+        self.__stored=[] #futures of storing the results of the parsed pages
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithParsingProcesses(self):
+        self.update_options({
+            #number of processes parsing the pages downloaded by the threads, 0 to parse in the downloading threads
+            'parsing_processes':0,
+            #maximal number of pages sent to a parsing process at once, when all of them are busy
+            'parsing_batch_size':32})
+    def _get_raw_page_from_dictionary(self, word, link=None):
+        if self.__batcher is None:
+            return super()._get_raw_page_from_dictionary(word, link)
+        start = time.perf_counter()
+        try:
+            return super()._get_raw_page_from_dictionary(word, link)
+        finally:
+            elapsed = time.perf_counter()-start
+            with self.lock:
+                self.stage_metrics['downloading']['busy_seconds'] += elapsed
+                self.stage_metrics['downloading']['items'] += 1
+    def _get_page_from_dictionary(self, word, link=None):
+        if self.__batcher is None:
+            return super()._get_page_from_dictionary(word, link)
+        return self._get_raw_page_from_dictionary(word, link) #decoded by the parsing processes
+    def _get_level_from_page_text(self, suggested_word, text):
+        if self.__batcher is None or not text: #nothing to be parsed
+            return super()._get_level_from_page_text(suggested_word, text)
+        return self.__batcher.parse(suggested_word, text)
+    def __parsed(self, pages, elapsed):
+        if self.profiler is not None:
+            self.profiler.observe('parsing_batch', elapsed)
+        with self.lock:
+            self.stage_metrics['parsing']['busy_seconds'] += elapsed
+            self.stage_metrics['parsing']['items'] += pages
+    def __store(self, word, found):
+        if self.profiler is None:
+            return self._store_result(word, *found)
+        with self.profiler.stage('storing'):
+            self._store_result(word, *found)
+    def __look_up(self, word):
+        """Looks a word up, its result is stored once its page has been parsed"""
+        stored = _then(self._lookup(word), functools.partial(self.__store, word))
+        if stored is not None: #a future
+            with self.lock:
+                self.__stored.append(stored)
+    def _download_words(self, words):
+        import concurrent.futures
+        import multiprocessing.dummy
+        if not self.options['parsing_processes']:
+            return super()._download_words(words)
+        self.stage_metrics = {
+            'downloading':{'workers':min(self.options['max_number_of_threads'], len(words)), 'busy_seconds':0.0, 'items':0},
+            'parsing':{'workers':self.options['parsing_processes'], 'busy_seconds':0.0, 'items':0}}
+        start = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(self.options['parsing_processes'],
+                initializer=_initialize_parsing_process, initargs=(self.options,)) as parsers:
+            self.__batcher = ParsingBatcher(parsers, self.options['parsing_processes'], self.options['parsing_batch_size'], self.__parsed)
+            self.__stored = []
+            try:
+                pool = multiprocessing.dummy.Pool(self.stage_metrics['downloading']['workers'])
+                try:
+                    pool.map(self.__look_up, words)
+                finally:
+                    pool.close()
+                    pool.join()
+            finally:
+                self.__batcher.close()
+                self.__batcher = None
+            stored, self.__stored = self.__stored, []
+            for future in stored:
+                future.result() #the errors are raised once all the words are done, as by the threads engine
+        wall_seconds = time.perf_counter()-start
+        for metrics in self.stage_metrics.values():
+            metrics['utilization'] = wall_seconds and metrics['busy_seconds']/(wall_seconds*metrics['workers'])
+        self.stage_metrics['wall_seconds'] = wall_seconds
+
+class AdaptiveConcurrencyLimiter:
+    """Lets at most limit requests be in flight and at most requests_per_second of them start every second,
+    the limit grows by one after about as many fast successful requests as the limit (additive increase)
+    and is multiplied by decrease_factor, at most once per round trip, when a request is throttled, fails
+    or takes more than latency_tolerance times as long as the usual one (multiplicative decrease),
+    until the first decrease the limit grows by one after every fast successful request (slow start)"""
+    latency_noise = 0.001 #differences of latencies smaller than that many seconds are not taken into account
+    def __init__(self, initial_limit=1, min_limit=1, max_limit=50, latency_tolerance=2.0, decrease_factor=0.5, requests_per_second=None):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.requests_per_second = requests_per_second
+        self.in_flight = 0
+        self.usual_latency = None #slowly following the fastest successful requests
+        self.counters = {'succeeded':0, 'throttled':0, 'failed':0, 'decreases':0}
+        self.__slow_start = True
+        self.__condition = threading.Condition()
+        self.__last_decrease = 0.0
+        self.__paused_until = 0.0 #set by a Retry-After header
+        self.__tokens_lock = threading.Lock()
+        self.__tokens = float(requests_per_second and max(1.0, requests_per_second) or 0) #a bucket of at most a second of requests
+        self.__refilled = time.monotonic()
+    def acquire(self):
+        """Waits for a free slot and a token, returns the start time to be given to release"""
+        with self.__condition:
+            while self.in_flight >= int(self.limit) or time.monotonic() < self.__paused_until:
+                self.__condition.wait(max(0.0, self.__paused_until-time.monotonic()) or None)
+            self.in_flight += 1
+        if self.requests_per_second:
+            self.__take_token()
+        return time.monotonic()
+    def __take_token(self):
+        while True:
+            with self.__tokens_lock:
+                now = time.monotonic()
+                self.__tokens = min(max(1.0, self.requests_per_second), self.__tokens+(now-self.__refilled)*self.requests_per_second)
+                self.__refilled = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                waiting = (1-self.__tokens)/self.requests_per_second
+            time.sleep(waiting)
+    def release(self, start, outcome='succeeded', retry_after=None):
+        """Adjusts the limit to the outcome of a request ('succeeded', 'throttled' or 'failed') started at start"""
+        now = time.monotonic()
+        latency = now-start
+        with self.__condition:
+            self.in_flight -= 1
+            self.counters[outcome] += 1
+            congested = outcome != 'succeeded'
+            if not congested:
+                if self.usual_latency is None or latency < self.usual_latency:
+                    self.usual_latency = latency
+                else:
+                    self.usual_latency += 0.01*(latency-self.usual_latency)
+                congested = latency > self.latency_tolerance*self.usual_latency+self.latency_noise
+            if congested and now-self.__last_decrease > latency: #the requests started before the last decrease do not count
+                self.limit = max(self.min_limit, self.limit*self.decrease_factor)
+                self.__last_decrease = now
+                self.__slow_start = False
+                self.counters['decreases'] += 1
+            elif not congested:
+                self.limit = min(self.max_limit, self.limit+(self.__slow_start and 1 or 1/self.limit))
+            if retry_after:
+                self.__paused_until = max(self.__paused_until, now+retry_after)
+            self.__condition.notify_all()
+
+class LatencyPercentile:
+    """A percentile of the latest latencies, recomputed every refresh observations, initial until min_observations are made"""
+    def __init__(self, percentile=0.95, initial=1.0, window=1000, refresh=50, min_observations=20):
+        self.percentile = percentile
+        self.refresh = refresh
+        self.min_observations = min_observations
+        self.value = initial
+        self.__lock = threading.Lock()
+        self.__latencies = collections.deque(maxlen=window)
+        self.__observed_since_refresh = 0
+    def observe(self, seconds):
+        with self.__lock:
+            self.__latencies.append(seconds)
+            self.__observed_since_refresh += 1
+            number = len(self.__latencies)
+            if number >= self.min_observations and (self.__observed_since_refresh >= self.refresh or number == self.min_observations):
+                self.value = sorted(self.__latencies)[min(number-1, int(self.percentile*number))]
+                self.__observed_since_refresh = 0
+
+class LevelsDownloaderWithHedging(LevelsDownloaderBase):
+    """Asks the next backend too when the previous one has not answered within a percentile of the latencies of the first one,
+    the first answer which did not fail transiently is used and the other requests are cancelled"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithHedging()
+        self.__backends = [] #downloaders building the links and extracting the words and levels of the backends, the first one is self
+        self.__executor = None #the threads waited for by the threads engine
+        self.__requests_lock = threading.Lock()
+        self.__requests = set() #futures of the lookups of the executor not done yet
+        self.hedge_delay = None #LatencyPercentile of the first backend
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithHedging(self):
+        self.update_options({
+            #other dictionaries or mirrors asked when the main one is slow, each given by the options it has different from the main one,
+            #such as link_building, words_extraction_from_xml and levels_extraction_from_xml (the streamed fetch mode stops reading by the main ones)
+            'backends':[],
+            #percentile of the latencies of the main dictionary after which the next backend is asked too
+            'hedge_percentile':0.95,
+            #number of seconds after which the next backend is asked until enough latencies of the main dictionary are known
+            'hedge_delay':1.0,
+            #maximal number of seconds the end of a run waits for the requests which lost to be answered (they cannot be interrupted), None for no limit
+            'hedge_drain_timeout':5.0})
+    def _download_words(self, words):
+        import concurrent.futures
+        if not self.options['backends']:
+            return super()._download_words(words)
+        if self.hedge_delay is None or self.hedge_delay.percentile != self.options['hedge_percentile']:
+            self.hedge_delay = LatencyPercentile(self.options['hedge_percentile'], self.options['hedge_delay'])
+        self.__backends = [self]+[LevelsDownloaderBase(**dict(self.options, backends=[], **backend)) for backend in self.options['backends']]
+        for backend in self.__backends[1:]:
+            backend.profiler = self.profiler
+        if self.options['engine'] != 'asyncio':
+            self.__executor = concurrent.futures.ThreadPoolExecutor(min(self.options['max_number_of_threads'], len(words))*len(self.__backends))
+        try:
+            super()._download_words(words)
+        finally:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=False, cancel_futures=True) #the requests not sent yet are dropped
+                with self.__requests_lock:
+                    requests = list(self.__requests)
+                concurrent.futures.wait(requests, self.options['hedge_drain_timeout']) #no connections are left open after the run
+                self.__executor = None
+    def __look_up_with(self, backend, word):
+        """Looks the word up with a backend, None if it failed transiently"""
+        start = time.perf_counter()
+        word, page = self._get_page_from_dictionary(word, backend._get_link(word))
+        if page is None:
+            return None
+        if backend is self:
+            self.hedge_delay.observe(time.perf_counter()-start)
+        return backend._get_level_from_page_text(word, page)
+    def __submit(self, backend, word):
+        future = self.__executor.submit(self.__look_up_with, backend, word)
+        with self.__requests_lock:
+            self.__requests.add(future)
+        future.add_done_callback(self.__request_done)
+        return future
+    def __request_done(self, future):
+        with self.__requests_lock:
+            self.__requests.discard(future)
+    def __count_hedging(self, asked, answered):
+        if self.profiler is not None:
+            self.profiler.count('hedged_requests', asked-1)
+            if answered:
+                self.profiler.count('hedged_answers')
+    def _lookup(self, word):
+        import concurrent.futures
+        if self.__executor is None:
+            return super()._lookup(word)
+        backends = self.__backends
+        pending = {} #future: index of its backend
+        asked = 0
+        try:
+            while asked < len(backends) or pending:
+                if asked < len(backends):
+                    pending[self.__submit(backends[asked], word)] = asked
+                    asked += 1
+                done, _ = concurrent.futures.wait(pending, asked < len(backends) and self.hedge_delay.value or None,
+                    concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    found = future.result()
+                    if found is not None:
+                        self.__count_hedging(asked, index > 0)
+                        return found
+        finally:
+            for future in pending:
+                future.cancel() #only the ones not started yet, urlopen cannot be interrupted
+        self.__count_hedging(asked, False)
+        return self._get_level_from_page_text(word, None)
+    async def __look_up_with_asynchronously(self, connection_pool, backend, word):
+        import asyncio
+        start = time.perf_counter()
+        try:
+            word, page = await self._get_page_from_dictionary_asynchronously(connection_pool, word, backend._get_link(word))
+        except asyncio.CancelledError:
+            if backend is self:
+                self.hedge_delay.observe(time.perf_counter()-start) #at least as slow as that
+            raise
+        if page is None:
+            return None
+        if backend is self:
+            self.hedge_delay.observe(time.perf_counter()-start)
+        return backend._get_level_from_page_text(word, page)
+    async def _lookup_asynchronously(self, connection_pool, word):
+        import asyncio
+        if not self.options['backends'] or not self.__backends:
+            return await super()._lookup_asynchronously(connection_pool, word)
+        backends = self.__backends
+        pending = {} #task: index of its backend
+        asked = 0
+        try:
+            while asked < len(backends) or pending:
+                if asked < len(backends):
+                    pending[asyncio.ensure_future(self.__look_up_with_asynchronously(connection_pool, backends[asked], word))] = asked
+                    asked += 1
+                done, _ = await asyncio.wait(pending, timeout=asked < len(backends) and self.hedge_delay.value or None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = pending.pop(task)
+                    found = task.result()
+                    if found is not None:
+                        self.__count_hedging(asked, index > 0)
+                        return found
+        finally:
+            for task in pending:
+                task.cancel()
+        self.__count_hedging(asked, False)
+        return self._get_level_from_page_text(word, None)
+
+class LevelsDownloaderWithAdaptiveConcurrency(LevelsDownloaderBase):
+    throttling_statuses = {429, 503}
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithAdaptiveConcurrency()
+        self.concurrency_limiter = None #AdaptiveConcurrencyLimiter of the threads engine, kept between runs
+        self.__limiter_options = None
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithAdaptiveConcurrency(self):
+        self.update_options({
+            #whether the threads engine should adjust the number of requests in flight between 1 and max_number_of_threads to the latency and throttling of the dictionary
+            'adaptive_concurrency':False,
+            #how many times longer than usual a response can take before the number of requests in flight is decreased
+            'adaptive_latency_tolerance':2.0,
+            #maximal number of requests started every second by the threads engine, None for no limit
+            'max_requests_per_second':None})
+    def _download_words(self, words):
+        limiter_options = (self.options['adaptive_concurrency'], self.options['adaptive_latency_tolerance'],
+            self.options['max_requests_per_second'], self.options['max_number_of_threads'])
+        if not self.options['adaptive_concurrency'] and not self.options['max_requests_per_second']:
+            self.concurrency_limiter = None
+        elif self.concurrency_limiter is None or limiter_options != self.__limiter_options:
+            maximum = self.options['max_number_of_threads']
+            self.concurrency_limiter = AdaptiveConcurrencyLimiter(
+                initial_limit=self.options['adaptive_concurrency'] and 1 or maximum,
+                min_limit=self.options['adaptive_concurrency'] and 1 or maximum,
+                max_limit=maximum,
+                latency_tolerance=self.options['adaptive_latency_tolerance'],
+                requests_per_second=self.options['max_requests_per_second'])
+        self.__limiter_options = limiter_options
+        super()._download_words(words)
+    def _download(self, link):
+        import urllib.error
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return super()._download(link)
+        start = limiter.acquire()
+        try:
+            page = super()._download(link)
+        except urllib.error.HTTPError as error:
+            throttled = error.code in self.throttling_statuses
+            retry_after = throttled and error.headers and error.headers.get('Retry-After', '')
+            limiter.release(start, throttled and 'throttled' or 'succeeded', #other statuses are answers of a healthy server
+                retry_after and retry_after.isdigit() and int(retry_after) or None)
+            if throttled and self.profiler is not None:
+                self.profiler.count('throttled_requests')
+            raise
+        except BaseException:
+            limiter.release(start, 'failed')
+            raise
+        limiter.release(start)
+        return page
+
+class LevelsDownloaderWithStreamedFetching(LevelsDownloaderBase):
+    """Asks for compressed pages, decompresses and decodes them as they arrive and closes the connection
+    as soon as the rest of a page cannot change the result"""
+    decompressors = {'gzip':lambda: zlib.decompressobj(16+zlib.MAX_WBITS), 'x-gzip':lambda: zlib.decompressobj(16+zlib.MAX_WBITS),
+        'deflate':lambda: zlib.decompressobj(32+zlib.MAX_WBITS)} #zlib wrapped, raw deflate is tried when it fails
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithStreamedFetching()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithStreamedFetching(self):
+        self.update_options({
+            #'full' reads whole pages as they are sent, 'streamed' asks for gzip or deflate compressed pages and stops reading them once the rest cannot change the result
+            'fetch_mode':'full',
+            #number of bytes read from a connection at a time by the streamed fetch mode
+            'fetch_chunk_size':16384})
+    def __is_settled(self, text):
+        return self.page_texts_selection.is_settled(text,
+            self.get_words_from_xml.keywords['regexp_compiled_pattern'], self.get_levels_from_xml.keywords['regexp_compiled_pattern'],
+            None, self.options['lowest_level'], self.options['levels_to_read'])
+    def __read(self, response, encoding):
+        """Returns the decompressed page and the number of bytes read from the connection"""
+        decompressor = encoding in self.decompressors and self.decompressors[encoding]() or None
+        if decompressor is None and encoding != 'identity':
+            raise HTTPResponseError('Unsupported content encoding: %s' % encoding)
+        text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        selection = self.options['extraction_engine'] == 'targeted' and self.page_texts_selection or None
+        chunks = []
+        wire_bytes = 0
+        text = ''
+        head_seen = recheck = False
+        while True:
+            chunk = response.read(self.options['fetch_chunk_size'])
+            if not chunk:
+                break
+            wire_bytes += len(chunk)
+            if decompressor is not None:
+                try:
+                    chunk = decompressor.decompress(chunk)
+                except zlib.error:
+                    if encoding != 'deflate' or wire_bytes != len(chunk): #raw deflate sent as deflate is recognized at the beginning only
+                        raise HTTPResponseError('Malformed %s content' % encoding)
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    chunk = decompressor.decompress(chunk)
+            chunks.append(chunk)
+            if selection is None:
+                continue
+            new = max(0, len(text)-256) #a tag could have been split between the chunks
+            text += text_decoder.decode(chunk)
+            started = selection.levels_start_pattern.search(text, new) is not None
+            if not head_seen:
+                head_seen = started = selection.head_end_pattern.search(text) is not None
+            if started or recheck: #checked only when something could have changed, the element could have been unclosed before
+                if self.__is_settled(text):
+                    if self.profiler is not None:
+                        self.profiler.count('early_terminated_pages')
+                    break
+                recheck = started and head_seen
+        return b''.join(chunks), wire_bytes
+    def _download(self, link):
+        import urllib.request
+        if self.options['fetch_mode'] != 'streamed':
+            return super()._download(link)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.count('requests')
+            start = time.perf_counter()
+        with self.urlopen_function(urllib.request.Request(link, headers={'Accept-Encoding':'gzip, deflate'})) as response:
+            if profiler is not None:
+                profiler.observe('connecting', time.perf_counter()-start)
+                start = time.perf_counter()
+            headers = getattr(response, 'headers', None)
+            page, wire_bytes = self.__read(response, headers is not None and headers.get('Content-Encoding', 'identity').strip().lower() or 'identity')
+        #leaving the with statement closes the connection with the rest of the page unread
+        if profiler is not None:
+            profiler.observe('downloading', time.perf_counter()-start)
+            profiler.count('bytes', len(page))
+            profiler.count('bytes_on_wire', wire_bytes)
+        return page
 
 class LevelsDownloaderLoaderSaver(LevelsDownloaderBase):
+    configs = {} #absolute path of a config file: ((modification time, size), text) of it when it was last read or written
     def __init__(self, dump_config=True, config_file='config.json', **kwargs):
         self.load(config_file)
         self.update_options({'config_file':config_file, 'dump_config':dump_config})
@@ -242,23 +2804,250 @@ class LevelsDownloaderLoaderSaver(LevelsDownloaderBase):
         if self.options['dump_config']:
             self.dump()
         super().__del__(**kwargs)
+    @classmethod
+    def __remember(cls, config_file, text):
+        status = os.stat(config_file)
+        cls.configs[os.path.abspath(config_file)] = ((status.st_mtime_ns, status.st_size), text)
+    @classmethod
+    def _read_config(cls, config_file):
+        """Returns the text of the config file, which is only read again if it has been modified"""
+        status = os.stat(config_file)
+        version, text = cls.configs.get(os.path.abspath(config_file), (None, None))
+        if version != (status.st_mtime_ns, status.st_size):
+            with open(config_file, 'r') as f:
+                text = f.read()
+            cls.configs[os.path.abspath(config_file)] = ((status.st_mtime_ns, status.st_size), text)
+        return text
     def dump(self):
+        """Writes the options to the config file unless it already contains them"""
+        text = json.dumps({name:value for name, value in self.options.items() if name not in ('config_file','dump_config')}, indent='\t')
+        try:
+            if self._read_config(self.options['config_file']) == text:
+                return
+        except IOError:
+            pass
         try:
             with open(self.options['config_file'],'w') as f:
-                json.dump({name:value for name, value in self.options.items() if name not in ('config_file','dump_config')}, f, indent='\t')
+                f.write(text)
+            self.__remember(self.options['config_file'], text)
         except IOError:
             pass
     def load(self, config_file):
         try:
-            with open(config_file, 'r') as f:
-                self.update_options(json.load(f))
+            self.update_options(json.loads(self._read_config(config_file)))
         except (IOError, json.JSONDecodeError):
             pass
     def _delete_dumped(self):
         if os.path.exists(self.options['config_file']):
             os.remove(self.options['config_file'])
      
-class LevelsDownloader(LevelsDownloaderLoaderSaver, LevelsDownloaderWithFiles, LevelsDownloaderWithReporting):
+class LookupBatcher:
+    """Collects the words of concurrent requests and looks them up together, in one call of lookup(options, words) for each set of options,
+    waiting at most batch_delay seconds for more requests unless max_batch_size words are already waiting"""
+    def __init__(self, lookup, batch_delay=0.01, max_batch_size=1000):
+        self.lookup = lookup
+        self.batch_delay = batch_delay
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.batches = 0
+        self.words_looked_up = 0
+        self.__lock = threading.Lock()
+        self.__pending = [] #(options, words, future) of the requests waiting for the next batch
+        self.__pending_words = 0
+        self.__wakeup = threading.Event()
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+    def submit(self, words, options=None):
+        """Returns a concurrent.futures.Future of a dictionary of the words and (main form, level) tuples"""
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError('The batcher is closed')
+            self.requests += 1
+            self.__pending.append((options or {}, words, future))
+            self.__pending_words += len(words)
+        self.__wakeup.set()
+        return future
+    def __take(self):
+        self.__wakeup.wait()
+        if self.__pending_words < self.max_batch_size:
+            time.sleep(self.batch_delay) #letting the concurrent requests join
+        with self.__lock:
+            self.__wakeup.clear()
+            pending, self.__pending, self.__pending_words = self.__pending, [], 0
+        return pending
+    def __run(self):
+        while not self.__closed or self.__pending:
+            groups = {} #options as JSON: (options, words, requests)
+            for options, words, future in self.__take():
+                group = groups.setdefault(json.dumps(options, sort_keys=True), (options, set(), []))
+                group[1].update(words)
+                group[2].append((words, future))
+            for options, words, requests in groups.values():
+                try:
+                    found = self.lookup(options, words)
+                except Exception as error:
+                    for _, future in requests:
+                        future.set_exception(error)
+                    continue
+                self.batches += 1
+                self.words_looked_up += len(words)
+                for request_words, future in requests:
+                    future.set_result({word:found.get(word, (word, 'UNRESOLVED')) for word in request_words})
+    def close(self):
+        """Looks the waiting requests up and stops"""
+        with self.__lock:
+            self.__closed = True
+        self.__wakeup.set()
+        self.__thread.join()
+
+@functools.lru_cache(maxsize=None)
+def lookup_request_handler():
+    """Returns the request handler class of LookupServer, defined when the first server is started so that importing does not load http.server"""
+    import http.server
+    class LookupRequestHandler(http.server.BaseHTTPRequestHandler):
+        """POST /lookup with {"words": [...], "options": {...}} returns {"results": {word: [main form, level]}}, GET /status returns the counters"""
+        protocol_version = 'HTTP/1.1' #the clients can keep their connections
+        disable_nagle_algorithm = True #the headers and the body are written separately, the second write must not wait for an acknowledgement
+        def __reply(self, status, content):
+            body = json.dumps(content).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def do_GET(self):
+            if self.path != '/status':
+                return self.__reply(404, {'error':'Unknown path: %s' % self.path})
+            batcher = self.server.lookup_server.batcher
+            self.__reply(200, {'requests':batcher.requests, 'batches':batcher.batches, 'words_looked_up':batcher.words_looked_up})
+        def do_POST(self):
+            if self.path != '/lookup':
+                return self.__reply(404, {'error':'Unknown path: %s' % self.path})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                words, options = request['words'], request.get('options', {})
+                if not isinstance(words, list) or not all(isinstance(word, str) for word in words) or not isinstance(options, dict):
+                    raise TypeError
+                defaults = self.server.lookup_server.downloader.options
+                options = {name:options[name] for name in self.server.lookup_server.request_options if name in options}
+                if any(type(value) is not type(defaults[name]) for name, value in options.items()):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                return self.__reply(400, {'error':'Expected {"words": [strings], "options": {%s}}' % ', '.join(self.server.lookup_server.request_options)})
+            try:
+                found = self.server.lookup_server.batcher.submit(words, options).result()
+            except Exception as error:
+                return self.__reply(500, {'error':str(error)})
+            self.__reply(200, {'results':found})
+        def log_message(self, format, *args):
+            if not self.server.lookup_server.downloader.options['silent_mode']:
+                super().log_message(format, *args)
+    return LookupRequestHandler
+
+class LookupServer:
+    """Looks words up for clients over HTTP with a single downloader, so that its cache, remembered lookups and connections stay warm,
+    the words of concurrent requests are looked up in batches"""
+    #the options of the downloader a request can change, they change the results
+    request_options = ('do_not_change_words', 'phrasal_verb_separator')
+    def __init__(self, address, downloader, batch_delay=0.01, max_batch_size=1000):
+        import http.server
+        self.downloader = downloader
+        self.batcher = LookupBatcher(self.__lookup, batch_delay, max_batch_size)
+        self.http_server = http.server.ThreadingHTTPServer(address, lookup_request_handler())
+        self.http_server.daemon_threads = True
+        self.http_server.lookup_server = self
+        self.server_address = self.http_server.server_address
+    def __lookup(self, options, words):
+        """Called only by the thread of the batcher"""
+        defaults = {name:self.downloader.options[name] for name in options}
+        self.downloader.options.update(options)
+        try:
+            return self.downloader.lookup_words(words)
+        finally:
+            self.downloader.options.update(defaults)
+    def serve_forever(self, poll_interval=0.5):
+        self.http_server.serve_forever(poll_interval)
+    def shutdown(self):
+        self.http_server.shutdown()
+    def server_close(self):
+        self.http_server.server_close()
+        self.batcher.close()
+        self.downloader.close_connections()
+        if self.downloader.cache is not None:
+            self.downloader.cache.close()
+
+class LevelsDownloaderWithLookupServer(LevelsDownloaderBase):
+    """Looks the words up with a lookup server started by word_level_downloader --serve, instead of downloading them"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithLookupServer()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithLookupServer(self):
+        self.update_options({
+            #host:port of a lookup server to look the words up with, None to download them here
+            'server_address':None,
+            #number of seconds after which a lookup server is not waited for
+            'server_timeout':600})
+    def _download_words(self, words):
+        """Looks the words up with the lookup server, they are UNRESOLVED if it cannot be reached or does not answer properly"""
+        import http.client
+        import urllib.request
+        if not self.options['server_address']:
+            return super()._download_words(words)
+        request = json.dumps({'words':list(words), 'options':{name:self.options[name] for name in LookupServer.request_options}}).encode('utf-8')
+        try:
+            with urllib.request.urlopen(urllib.request.Request('http://%s/lookup' % self.options['server_address'], request,
+                    {'Content-Type':'application/json'}), timeout=self.options['server_timeout']) as response:
+                found = {word:(main_form, level) for word, (main_form, level) in json.load(response)['results'].items()}
+        except (OSError, http.client.HTTPException, ValueError, KeyError, TypeError, AttributeError) as error: #URLError and HTTPError are OSErrors
+            self.problem_info('Problem during looking words up with the lookup server: %s' % error)
+            found = {}
+        for word in words:
+            self._store_result(word, *found.get(word, (' '.join(word.split(self.options['phrasal_verb_separator'])), 'UNRESOLVED')))
+
+def shard_of(word, number_of_shards):
+    """The shard a word belongs to, the same in every process and on every machine"""
+    return zlib.crc32(word.encode('utf-8')) % number_of_shards
+
+class LevelsDownloaderWithSharding(LevelsDownloaderBase):
+    """Looks up only the words of its shard, so that the runs of all the shards together look up all the words without a coordinator"""
+    def __init__(self,**kwargs):
+        self.__default_options_for_LevelsDownloaderWithSharding()
+        super().__init__(**kwargs)
+    def __default_options_for_LevelsDownloaderWithSharding(self):
+        self.update_options({
+            #[index counted from 0, number of shards] of the words to be looked up, their outputs are merged by word_level_downloader merge, None for all words
+            'shard':None})
+    def _words_to_process(self, words):
+        words = super()._words_to_process(words)
+        if not self.options['shard']:
+            return words
+        index, number_of_shards = self.options['shard']
+        return [word for word in words if shard_of(word, number_of_shards) == index]
+
+def merge_results_files(output_file_path, input_file_paths, encoding='utf-8'):
+    """K-way merges files written by save_words_to_file into one ordered like it, the same words with the same levels are written once,
+    raises ValueError if an input file is not ordered"""
+    def results(file):
+        previous = None
+        for line in file:
+            level, _, word = line.rstrip('\n').partition(' ')
+            if not word:
+                continue
+            key = LevelsDownloaderBase.result_sorting_key((word, level))
+            if previous is not None and key < previous:
+                raise ValueError('Not ordered by the levels: %s' % file.name)
+            previous = key
+            yield word, level
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(open(file_path, 'r', encoding=encoding)) for file_path in input_file_paths]
+        merged = heapq.merge(*(results(file) for file in files), key=LevelsDownloaderBase.result_sorting_key)
+        with open(output_file_path, 'w', encoding=encoding) as output:
+            output.writelines('%s %s\n' % (level, word) for (word, level), _ in itertools.groupby(merged)) #equal results are next to each other
+
+class LevelsDownloader(LevelsDownloaderLoaderSaver, LevelsDownloaderWithFiles, LevelsDownloaderWithReporting, LevelsDownloaderWithLookupServer, LevelsDownloaderWithRetries, LevelsDownloaderWithCache, LevelsDownloaderWithPageStore, LevelsDownloaderWithJournal, LevelsDownloaderWithHeadwordIndex, LevelsDownloaderWithSingleFlight, LevelsDownloaderWithHedging, LevelsDownloaderWithAdaptiveConcurrency, LevelsDownloaderWithAsyncio, LevelsDownloaderWithParsingProcesses, LevelsDownloaderWithStreamedFetching, LevelsDownloaderWithSharding):
     pass
 
 def program_help():
@@ -270,30 +3059,132 @@ Example Usage:
     Getting and printing levels of the mentioned words: word_level_downloader car home coffee
     Getting words from the file and saving them and their downloaded levels into another file: word_level_downloader --input my_list.txt --output: word_levels.txt
     word_level_downloader --silent --fix --many --max 5 --input my_list.txt --output: word_levels.txt car home coffee
+    Remembering downloaded levels between runs, so that known words are not downloaded again: word_level_downloader --cache levels.sqlite --input my_list.txt
+    Downloading many words over a few persistent connections instead of a thread per word: word_level_downloader --engine asyncio --input my_list.txt
+    Building an index of known words from word lists, earlier results and the cache: word_level_downloader --build-index known.bloom --fp-rate 0.01 --cache levels.sqlite words.txt word_levels.txt
+    Not downloading the words certainly missing from the index, when they are not to be changed: word_level_downloader --fix --index known.bloom --input my_list.txt
+    Building the index of all the forms the words can be typed in, so that the words missing from it are not downloaded even to be changed: word_level_downloader --build-index forms.bloom --surface-forms inflected_forms.txt, then word_level_downloader --index forms.bloom --input my_list.txt
+    Measuring how long each stage of downloading takes: word_level_downloader --profile-output profile.json (or profile.prom, or --profile for the standard error) car home coffee
+    Adjusting the number of parallel downloads to how fast the dictionary answers, at most 20 requests a second: word_level_downloader --adaptive --rate 20 --input my_list.txt
+    Looking the words which failed because of timeouts or an overloaded dictionary up again at most 5 times before they are UNRESOLVED: word_level_downloader --retries 5 --input my_list.txt
+    Downloading compressed pages and only as much of them as is needed: word_level_downloader --fetch streamed --input my_list.txt
+    Extracting words from a huge input file in 8 processes (by default as many as processors, 0 to read in one): word_level_downloader --readers 8 --input subtitles.txt
+    Journaling the results, so that an interrupted run can be continued without looking the journaled words up again (by default with --resume the journal is the output file with .journal appended): word_level_downloader --journal run.journal --input my_list.txt, then word_level_downloader --resume --journal run.journal --input my_list.txt
+    Keeping a lookup server with warm caches and connections running, which looks the words of concurrent requests up together: word_level_downloader --serve localhost:8765 --engine asyncio --cache levels.sqlite
+    Looking words up with the lookup server, with the same flags otherwise: word_level_downloader --connect localhost:8765 --input my_list.txt
+    Looking up a quarter of the words in each of 4 processes or machines, each writing its own part, then merging the parts: word_level_downloader --shard 0/4 --input my_list.txt (and 1/4, 2/4, 3/4), then word_level_downloader merge --output word_levels.txt words_and_levels.*-of-4.txt
+    Parsing the downloaded pages in 4 processes: word_level_downloader --parsers 4 --input my_list.txt
+    Writing levels of words from a huge file as soon as they are downloaded, unsorted: word_level_downloader --stream --input my_list.txt --output word_levels.txt
+    Sorting the levels of words from a huge file on disk before writing them: word_level_downloader --stream --sort --input my_list.txt --output word_levels.txt
+    Writing the levels as JSON lines, CSV or compact binary columns (chosen by the .jsonl, .csv and .wlr extensions as well): word_level_downloader --format csv --output word_levels.csv car home coffee
+    Recording the downloaded pages in one compressed file, then parsing them again without the network: word_level_downloader --record pages.pack --input my_list.txt, then word_level_downloader --replay pages.pack --input my_list.txt
+    Downloading again only the recorded pages which have changed since: word_level_downloader --revalidate pages.pack --input my_list.txt
         ''')
 
+def merge_main(arguments):
+    """word_level_downloader merge [--output file] part_file..."""
+    import getopt
+    try:
+        opts, args = getopt.gnu_getopt(arguments, 'o:', ['output='])
+    except getopt.GetoptError:
+        program_help()
+        sys.exit(2)
+    options=dict(opts)
+    try:
+        merge_results_files(options.get('--output',options.get('-o','words_and_levels.txt')), args)
+    except (IOError, ValueError) as error:
+        print('Problem during merging: %s' % error)
+        sys.exit(1)
+
 def main():
+    import getopt
+    if sys.argv[1:2] == ['merge']:
+        return merge_main(sys.argv[2:])
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'sfmi:o:t:', ['silent','many','fix','input=', 'output=','threads='])
+        opts, args = getopt.getopt(sys.argv[1:], 'hsfmi:o:t:c:e:p:', ['help','silent','many','fix','input=', 'output=','threads=','cache=','engine=','stream','parsers=','profile','profile-output=','index=','build-index=','fp-rate=','surface-forms','adaptive','rate=','retries=','fetch=','readers=','journal=','resume','serve=','connect=','shard=','format=','sort','record=','revalidate=','replay='])
     except getopt.GetoptError:
         program_help()   
         sys.exit(2)
     else:
         options=dict(opts)
-        if options.get('--help',options.get('-h','')):
+        if '--help' in options or '-h' in options:
             program_help()
+            return
         input_file=options.get('--input',options.get('-i',''))
-        output_file=options.get('--output',options.get('-o','words_and_levels.txt'))
+        shard=None
+        if '--shard' in options:
+            index, _, number_of_shards = options['--shard'].partition('/')
+            shard=index.isdigit() and number_of_shards.isdigit() and int(index) < int(number_of_shards) and [int(index), int(number_of_shards)] or None
+            if shard is None:
+                program_help()
+                sys.exit(2)
+        output_file=options.get('--output',options.get('-o',shard and 'words_and_levels.%s-of-%s.txt' % tuple(shard) or 'words_and_levels.txt'))
+        if options.get('--format', 'text') not in OUTPUT_FORMATS:
+            program_help()
+            sys.exit(2)
+        page_store_modes=[mode for mode in PageRecorder.modes if '--'+mode in options]
+        if len(page_store_modes) > 1 or page_store_modes and options.get('--engine',options.get('-e','threads')) != 'threads':
+            program_help()
+            sys.exit(2)
+        page_store_mode=page_store_modes and page_store_modes[0] or 'record'
         downloader=LevelsDownloader(
             silent_mode='--silent' in options or '-s' in options,
             do_not_change_words='--fix' in options or '-f' in options,
             many_phrasal_verbs='--many' in options or '-m' in options,
-            max_number_of_words_in_phrasal_verb=options.get('--max',options.get('-m','3')).isnumeric() and int(options.get('--max',options.get('-m','3'))) or 3
+            max_number_of_words_in_phrasal_verb=options.get('--max',options.get('-m','3')).isnumeric() and int(options.get('--max',options.get('-m','3'))) or 3,
+            cache_file=options.get('--cache',options.get('-c',None)),
+            engine=options.get('--engine',options.get('-e','threads')),
+            parsing_processes=int(options.get('--parsers',options.get('-p','0'))),
+            headword_index_file=options.get('--index',None),
+            adaptive_concurrency='--adaptive' in options,
+            max_requests_per_second=options.get('--rate') and float(options['--rate']) or None,
+            max_retries=int(options.get('--retries',page_store_mode == 'replay' and '0' or '3')),
+            fetch_mode=options.get('--fetch','full'),
+            reading_processes=options.get('--readers') and int(options['--readers']),
+            journal_file='--serve' not in options and options.get('--journal','--resume' in options and output_file+'.journal' or None) or None,
+            keep_connections='--serve' in options,
+            server_address=options.get('--connect',None),
+            shard=shard,
+            output_format=options.get('--format',None),
+            page_store_file=options.get('--'+page_store_mode,None),
+            page_store_mode=page_store_mode
             )
-        downloader.read_words_from_file(input_file)
-        downloader.read(io.StringIO('\n'.join(args)))
-        downloader.process_words()
-        downloader.save_words_to_file(output_file)
+        if '--build-index' in options:
+            downloader.options['headword_index_file']=None
+            downloader.build_headword_index(options['--build-index'], [input_file]*bool(input_file)+args, float(options.get('--fp-rate','0.01')),
+                '--surface-forms' in options)
+            return
+        if '--serve' in options:
+            host, _, port = options['--serve'].rpartition(':')
+            server = LookupServer((host or 'localhost', int(port)), downloader)
+            downloader.problem_info('Looking words up at http://%s:%s/lookup' % server.server_address[:2])
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+            return
+        profile_output=options.get('--profile-output','')
+        if '--profile' in options or profile_output:
+            downloader.start_profiling()
+        if '--resume' in options:
+            try:
+                downloader.resume()
+            except (ValueError, IOError) as error:
+                downloader.problem_info('Problem during resuming: %s' % error)
+                sys.exit(1)
+        if '--stream' in options:
+            saved=downloader.stream_words_to_file(input_file, output_file, args, sort='--sort' in options)
+        else:
+            downloader.read_words_from_file(input_file)
+            downloader.read(io.StringIO('\n'.join(args)))
+            downloader.process_words()
+            saved=downloader.save_words_to_file(output_file)
+        downloader.close_journal(remove=saved) #the results are safe in the output file
+        downloader.close_page_store()
+        if downloader.profiler is not None:
+            downloader.save_profile(profile_output)
 
 if __name__ == '__main__':            
     main()